@@ -11,8 +11,144 @@ TIMEZONE = "Asia/Taipei"
 
 USER_COLLECTION = "user"
 CONTEST_COLLECTION = "contest"
+ATHLETE_STATS_COLLECTION = "athlete_stats"
+# 每一發射擊的時間序列資料
+SHOT_COLLECTION = "shot"
+# 會持續增長的比賽資料（影片、metrics）存放在以 contest_id 關聯的子 collection
+CONTEST_VIDEO_COLLECTION = "contest_video"
+CONTEST_METRIC_COLLECTION = "contest_metric"
+# 慢查詢紀錄（capped collection）
+SLOW_QUERY_COLLECTION = "slow_query"
+# 背景 change stream 的 resume token
+STREAM_STATE_COLLECTION = "stream_state"
 
 MONGO_URL = "mongodb://@localhost:27017"
 MONGO_DB = ""
 
+# MongoDB connection pool
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+)
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 20000))
+# 逗號分隔，例如 "zstd,snappy,zlib"，空字串代表不壓縮
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# 啟動時預先建立的連線數量
+MONGO_WARMUP_CONNECTIONS = int(
+    os.getenv("MONGO_WARMUP_CONNECTIONS", MONGO_MIN_POOL_SIZE)
+)
+
 REDIS_URL = "redis://localhost:6379"
+
+# Redis connection pool
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 100))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 5))
+
+# 已驗證 token -> 使用者 的行程內快取
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+
+# 密碼雜湊（bcrypt）在獨立的執行緒池中執行
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+# 等待中的雜湊工作超過此數量時直接回 503
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 64))
+
+# 匯出選手比賽紀錄時，每次從 MongoDB 取回的筆數
+CONTEST_EXPORT_BATCH_SIZE = int(os.getenv("CONTEST_EXPORT_BATCH_SIZE", 200))
+# 串流回應累積到這個大小（bytes）才送出一次
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+
+# 信任資料庫輸出的快速序列化路徑（orjson / pydantic-core 直接輸出 bytes）
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() == "true"
+
+# 批次建立/更新 API 一次最多接受的筆數
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 1000))
+
+# 熱門單筆查詢的合併批次（DataLoader）
+LOADER_BATCH_WINDOW_MS = float(os.getenv("LOADER_BATCH_WINDOW_MS", 2))
+LOADER_MAX_BATCH_SIZE = int(os.getenv("LOADER_MAX_BATCH_SIZE", 100))
+
+# Redis 回應快取（秒）：TTL 內視為新鮮，之後到 STALE_TTL 前先回舊資料並在背景更新
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 30))
+RESPONSE_CACHE_STALE_TTL = int(os.getenv("RESPONSE_CACHE_STALE_TTL", 300))
+
+# 列表分頁的 total / 分組計數快取（秒），依查詢條件各自快取
+PAGE_META_CACHE_SIZE = int(os.getenv("PAGE_META_CACHE_SIZE", 256))
+PAGE_META_CACHE_TTL = float(os.getenv("PAGE_META_CACHE_TTL", 10))
+
+# 在 API 行程內以 change stream 維護 athlete_stats；多個 worker 會重複追蹤同一個 stream，
+# 因此預設關閉，另外以 python -m app.worker.athlete_stats 執行單一個，或只在一個行程開啟
+ATHLETE_STATS_WORKER = os.getenv("ATHLETE_STATS_WORKER", "false").lower() == "true"
+
+# 比賽即時更新（WebSocket）：送出一則訊息超過此秒數就視為過慢的連線並關閉
+CONTEST_FEED_SEND_TIMEOUT = float(os.getenv("CONTEST_FEED_SEND_TIMEOUT", 5))
+# 連線期間每隔此秒數重新驗證 token，登出、撤銷或過期後以 1008 關閉
+CONTEST_FEED_AUTH_INTERVAL = float(os.getenv("CONTEST_FEED_AUTH_INTERVAL", 10))
+
+# 射擊資料寫入：先放在記憶體緩衝，累積到 FLUSH_SIZE 筆或每 FLUSH_INTERVAL_MS 寫入一次
+SHOT_BATCH_MAX_ITEMS = int(os.getenv("SHOT_BATCH_MAX_ITEMS", 5000))
+SHOT_FLUSH_SIZE = int(os.getenv("SHOT_FLUSH_SIZE", 1000))
+SHOT_FLUSH_INTERVAL_MS = float(os.getenv("SHOT_FLUSH_INTERVAL_MS", 200))
+# 緩衝超過此筆數時新的資料直接丟棄並計數
+SHOT_BUFFER_MAX = int(os.getenv("SHOT_BUFFER_MAX", 50000))
+
+# 射擊成績分析結果的快取：已結束的比賽結果不再變動，進行中的比賽與選手歷史只短暫快取
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 1024))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", 3600))
+ANALYTICS_LIVE_TTL = float(os.getenv("ANALYTICS_LIVE_TTL", 2))
+ANALYTICS_HISTORY_TTL = float(os.getenv("ANALYTICS_HISTORY_TTL", 60))
+
+# 比賽影片存放在 GridFS，上傳時以固定大小的 chunk 邊收邊寫
+VIDEO_BUCKET = "video"
+VIDEO_CHUNK_SIZE = int(os.getenv("VIDEO_CHUNK_SIZE", 1024 * 1024))
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", 4 * 1024 * 1024 * 1024))
+
+# 影片後製（縮圖、低碼率版本）以 Redis Streams 佇列交給 python -m app.worker.media 處理
+MEDIA_JOB_STREAM = "jobs:media"
+MEDIA_JOB_GROUP = "media-workers"
+MEDIA_JOB_DEAD_LETTER = "jobs:media:dead"
+MEDIA_JOB_DEAD_LETTER_MAXLEN = int(os.getenv("MEDIA_JOB_DEAD_LETTER_MAXLEN", 10000))
+# 含第一次執行在內的最多嘗試次數，之後移到 dead-letter stream
+MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv("MEDIA_JOB_MAX_ATTEMPTS", 3))
+# 工作超過此時間沒有心跳（worker 當掉）就由其他 worker 接手
+MEDIA_JOB_VISIBILITY_TIMEOUT_MS = int(
+    os.getenv("MEDIA_JOB_VISIBILITY_TIMEOUT_MS", 5 * 60 * 1000)
+)
+# 單一 ffmpeg 步驟的逾時（秒）
+MEDIA_JOB_TIMEOUT = float(os.getenv("MEDIA_JOB_TIMEOUT", 1800))
+MEDIA_WORKER_PROCESSES = int(os.getenv("MEDIA_WORKER_PROCESSES", os.cpu_count() or 1))
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+MEDIA_THUMBNAIL_WIDTH = int(os.getenv("MEDIA_THUMBNAIL_WIDTH", 640))
+# 低碼率版本，格式為 "高度:碼率"，以逗號分隔
+MEDIA_RENDITIONS = os.getenv("MEDIA_RENDITIONS", "360:600k,720:2500k")
+
+# 把舊比賽文件內嵌的 videos / metrics 搬到子 collection 時，每批處理的比賽數量
+CONTEST_SPLIT_BATCH_SIZE = int(os.getenv("CONTEST_SPLIT_BATCH_SIZE", 500))
+
+# Prometheus /metrics；以多個 uvicorn worker 執行時需設定 PROMETHEUS_MULTIPROC_DIR
+# （每次啟動前清空該目錄），各 worker 的數值會在讀取時合併
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# 事件迴圈延遲、連線池與快取計數的取樣間隔（秒）
+METRICS_SAMPLE_INTERVAL = float(os.getenv("METRICS_SAMPLE_INTERVAL", 1))
+
+# 慢查詢紀錄：指令超過 SLOW_QUERY_MS 就記錄條件結構（值已遮蔽）、排序、路由與耗時，
+# 並在背景執行 explain；相同結構的查詢在 EXPLAIN_INTERVAL 秒內只 explain 一次
+SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+# 等待 explain / 寫入的慢查詢上限，超過時丟棄並計數
+SLOW_QUERY_QUEUE_SIZE = int(os.getenv("SLOW_QUERY_QUEUE_SIZE", 100))
+SLOW_QUERY_COLLECTION_BYTES = int(
+    os.getenv("SLOW_QUERY_COLLECTION_BYTES", 16 * 1024 * 1024)
+)
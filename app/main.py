@@ -1,54 +1,188 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
-import bcrypt
 import uvicorn
 from fastapi import Depends, FastAPI
-from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-
-from app.config import CONTEST_COLLECTION, MONGO_DB, MONGO_URL, USER_COLLECTION
+from fastapi.responses import JSONResponse, ORJSONResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.config import (
+    ATHLETE_STATS_WORKER,
+    CONTEST_COLLECTION,
+    FAST_SERIALIZATION,
+    METRICS_ENABLED,
+    MONGO_DB,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_WARMUP_CONNECTIONS,
+    SLOW_QUERY_ENABLED,
+    USER_COLLECTION,
+)
 from app.model import user_model
-from app.router import auth_router, contest_router, user_router
+from app.router import (
+    auth_router,
+    contest_router,
+    metrics_router,
+    system_router,
+    user_router,
+)
 from app.schema import user_schema
-from app.sql.crud import user_crud
-from app.sql.db import get_database
+from app.sql.crud import contest_crud, user_crud
+from app.sql.db import (
+    create_mongo_client,
+    create_redis,
+    create_redis_pool,
+    get_database,
+    redis_pool_stats,
+    warmup_mongo,
+)
+from app.sql.indexes import (
+    ensure_collections,
+    ensure_required_indexes,
+    reconcile_indexes,
+)
+from app.sql.monitoring import pool_stats
+from app.sql.slow_query import slow_query_log
 from app.utils import create_log
+from app.utils.auth_cache import listen_invalidations, principal_cache
+from app.utils.contest_feed import contest_feed
+from app.utils.exception import UserAlreadyExistsException
+from app.utils.hashing import hash_password, password_hasher
+from app.utils.metrics import MetricsMiddleware, MetricsSampler, mark_process_dead
+from app.utils.response_cache import response_cache
+from app.utils.revocation import revocation_mirror
+from app.utils.route_context import RouteContextMiddleware
+from app.utils.shot_buffer import shot_buffer
+from app.worker.athlete_stats import run_athlete_stats
 
 
 async def startup_db(app: FastAPI):
     create_log("Starting up database")
-    app.mongodb_client = AsyncIOMotorClient(MONGO_URL)
+    app.mongodb_client = create_mongo_client()
     app.mongodb = app.mongodb_client[MONGO_DB]
+    await warmup_mongo(app.mongodb_client, MONGO_WARMUP_CONNECTIONS)
+    # time-series collection 必須在第一次寫入前建立
+    await ensure_collections(app.mongodb)
+    # username 的唯一索引不能等背景同步，建立失敗（例如已有重複帳號）就不啟動
+    await ensure_required_indexes(app.mongodb)
+    app.slow_query = None
+    if SLOW_QUERY_ENABLED:
+        app.slow_query = slow_query_log.start(app.mongodb)
+    app.index_sync = asyncio.create_task(reconcile_indexes(app.mongodb))
     contest_collection = app.mongodb[CONTEST_COLLECTION]
-    await contest_collection.create_index("name")
-    await contest_collection.create_index("athlete.id")
-    await contest_collection.create_index("athlete.name")
+    app.search_backfill = asyncio.create_task(backfill_search(contest_collection))
+    app.contest_feed = asyncio.create_task(contest_feed.run(contest_collection))
+    app.athlete_stats = None
+    if ATHLETE_STATS_WORKER:
+        app.athlete_stats = asyncio.create_task(
+            run_athlete_stats(app.mongodb_client, app.mongodb)
+        )
+
+
+async def backfill_search(contest_collection):
+    updated = await contest_crud.backfill_search_fields(contest_collection)
+    if updated:
+        create_log(f"Backfilled search fields for {updated} contests")
 
 
 async def shutdown_db(app: FastAPI):
     create_log("Shutting down database")
+    app.index_sync.cancel()
+    app.search_backfill.cancel()
+    app.contest_feed.cancel()
+    if app.athlete_stats:
+        app.athlete_stats.cancel()
+    if app.slow_query:
+        slow_query_log.stop()
+        app.slow_query.cancel()
     app.mongodb_client.close()
 
 
+async def startup_redis(app: FastAPI):
+    create_log("Starting up redis")
+    app.redis_pool = create_redis_pool()
+    app.redis = create_redis(app.redis_pool)
+    app.auth_listener = asyncio.create_task(listen_invalidations(app.redis))
+
+
+async def shutdown_redis(app: FastAPI):
+    create_log("Shutting down redis")
+    app.auth_listener.cancel()
+    try:
+        await app.auth_listener
+    except asyncio.CancelledError:
+        pass
+    await app.redis.aclose()
+    await app.redis_pool.disconnect()
+
+
+def startup_metrics(app: FastAPI):
+    app.metrics_sampler = None
+    if not METRICS_ENABLED:
+        return
+    sampler = MetricsSampler()
+    sampler.track_counter("principal", "hit", lambda: principal_cache.stats()["hits"])
+    sampler.track_counter(
+        "principal", "miss", lambda: principal_cache.stats()["misses"]
+    )
+    sampler.track_counter("revocation", "hit", lambda: revocation_mirror.local_hits)
+    sampler.track_counter("revocation", "miss", lambda: revocation_mirror.local_misses)
+    # mirror 尚未同步時改向 Redis 查詢黑名單
+    sampler.track_counter("revocation", "redis", lambda: revocation_mirror.redis_checks)
+    sampler.track_counter("response", "hit", lambda: response_cache.hits)
+    sampler.track_counter("response", "stale", lambda: response_cache.stale_hits)
+    sampler.track_counter("response", "miss", lambda: response_cache.misses)
+    for state in ("in_use", "available", "max_connections"):
+        sampler.track_gauge(
+            "redis",
+            state,
+            lambda state=state: redis_pool_stats(app.redis_pool)[state],
+        )
+    for state in ("in_use", "idle", "waiters"):
+        sampler.track_gauge(
+            "mongo", state, lambda state=state: pool_stats.snapshot()[state]
+        )
+    sampler.track_gauge("mongo", "max_connections", lambda: MONGO_MAX_POOL_SIZE)
+    app.metrics_sampler = asyncio.create_task(sampler.run())
+
+
+def shutdown_metrics(app: FastAPI):
+    if app.metrics_sampler:
+        app.metrics_sampler.cancel()
+        mark_process_dead()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
     create_log("Starting up")
     await startup_db(app)
+    await startup_redis(app)
+    startup_metrics(app)
 
     yield
 
     create_log("Shutting down")
+    shutdown_metrics(app)
+    # 剩下的射擊資料要在關閉 Mongo client 之前寫入
+    await shot_buffer.close()
+    await shutdown_redis(app)
     await shutdown_db(app)
+    password_hasher.shutdown()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if FAST_SERIALIZATION else JSONResponse,
+)
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(contest_router)
+app.include_router(system_router)
+app.include_router(metrics_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,8 +190,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
+# 讓慢查詢紀錄知道是哪個路由發出的查詢
+app.add_middleware(RouteContextMiddleware)
+if METRICS_ENABLED:
+    # 最外層，量到的時間包含其他 middleware
+    app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
@@ -72,11 +212,12 @@ async def tt_create_user(
     db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> user_model.UserResponseModel:
     user_collection = db[USER_COLLECTION]
-    user_dict = jsonable_encoder(user)
-    user_dict["password"] = bcrypt.hashpw(
-        user.password.encode("utf-8"), bcrypt.gensalt()
-    ).decode("utf-8")
-    new_user = await user_crud.create_user(user_collection, user_dict)
+    user_dict = user.model_dump(mode="json")
+    user_dict["password"] = await hash_password(user.password)
+    try:
+        new_user = await user_crud.create_user(user_collection, user_dict)
+    except DuplicateKeyError:
+        raise UserAlreadyExistsException()
     new_user = user_model.UserResponseModel(**new_user)
     return new_user
 
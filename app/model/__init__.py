@@ -1,2 +1,3 @@
+from app.model import bulk as bulk_model
 from app.model import contest as contest_model
 from app.model import user as user_model
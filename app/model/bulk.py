@@ -0,0 +1,23 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkResponseModel(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[BulkItemResult]
+
+    @classmethod
+    def from_results(cls, results: list[BulkItemResult]) -> "BulkResponseModel":
+        succeeded = sum(result.ok for result in results)
+        return cls(
+            succeeded=succeeded, failed=len(results) - succeeded, results=results
+        )
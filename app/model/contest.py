@@ -4,14 +4,28 @@ from typing import Optional
 from pydantic import BaseModel
 
 from app.model.user import User
-from app.utils.enums import ContestStatus
+from app.utils.enums import ContestStatus, TrainType
+
+
+class Rendition(BaseModel):
+    id: str
+    url: str
+    height: int
+    bitrate: str
+    length: int
 
 
 class Video(BaseModel):
+    # 子 collection 的 _id；上傳到 GridFS 的影片與 file id 相同
+    id: Optional[str] = None
     name: str
     description: str
     url: str
-    thumbnail: str
+    thumbnail: Optional[str] = None
+    content_type: Optional[str] = None
+    length: Optional[int] = None
+    # 由 media worker 產生，處理完成前為 None
+    renditions: Optional[list[Rendition]] = None
     created_time: datetime
 
 
@@ -29,14 +43,17 @@ class SkeetMetric(BaseMetric):
     pass
 
 
+class ContestMetricModel(BaseMetric):
+    id: str
+    key: str
+
+
 class Contest(BaseModel):
     name: str
     description: Optional[str] = None
     athlete: User
     status: ContestStatus = ContestStatus.INIT
     train_type: str
-    metrics: Optional[dict[str, BaseMetric]] = None
-    videos: Optional[list[Video]] = None
     created_time: datetime
 
 
@@ -47,6 +64,51 @@ class ContestResponseModel(BaseModel):
     athlete: User
     status: ContestStatus
     train_type: str
-    metrics: Optional[dict[str, BaseMetric]] = None
-    videos: Optional[list[Video]] = None
     created_time: datetime
+
+
+class AthleteSummary(BaseModel):
+    id: str
+    name: str
+
+
+class ContestSummaryModel(BaseModel):
+    id: str
+    name: str
+    athlete: AthleteSummary
+    status: ContestStatus
+    train_type: str
+    created_time: datetime
+
+
+class ShotIngestResponseModel(BaseModel):
+    accepted: int
+    dropped: int
+
+
+class ContestScoreModel(BaseModel):
+    contest_id: str
+    train_type: TrainType
+    targets_per_round: int
+    shots: int
+    hits: int
+    hit_rate: float
+    round_scores: list[int]
+    station_hit_rates: dict[str, float]
+    longest_streak: int
+    current_streak: int
+
+
+class AthleteAnalyticsModel(BaseModel):
+    athlete_id: str
+    train_type: TrainType
+    targets_per_round: int
+    contests: int
+    rounds: int
+    shots: int
+    hits: int
+    hit_rate: float
+    best_round: int
+    longest_streak: int
+    window: int
+    moving_average: list[float]
@@ -3,7 +3,7 @@ from typing import Optional
 
 from pydantic import BaseModel
 
-from app.utils.enums import UserPermission
+from app.utils.enums import ContestStatus, UserPermission
 
 
 class UserAuth(BaseModel):
@@ -25,3 +25,20 @@ class User(BaseModel):
     name: str
     permission: UserPermission
     created_time: datetime
+
+
+class LatestContest(BaseModel):
+    id: str
+    name: str
+    status: ContestStatus
+    train_type: str
+    created_time: datetime
+
+
+class AthleteStatsModel(BaseModel):
+    athlete_id: str
+    total: int = 0
+    by_status: dict[str, int] = {}
+    by_train_type: dict[str, int] = {}
+    latest: Optional[LatestContest] = None
+    updated_time: Optional[datetime] = None
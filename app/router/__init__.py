@@ -1,3 +1,5 @@
 from app.router.auth import router as auth_router
 from app.router.contest import router as contest_router
+from app.router.metrics import router as metrics_router
+from app.router.system import router as system_router
 from app.router.user import router as user_router
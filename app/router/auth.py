@@ -47,9 +47,10 @@ async def change_password(
     form_data: schema.ChangePassword,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
     try:
-        res = await AuthService.change_password(db, current_user, form_data)
+        res = await AuthService.change_password(db, redis, current_user, form_data)
         return res
     except PasswordNotMatchException:
         raise
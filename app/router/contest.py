@@ -1,17 +1,50 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketException,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.asyncio.client import Redis
 
-from app.model import contest_model
+from app.config import BULK_MAX_ITEMS, CONTEST_EXPORT_BATCH_SIZE, SHOT_BATCH_MAX_ITEMS
+from app.model import bulk_model, contest_model
 from app.schema import contest_schema
 from app.service import ContestService
-from app.sql.db import get_database
-from app.utils.enums import all_permissions
+from app.sql.db import get_database, get_redis
+from app.utils.contest_feed import contest_feed
+from app.utils.enums import (
+    ContestView,
+    ExportFormat,
+    PageMeta,
+    TrainType,
+    all_permissions,
+    high_permissions,
+)
 from app.utils.exception import (
+    ContentLengthNotValidException,
     ContestNotFoundException,
+    ContestNotRunningException,
+    CursorNotSupportedException,
     IdNotValidException,
+    InvalidSortFieldException,
+    RangeNotSatisfiableException,
     UserNotFoundException,
+    VideoNotFoundException,
+    VideoTooLargeException,
+)
+from app.utils.response_cache import CONTEST_NAMESPACE, response_cache
+from app.utils.security import check_permission, check_ws_permission, is_authorized
+from app.utils.serializer import (
+    contest_serializer,
+    contest_summary_serializer,
+    respond,
 )
-from app.utils.security import check_permission
 
 router = APIRouter(prefix="/contests", tags=["contest"])
 
@@ -21,53 +54,224 @@ async def create_contest(
     contest: contest_schema.CreateContest,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
     try:
-        res = await ContestService.create_contest(db, contest, current_user)
-        return res
+        res = await ContestService.create_contest(db, redis, contest, current_user)
+        return respond(res)
     except UserNotFoundException:
         raise
     except Exception as e:
         raise e
 
 
+@router.post("/batch", response_model=bulk_model.BulkResponseModel)
+async def create_contests(
+    contests: list[contest_schema.CreateContest] = Body(
+        ..., min_length=1, max_length=BULK_MAX_ITEMS
+    ),
+    current_user: dict = Depends(check_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    try:
+        res = await ContestService.create_contests(db, redis, contests, current_user)
+        return res
+    except Exception as e:
+        raise e
+
+
+@router.patch("/batch", response_model=bulk_model.BulkResponseModel)
+async def update_contests(
+    contests: list[contest_schema.UpdateContest] = Body(
+        ..., min_length=1, max_length=BULK_MAX_ITEMS
+    ),
+    current_user: dict = Depends(check_permission(high_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    try:
+        res = await ContestService.update_contests(db, redis, contests)
+        return res
+    except Exception as e:
+        raise e
+
+
 @router.get("/")
 async def get_all_contests(
+    request: Request,
     current_user: dict = Depends(check_permission(all_permissions)),
-    skip: int = Query(0, description="Number of items to skip"),
+    cursor: str = Query(
+        None, description="Cursor from the X-Next-Cursor header of the previous page"
+    ),
+    skip: int = Query(0, description="Number of items to skip (legacy paging)"),
     limit: int = Query(10, description="Number of items to retrieve"),
     sort_by: str = Query("created_time", description="Field to sort by"),
     sort_order: int = Query(
         1, description="Sort order: 1 for ascending, -1 for descending"
     ),
-    search: str = Query(
-        None, description="Search for a contest by name or description"
+    search: str = Query(None, description="Search contests by name or athlete name"),
+    view: ContestView = Query(
+        ContestView.FULL, description="summary: slim list fields, full: whole contest"
+    ),
+    meta: PageMeta = Query(
+        None,
+        description="Wrap the page with total/has_next (total) and status/train_type counts (facets)",
     ),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
-    try:
-        res = await ContestService.get_all_contests(
+    async def load():
+        res, next_cursor = await ContestService.get_all_contests(
             db,
             skip,
             limit,
             sort_by,
             sort_order,
             search,
+            cursor,
+            view,
+            meta,
         )
-        return res
+        return res, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    try:
+        return await response_cache.respond(
+            CONTEST_NAMESPACE, request, current_user, redis, load
+        )
+    except (InvalidSortFieldException, CursorNotSupportedException):
+        raise
     except Exception as e:
         raise e
 
 
 @router.get("/{contest_id}", response_model=contest_model.ContestResponseModel)
 async def get_contest_by_id(
+    request: Request,
     contest_id: str,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
+    async def load():
+        return await ContestService.get_contest_by_id(db, contest_id), {}
+
     try:
-        res = await ContestService.get_contest_by_id(db, contest_id)
-        return res
+        return await response_cache.respond(
+            CONTEST_NAMESPACE, request, current_user, redis, load, contest_serializer
+        )
+    except ContestNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.post(
+    "/{contest_id}/shots",
+    status_code=202,
+    response_model=contest_model.ShotIngestResponseModel,
+)
+async def ingest_shots(
+    contest_id: str,
+    samples: list[contest_schema.ShotSample] = Body(
+        ..., min_length=1, max_length=SHOT_BATCH_MAX_ITEMS
+    ),
+    current_user: dict = Depends(check_permission(high_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        return await ContestService.ingest_shots(db, contest_id, samples)
+    except ContestNotFoundException:
+        raise
+    except ContestNotRunningException:
+        raise
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.get("/{contest_id}/scores", response_model=contest_model.ContestScoreModel)
+async def get_contest_scores(
+    contest_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        return await ContestService.get_contest_scores(db, contest_id)
+    except ContestNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.post(
+    "/{contest_id}/videos", status_code=201, response_model=contest_model.Video
+)
+async def upload_video(
+    request: Request,
+    contest_id: str,
+    name: str = Query(..., description="Video file name"),
+    description: str = Query("", description="Video description"),
+    current_user: dict = Depends(check_permission(high_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    """request body 即為影片內容，邊收邊寫入 GridFS"""
+    content_length = request.headers.get("content-length")
+    try:
+        content_length = int(content_length) if content_length else None
+    except ValueError:
+        raise ContentLengthNotValidException()
+    if content_length is not None and content_length < 0:
+        raise ContentLengthNotValidException()
+    try:
+        return await ContestService.upload_video(
+            db,
+            redis,
+            contest_id,
+            request.stream(),
+            name,
+            description,
+            request.headers.get("content-type", "application/octet-stream"),
+            content_length,
+        )
+    except ContestNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except VideoTooLargeException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.get("/{contest_id}/videos", response_model=list[contest_model.Video])
+async def get_contest_videos(
+    request: Request,
+    contest_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    cursor: str = Query(
+        None, description="Cursor from the X-Next-Cursor header of the previous page"
+    ),
+    limit: int = Query(10, description="Number of items to retrieve"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    async def load():
+        res, next_cursor = await ContestService.get_contest_videos(
+            db, contest_id, limit, cursor
+        )
+        return res, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    try:
+        return await response_cache.respond(
+            CONTEST_NAMESPACE, request, current_user, redis, load
+        )
     except ContestNotFoundException:
         raise
     except IdNotValidException:
@@ -77,15 +281,162 @@ async def get_contest_by_id(
 
 
 @router.get(
-    "/athletes/{athlete_id}", response_model=list[contest_model.ContestResponseModel]
+    "/{contest_id}/metrics", response_model=list[contest_model.ContestMetricModel]
+)
+async def get_contest_metrics(
+    request: Request,
+    contest_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    cursor: str = Query(
+        None, description="Cursor from the X-Next-Cursor header of the previous page"
+    ),
+    limit: int = Query(10, description="Number of items to retrieve"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    async def load():
+        res, next_cursor = await ContestService.get_contest_metrics(
+            db, contest_id, limit, cursor
+        )
+        return res, {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    try:
+        return await response_cache.respond(
+            CONTEST_NAMESPACE, request, current_user, redis, load
+        )
+    except ContestNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.get("/{contest_id}/videos/{video_id}")
+async def stream_video(
+    request: Request,
+    contest_id: str,
+    video_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        body, status_code, headers, media_type = await ContestService.stream_video(
+            db, contest_id, video_id, request.headers.get("range")
+        )
+        return StreamingResponse(
+            body, status_code=status_code, headers=headers, media_type=media_type
+        )
+    except VideoNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except RangeNotSatisfiableException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.websocket("/{contest_id}/ws")
+async def watch_contest(
+    websocket: WebSocket,
+    contest_id: str,
+    current_user: dict = Depends(check_ws_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    """先送出目前的比賽資料，之後每次比賽更新都推送最新的完整資料"""
+    try:
+        contest = await ContestService.get_contest_by_id(db, contest_id)
+    except (ContestNotFoundException, IdNotValidException) as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+
+    async def authorize():
+        return await is_authorized(
+            current_user["access_token"], redis, db, all_permissions
+        )
+
+    await websocket.accept()
+    await contest_feed.serve(websocket, contest_id, contest, authorize)
+
+
+@router.get(
+    "/athletes/{athlete_id}",
+    response_model=list[
+        contest_model.ContestResponseModel | contest_model.ContestSummaryModel
+    ],
 )
 async def get_contest_by_athlete_id(
     athlete_id: str,
     current_user: dict = Depends(check_permission(all_permissions)),
+    view: ContestView = Query(
+        ContestView.FULL, description="summary: slim list fields, full: whole contest"
+    ),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
     try:
-        res = await ContestService.get_contest_by_athlete_id(db, athlete_id)
-        return res
+        res = await ContestService.get_contest_by_athlete_id(db, athlete_id, view)
+        return respond(
+            res,
+            (
+                contest_summary_serializer
+                if view == ContestView.SUMMARY
+                else contest_serializer
+            ),
+        )
+    except Exception as e:
+        raise e
+
+
+@router.get(
+    "/athletes/{athlete_id}/analytics",
+    response_model=contest_model.AthleteAnalyticsModel,
+)
+async def get_athlete_analytics(
+    athlete_id: str,
+    train_type: TrainType = Query(..., description="Discipline to analyze"),
+    window: int = Query(5, ge=1, description="Rounds per moving average point"),
+    last: int = Query(100, ge=0, description="Number of moving average points"),
+    current_user: dict = Depends(check_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        return await ContestService.get_athlete_analytics(
+            db, athlete_id, train_type, window, last
+        )
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.get("/athletes/{athlete_id}/export")
+async def export_contests_by_athlete_id(
+    athlete_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    view: ContestView = Query(
+        ContestView.FULL, description="summary: slim list fields, full: whole contest"
+    ),
+    format: ExportFormat = Query(
+        ExportFormat.NDJSON, description="ndjson: one contest per line, json: array"
+    ),
+    batch_size: int = Query(
+        CONTEST_EXPORT_BATCH_SIZE,
+        ge=1,
+        le=10000,
+        description="Number of contests fetched from MongoDB per round trip",
+    ),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        res = ContestService.export_contests_by_athlete_id(
+            db, athlete_id, view, format, batch_size
+        )
+        media_type = (
+            "application/x-ndjson"
+            if format == ExportFormat.NDJSON
+            else "application/json"
+        )
+        return StreamingResponse(res, media_type=media_type)
     except Exception as e:
         raise e
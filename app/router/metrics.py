@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.utils.metrics import render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus 抓取時不帶 token；同步函式在 threadpool 執行，
+    # 合併多個 worker 的檔案時不會卡住事件迴圈
+    try:
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
+    except Exception as e:
+        raise e
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, Query, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.asyncio.client import Redis
+
+from app.config import SLOW_QUERY_COLLECTION
+from app.sql.crud import contest_crud, slow_query_crud, user_crud
+from app.sql.db import get_database, get_redis, redis_pool_stats
+from app.sql.indexes import index_report
+from app.sql.monitoring import pool_stats
+from app.sql.slow_query import slow_query_log
+from app.utils.auth_cache import principal_cache
+from app.utils.contest_feed import contest_feed
+from app.utils.enums import top_permissions
+from app.utils.hashing import password_hasher
+from app.utils.job_queue import media_queue
+from app.utils.response_cache import response_cache
+from app.utils.revocation import revocation_mirror
+from app.utils.security import check_permission
+from app.utils.shot_buffer import shot_buffer
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+
+@router.get("/mongo/pool")
+async def get_mongo_pool_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return pool_stats.snapshot()
+    except Exception as e:
+        raise e
+
+
+@router.get("/redis/pool")
+async def get_redis_pool_stats(
+    request: Request,
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return redis_pool_stats(request.app.redis_pool)
+    except Exception as e:
+        raise e
+
+
+@router.get("/auth/cache")
+async def get_auth_cache_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return {
+            "principal": principal_cache.stats(),
+            "revocation": revocation_mirror.stats(),
+        }
+    except Exception as e:
+        raise e
+
+
+@router.get("/password-hasher")
+async def get_password_hasher_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return password_hasher.stats()
+    except Exception as e:
+        raise e
+
+
+@router.get("/loaders")
+async def get_loader_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return {
+            "user_by_id": user_crud.user_by_id_loader.stats(),
+            "user_by_username": user_crud.user_by_username_loader.stats(),
+            "contest_by_id": contest_crud.contest_by_id_loader.stats(),
+        }
+    except Exception as e:
+        raise e
+
+
+@router.get("/response-cache")
+async def get_response_cache_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return response_cache.stats()
+    except Exception as e:
+        raise e
+
+
+@router.get("/mongo/indexes")
+async def get_index_report(
+    current_user: dict = Depends(check_permission(top_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        return await index_report(db)
+    except Exception as e:
+        raise e
+
+
+@router.get("/contest-feed")
+async def get_contest_feed_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return contest_feed.stats()
+    except Exception as e:
+        raise e
+
+
+@router.get("/shot-ingest")
+async def get_shot_ingest_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+):
+    try:
+        return shot_buffer.stats()
+    except Exception as e:
+        raise e
+
+
+@router.get("/media-queue")
+async def get_media_queue_stats(
+    current_user: dict = Depends(check_permission(top_permissions)),
+    redis: Redis = Depends(get_redis),
+):
+    try:
+        return await media_queue.stats(redis)
+    except Exception as e:
+        raise e
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    current_user: dict = Depends(check_permission(top_permissions)),
+    limit: int = Query(50, ge=1, le=1000, description="Number of entries"),
+    route: str = Query(None, description='Filter by route, e.g. "GET /contests/"'),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        entries = await slow_query_crud.get_recent(
+            db[SLOW_QUERY_COLLECTION], limit, route
+        )
+        return {**slow_query_log.stats(), "entries": entries}
+    except Exception as e:
+        raise e
+
+
+@router.get("/slow-queries/shapes")
+async def get_slow_query_shapes(
+    current_user: dict = Depends(check_permission(top_permissions)),
+    limit: int = Query(20, ge=1, le=200, description="Number of query shapes"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    try:
+        return await slow_query_crud.summarize_shapes(db[SLOW_QUERY_COLLECTION], limit)
+    except Exception as e:
+        raise e
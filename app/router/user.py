@@ -1,17 +1,23 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Body, Depends, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.asyncio.client import Redis
 
+from app.config import BULK_MAX_ITEMS
+from app.model import bulk_model
 from app.model import user as user_model
 from app.schema import user as user_schema
 from app.service import UserService
-from app.sql.db import get_database
-from app.utils.enums import all_permissions, high_permissions
+from app.sql.db import get_database, get_redis
+from app.utils.enums import PageMeta, all_permissions, high_permissions
 from app.utils.exception import (
     IdNotValidException,
+    InvalidSortFieldException,
     UserAlreadyExistsException,
     UserNotFoundException,
 )
+from app.utils.response_cache import USER_NAMESPACE, response_cache
 from app.utils.security import check_permission
+from app.utils.serializer import respond, user_serializer
 
 router = APIRouter(prefix="/users", tags=["user"])
 
@@ -23,7 +29,7 @@ async def get_user(
 ):
     try:
         user = await UserService.get_me(db, current_user)
-        return user
+        return respond(user, user_serializer)
     except UserNotFoundException:
         raise
     except Exception as e:
@@ -35,61 +41,120 @@ async def create_user(
     user: user_schema.CreateUser,
     current_user: dict = Depends(check_permission(high_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
     try:
-        res = await UserService.create_user(db, user)
-        return res
+        res = await UserService.create_user(db, redis, user)
+        return respond(res)
     except UserAlreadyExistsException:
         raise
     except Exception as e:
         raise e
 
 
+@router.post("/batch", response_model=bulk_model.BulkResponseModel)
+async def create_users(
+    users: list[user_schema.CreateUser] = Body(
+        ..., min_length=1, max_length=BULK_MAX_ITEMS
+    ),
+    current_user: dict = Depends(check_permission(high_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    try:
+        res = await UserService.create_users(db, redis, users)
+        return res
+    except Exception as e:
+        raise e
+
+
 @router.get("/")
 async def get_all_users(
+    response: Response,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
-    skip: int = Query(0, description="Number of items to skip"),
+    cursor: str = Query(
+        None, description="Cursor from the X-Next-Cursor header of the previous page"
+    ),
+    skip: int = Query(0, description="Number of items to skip (legacy paging)"),
     limit: int = Query(10, description="Number of items to retrieve"),
     sort_by: str = Query("created_time", description="Field to sort by"),
     sort_order: int = Query(
         1, description="Sort order: 1 for ascending, -1 for descending"
     ),
+    meta: PageMeta = Query(
+        None,
+        description="Wrap the page with total/has_next (total) and permission counts (facets)",
+    ),
 ):
     try:
-        users = await UserService.get_all_users(
+        users, next_cursor = await UserService.get_all_users(
             db=db,
             skip=skip,
             limit=limit,
             sort_by=sort_by,
             sort_order=sort_order,
+            cursor=cursor,
+            meta=meta,
         )
-        return users
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return respond(users, headers=response.headers)
+    except InvalidSortFieldException:
+        raise
     except Exception as e:
         raise e
 
 
 @router.get("/athletes")
 async def get_all_athletes(
+    request: Request,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
+    async def load():
+        return await UserService.get_all_athletes(db), {}
+
     try:
-        athletes = await UserService.get_all_athletes(db)
-        return athletes
+        return await response_cache.respond(
+            USER_NAMESPACE, request, current_user, redis, load
+        )
     except Exception as e:
         raise e
 
 
 @router.get("/{user_id}", response_model=user_model.UserResponseModel)
 async def get_user_by_id(
+    request: Request,
+    user_id: str,
+    current_user: dict = Depends(check_permission(all_permissions)),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
+):
+    async def load():
+        return await UserService.get_user_by_id(db, user_id), {}
+
+    try:
+        return await response_cache.respond(
+            USER_NAMESPACE, request, current_user, redis, load, user_serializer
+        )
+    except UserNotFoundException:
+        raise
+    except IdNotValidException:
+        raise
+    except Exception as e:
+        raise e
+
+
+@router.get("/{user_id}/stats", response_model=user_model.AthleteStatsModel)
+async def get_user_stats(
     user_id: str,
     current_user: dict = Depends(check_permission(all_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
     try:
-        user = await UserService.get_user_by_id(db, user_id)
-        return user
+        return await UserService.get_user_stats(db, user_id)
     except UserNotFoundException:
         raise
     except IdNotValidException:
@@ -103,9 +168,10 @@ async def reset_password(
     user_id: str,
     current_user: dict = Depends(check_permission(high_permissions)),
     db: AsyncIOMotorDatabase = Depends(get_database),
+    redis: Redis = Depends(get_redis),
 ):
     try:
-        res = await UserService.reset_password(db, user_id, current_user)
+        res = await UserService.reset_password(db, redis, user_id, current_user)
         return res
     except IdNotValidException:
         raise
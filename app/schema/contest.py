@@ -1,8 +1,13 @@
+from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from app.utils.enums import TrainType
+from app.utils.enums import ContestStatus, TrainType
+
+# 射擊資料的上限，分析時 round / station 以 int32 / int16 陣列計算
+SHOT_MAX_ROUND = 10_000
+SHOT_MAX_STATION = 100
 
 
 class CreateContest(BaseModel):
@@ -10,3 +15,19 @@ class CreateContest(BaseModel):
     athlete_id: str
     train_type: TrainType
     description: Optional[str] = None
+
+
+class UpdateContest(BaseModel):
+    id: str
+    status: Optional[ContestStatus] = None
+    description: Optional[str] = None
+
+
+class ShotSample(BaseModel):
+    timestamp: datetime
+    round: int = Field(ge=1, le=SHOT_MAX_ROUND)
+    station: int = Field(ge=1, le=SHOT_MAX_STATION)
+    target: int = Field(ge=1)
+    hit: bool
+    # 依比賽 metrics 定義的名稱記錄數值
+    metrics: dict[str, float] = {}
@@ -1,6 +1,5 @@
 from datetime import timedelta
 
-import bcrypt
 from bson.objectid import ObjectId
 from fastapi.encoders import jsonable_encoder
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -9,11 +8,14 @@ from redis.asyncio.client import Redis
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, USER_COLLECTION
 from app.schema import user as schema
 from app.sql.crud import user_crud
+from app.utils.auth_cache import invalidate_user
 from app.utils.exception import (
     IncorrectCredentialsException,
     PasswordNotMatchException,
     UserNotFoundException,
 )
+from app.utils.hashing import hash_password, verify_password
+from app.utils.response_cache import USER_NAMESPACE, response_cache
 from app.utils.security import blacklist_token, check_otp, create_access_token
 
 
@@ -53,10 +55,7 @@ class AuthService:
             }
 
         # 檢查密碼是否正確
-        if bcrypt.checkpw(
-            data_dict["password"].encode("utf-8"),
-            user_in_db["password"].encode("utf-8"),
-        ):
+        if await verify_password(data_dict["password"], user_in_db["password"]):
             access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
             access_token = create_access_token(
                 data={"sub": user_in_db["username"]}, expires_delta=access_token_expires
@@ -81,6 +80,7 @@ class AuthService:
     @staticmethod
     async def change_password(
         db: AsyncIOMotorDatabase,
+        redis: Redis,
         current_user: dict,
         form_data: schema.ChangePassword,
     ):
@@ -98,13 +98,15 @@ class AuthService:
         if not user_in_db:
             raise UserNotFoundException()
 
-        user_dict["password"] = bcrypt.hashpw(
-            user_dict["password"].encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
-        # 更新密碼
-        await user_crud.update_user(
+        user_dict["password"] = await hash_password(user_dict["password"])
+        # 更新密碼，使用者可能在雜湊期間被刪除
+        user = await user_crud.update_user(
             user_collection,
             ObjectId(user_in_db["id"]),
             {"password": user_dict["password"], "is_use_otp": False},
         )
+        if not user:
+            raise UserNotFoundException()
+        await invalidate_user(redis, user_in_db["username"])
+        await response_cache.invalidate(redis, USER_NAMESPACE)
         return {"message": "successful"}
@@ -1,18 +1,79 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
-from fastapi.encoders import jsonable_encoder
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pydantic import ValidationError
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
 
-from app.config import CONTEST_COLLECTION, USER_COLLECTION
-from app.model import contest_model, user_model
+from app.config import (
+    ANALYTICS_HISTORY_TTL,
+    ANALYTICS_LIVE_TTL,
+    CONTEST_COLLECTION,
+    CONTEST_EXPORT_BATCH_SIZE,
+    CONTEST_METRIC_COLLECTION,
+    CONTEST_VIDEO_COLLECTION,
+    SHOT_COLLECTION,
+    STREAM_CHUNK_SIZE,
+    USER_COLLECTION,
+    VIDEO_BUCKET,
+    VIDEO_CHUNK_SIZE,
+    VIDEO_MAX_BYTES,
+)
+from app.model import bulk_model, contest_model, user_model
 from app.schema import contest_schema
-from app.sql.crud import contest_crud, user_crud
-from app.utils.enums import ContestStatus
+from app.sql.crud import (
+    contest_child_crud,
+    contest_crud,
+    shot_crud,
+    user_crud,
+    video_crud,
+)
+from app.utils import create_log
+from app.utils.enums import (
+    ContestStatus,
+    ContestView,
+    ExportFormat,
+    PageMeta,
+    TrainType,
+)
 from app.utils.exception import (
     ContestNotFoundException,
+    ContestNotRunningException,
+    CursorNotSupportedException,
     IdNotValidException,
+    InvalidSortFieldException,
+    ServiceBusyException,
     UserNotFoundException,
+    VideoNotFoundException,
+    VideoTooLargeException,
 )
+from app.utils.http_range import parse_range
+from app.utils.job_queue import VIDEO_PROCESS_JOB, media_queue
+from app.utils.pagination import next_cursor, split_page
+from app.utils.response_cache import CONTEST_NAMESPACE, response_cache
+from app.utils.scoring import analyze_history, score_cache, score_contest
 from app.utils.security import get_now
+from app.utils.shot_buffer import shot_buffer
+
+# 列表分頁 meta=facets 時回傳的分組計數欄位
+CONTEST_FACETS = ("status", "train_type")
+
+# 不會再有新射擊資料的比賽狀態，分析結果可以長時間快取
+FINAL_STATUSES = (ContestStatus.FINISHED, ContestStatus.CANCEL)
+
+
+def _new_contest(contest_dict: dict, athlete: user_model.User) -> dict:
+    return contest_model.Contest(
+        name=contest_dict["name"],
+        description=contest_dict["description"],
+        train_type=contest_dict["train_type"],
+        athlete=athlete,
+        status=ContestStatus.INIT,
+        created_time=get_now(),
+    ).model_dump()
 
 
 class ContestService:
@@ -20,37 +81,147 @@ class ContestService:
     @staticmethod
     async def create_contest(
         db: AsyncIOMotorDatabase,
+        redis: Redis,
         contest: contest_schema.CreateContest,
         current_user: dict,
     ):
         contest_collection = db.get_collection(CONTEST_COLLECTION)
         user_collection = db.get_collection(USER_COLLECTION)
 
-        contest_dict = jsonable_encoder(contest)
+        contest_dict = contest.model_dump(mode="json")
+
+        try:
+            athlete_id = ObjectId(contest_dict["athlete_id"])
+        except (InvalidId, TypeError):
+            raise IdNotValidException()
 
         # check if the athlete is in the database
-        athlete = await user_crud.get_user_by_id(
-            user_collection, contest_dict["athlete_id"]
-        )
+        athlete = await user_crud.get_user_by_id(user_collection, athlete_id)
         if not athlete:
             raise UserNotFoundException()
 
         athlete = user_model.User(**athlete)
-        new_contest = contest_model.Contest(
-            name=contest_dict["name"],
-            description=contest_dict["description"],
-            train_type=contest_dict["train_type"],
-            athlete=athlete,
-            status=ContestStatus.INIT,
-            videos=None,
-            metrics=None,
-            created_time=get_now(),
-        ).model_dump()
+        new_contest = _new_contest(contest_dict, athlete)
 
         new_contest = await contest_crud.create_contest(contest_collection, new_contest)
+        await response_cache.invalidate(redis, CONTEST_NAMESPACE)
         new_contest = contest_model.ContestResponseModel(**new_contest)
         return new_contest
 
+    @staticmethod
+    async def create_contests(
+        db: AsyncIOMotorDatabase,
+        redis: Redis,
+        contests: list[contest_schema.CreateContest],
+        current_user: dict,
+    ):
+        """批次建立比賽：一次 $in 查出所有選手，再以無序 insert_many 寫入"""
+        contest_collection = db.get_collection(CONTEST_COLLECTION)
+        user_collection = db.get_collection(USER_COLLECTION)
+
+        results: list[bulk_model.BulkItemResult | None] = [None] * len(contests)
+        contest_dicts = [contest.model_dump(mode="json") for contest in contests]
+        athlete_ids = {}
+        for index, contest_dict in enumerate(contest_dicts):
+            try:
+                athlete_ids[index] = ObjectId(contest_dict["athlete_id"])
+            except (InvalidId, TypeError):
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=IdNotValidException().detail
+                )
+
+        athletes = await user_crud.get_users_by_ids(
+            user_collection, list(set(athlete_ids.values()))
+        )
+
+        indexes, new_contests = [], []
+        for index, athlete_id in athlete_ids.items():
+            athlete = athletes.get(str(athlete_id))
+            if not athlete:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=UserNotFoundException().detail
+                )
+                continue
+            try:
+                athlete = user_model.User(**athlete)
+            except ValidationError:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error="Athlete data not valid"
+                )
+                continue
+            indexes.append(index)
+            new_contests.append(_new_contest(contest_dicts[index], athlete))
+
+        new_contests, errors = await contest_crud.create_contests(
+            contest_collection, new_contests
+        )
+        for position, index in enumerate(indexes):
+            if position in errors:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=errors[position].get("errmsg")
+                )
+            else:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=True, id=new_contests[position]["id"]
+                )
+        await response_cache.invalidate(redis, CONTEST_NAMESPACE)
+        return bulk_model.BulkResponseModel.from_results(results)
+
+    @staticmethod
+    async def update_contests(
+        db: AsyncIOMotorDatabase,
+        redis: Redis,
+        contests: list[contest_schema.UpdateContest],
+    ):
+        """批次更新比賽狀態/描述，寫入只需一次 bulk_write"""
+        contest_collection = db.get_collection(CONTEST_COLLECTION)
+
+        results: list[bulk_model.BulkItemResult | None] = [None] * len(contests)
+        updates = {}
+        for index, contest in enumerate(contests):
+            data = contest.model_dump(mode="json", exclude={"id"}, exclude_unset=True)
+            try:
+                contest_id = ObjectId(contest.id)
+            except (InvalidId, TypeError):
+                error = IdNotValidException().detail
+            else:
+                error = None if data else "Nothing to update"
+            # 狀態不能清空，否則之後讀取比賽時無法通過回應模型驗證
+            if not error and "status" in data and data["status"] is None:
+                error = "Status cannot be null"
+            if error:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=error
+                )
+                continue
+            updates[index] = (contest_id, data)
+
+        existing = await contest_crud.get_existing_ids(
+            contest_collection, [contest_id for contest_id, _ in updates.values()]
+        )
+        for index, (contest_id, _) in list(updates.items()):
+            if contest_id not in existing:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=ContestNotFoundException().detail
+                )
+                del updates[index]
+
+        indexes = list(updates)
+        errors, _ = await contest_crud.update_contests(
+            contest_collection, list(updates.values())
+        )
+        for position, index in enumerate(indexes):
+            if position in errors:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=errors[position].get("errmsg")
+                )
+            else:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=True, id=str(updates[index][0])
+                )
+        await response_cache.invalidate(redis, CONTEST_NAMESPACE)
+        return bulk_model.BulkResponseModel.from_results(results)
+
     @staticmethod
     async def get_all_contests(
         db: AsyncIOMotorDatabase,
@@ -59,17 +230,43 @@ class ContestService:
         sort_by: str = "created_time",
         sort_order: int = 1,
         search: str = None,
+        cursor: str = None,
+        view: ContestView = ContestView.FULL,
+        meta: PageMeta = None,
     ):
+        if sort_by not in contest_crud.SORTABLE_FIELDS:
+            raise InvalidSortFieldException()
+        if cursor and search:
+            # 搜尋結果依相關度排序，無法用 cursor 接續
+            raise CursorNotSupportedException()
         contest_collection = db.get_collection(CONTEST_COLLECTION)
-        contests = await contest_crud.get_all_contests(
+        contests_query = contest_crud.get_all_contests(
             contest_collection,
             skip=skip,
-            limit=limit,
+            limit=limit + 1 if meta else limit,
             sort_by=sort_by,
             sort_order=sort_order,
             search=search,
+            cursor=cursor,
+            view=view,
         )
-        return contests
+        if not meta:
+            contests = await contests_query
+            # skip 模式與搜尋結果（依相關度排序）不提供 cursor
+            cursor = None if skip or search else next_cursor(contests, limit, sort_by)
+            return contests, cursor
+
+        group_fields = CONTEST_FACETS if meta == PageMeta.FACETS else ()
+        contests, counts = await asyncio.gather(
+            contests_query,
+            contest_crud.count_contests(contest_collection, search, group_fields),
+        )
+        contests, has_next = split_page(contests, limit)
+        if skip or search or not has_next:
+            cursor = None
+        else:
+            cursor = next_cursor(contests, limit, sort_by)
+        return {"items": contests, "has_next": has_next, **counts}, cursor
 
     @staticmethod
     async def get_contest_by_id(db: AsyncIOMotorDatabase, contest_id: str):
@@ -78,7 +275,7 @@ class ContestService:
             contest_id = ObjectId(contest_id)
         except:
             raise IdNotValidException()
-        contest_in_db = await contest_crud.get_contest_by_id(
+        contest_in_db = await contest_crud.load_contest_by_id(
             contest_collection, contest_id
         )
         if not contest_in_db:
@@ -86,9 +283,244 @@ class ContestService:
         return contest_in_db
 
     @staticmethod
-    async def get_contest_by_athlete_id(db: AsyncIOMotorDatabase, athlete_id: str):
+    async def ingest_shots(
+        db: AsyncIOMotorDatabase,
+        contest_id: str,
+        samples: list[contest_schema.ShotSample],
+    ):
+        """射擊資料先進寫入緩衝，由背景批次寫入 time-series collection"""
+        contest = await ContestService.get_contest_by_id(db, contest_id)
+        if contest["status"] != ContestStatus.RUNNING:
+            raise ContestNotRunningException()
+        shots = [shot_crud.new_shot(contest, sample.model_dump()) for sample in samples]
+        dropped = shot_buffer.add(db.get_collection(SHOT_COLLECTION), shots)
+        if dropped == len(shots):
+            # 全部被丟棄代表寫入跟不上，請設備端稍後重送
+            raise ServiceBusyException()
+        return contest_model.ShotIngestResponseModel(
+            accepted=len(shots) - dropped, dropped=dropped
+        )
+
+    @staticmethod
+    async def get_contest_scores(db: AsyncIOMotorDatabase, contest_id: str):
+        contest = await ContestService.get_contest_by_id(db, contest_id)
+        key = ("contest", contest_id)
+        scores = score_cache.get(key)
+        if scores is None:
+            final = contest["status"] in FINAL_STATUSES
+            if final:
+                # 結束前收到的射擊資料可能還在這個 worker 的寫入緩衝
+                await shot_buffer.flush()
+            shot_collection = db.get_collection(SHOT_COLLECTION)
+            series = await shot_crud.load_series(
+                shot_collection, {"meta.contest_id": contest_id}
+            )
+            scores = score_contest(series, TrainType(contest["train_type"]))
+            ttl = ANALYTICS_LIVE_TTL
+            if final:
+                # 已結束的比賽不會再有新的射擊資料，但其他 worker 的緩衝可能還沒寫入；
+                # 第一次讀到已結束時仍用短 TTL，之後重新讀取的結果才長期快取
+                settled = ("contest_final", contest_id)
+                if score_cache.get(settled):
+                    ttl = None
+                else:
+                    score_cache.set(settled, True)
+            score_cache.set(key, scores, ttl)
+        return contest_model.ContestScoreModel(contest_id=contest_id, **scores)
+
+    @staticmethod
+    async def get_athlete_analytics(
+        db: AsyncIOMotorDatabase,
+        athlete_id: str,
+        train_type: TrainType,
+        window: int,
+        last: int,
+    ):
+        try:
+            ObjectId(athlete_id)
+        except:
+            raise IdNotValidException()
+        key = ("athlete", athlete_id, train_type, window, last)
+        analytics = score_cache.get(key)
+        if analytics is None:
+            shot_collection = db.get_collection(SHOT_COLLECTION)
+            series = await shot_crud.load_series(
+                shot_collection,
+                {"meta.athlete_id": athlete_id, "meta.train_type": train_type},
+            )
+            analytics = analyze_history(series, train_type, window, last)
+            score_cache.set(key, analytics, ANALYTICS_HISTORY_TTL)
+        return contest_model.AthleteAnalyticsModel(athlete_id=athlete_id, **analytics)
+
+    @staticmethod
+    async def upload_video(
+        db: AsyncIOMotorDatabase,
+        redis: Redis,
+        contest_id: str,
+        chunks: AsyncIterator[bytes],
+        name: str,
+        description: str,
+        content_type: str,
+        content_length: Optional[int] = None,
+    ):
+        """影片以串流寫入 GridFS，完成後加入比賽的影片子 collection"""
+        contest = await ContestService.get_contest_by_id(db, contest_id)
+        if content_length is not None and content_length > VIDEO_MAX_BYTES:
+            raise VideoTooLargeException()
+        bucket = AsyncIOMotorGridFSBucket(db, bucket_name=VIDEO_BUCKET)
+        file_id, length = await video_crud.upload_video(
+            bucket,
+            name,
+            chunks,
+            {"contest_id": contest["id"], "content_type": content_type},
+            VIDEO_CHUNK_SIZE,
+            VIDEO_MAX_BYTES,
+        )
+        video = contest_model.Video(
+            name=name,
+            description=description,
+            url=f"/contests/{contest['id']}/videos/{file_id}",
+            content_type=content_type,
+            length=length,
+            created_time=get_now(),
+        ).model_dump(exclude={"id"})
+        video_collection = db.get_collection(CONTEST_VIDEO_COLLECTION)
+        try:
+            video = await contest_child_crud.create_child(
+                video_collection, contest["id"], {"_id": file_id, **video}
+            )
+        except BaseException:
+            # 影片沒有掛到比賽上就不會再被讀到，GridFS 的檔案一併刪除
+            await video_crud.delete_video(bucket, file_id)
+            raise
+        await response_cache.invalidate(redis, CONTEST_NAMESPACE)
+        # 縮圖與低碼率版本交給 media worker；排入失敗時影片仍可播放，只是沒有縮圖
+        try:
+            await media_queue.enqueue(
+                redis,
+                VIDEO_PROCESS_JOB,
+                {"contest_id": contest["id"], "video_id": str(file_id)},
+            )
+        except RedisError as e:
+            create_log(f"Failed to enqueue video {file_id}: {e}")
+        return video
+
+    @staticmethod
+    async def get_contest_videos(
+        db: AsyncIOMotorDatabase,
+        contest_id: str,
+        limit: int = 10,
+        cursor: str = None,
+    ):
+        return await ContestService._get_children(
+            db, CONTEST_VIDEO_COLLECTION, contest_id, limit, cursor
+        )
+
+    @staticmethod
+    async def get_contest_metrics(
+        db: AsyncIOMotorDatabase,
+        contest_id: str,
+        limit: int = 10,
+        cursor: str = None,
+    ):
+        return await ContestService._get_children(
+            db, CONTEST_METRIC_COLLECTION, contest_id, limit, cursor
+        )
+
+    @staticmethod
+    async def _get_children(
+        db: AsyncIOMotorDatabase,
+        collection_name: str,
+        contest_id: str,
+        limit: int,
+        cursor: str,
+    ):
+        """比賽子 collection 的 keyset 分頁，回傳 (資料, 下一頁 cursor)"""
+        contest = await ContestService.get_contest_by_id(db, contest_id)
+        children = await contest_child_crud.get_children(
+            db.get_collection(collection_name), contest["id"], limit, cursor
+        )
+        return children, next_cursor(children, limit, "_id")
+
+    @staticmethod
+    async def stream_video(
+        db: AsyncIOMotorDatabase,
+        contest_id: str,
+        video_id: str,
+        range_header: Optional[str] = None,
+    ) -> tuple[AsyncIterator[bytes], int, dict, str]:
+        """回傳 (內容, status code, headers, media type)，支援單一 bytes Range"""
+        try:
+            file_id = ObjectId(video_id)
+        except:
+            raise IdNotValidException()
+        bucket = AsyncIOMotorGridFSBucket(db, bucket_name=VIDEO_BUCKET)
+        grid_out = await video_crud.open_video(bucket, file_id)
+        metadata = (grid_out.metadata or {}) if grid_out else {}
+        if not grid_out or metadata.get("contest_id") != contest_id:
+            raise VideoNotFoundException()
+
+        size = grid_out.length
+        byte_range = parse_range(range_header, size)
+        start, end = byte_range or (0, size - 1)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(max(end - start + 1, 0)),
+            "ETag": f'"{video_id}-{size}"',
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        body = video_crud.iter_range(grid_out, start, end)
+        media_type = metadata.get("content_type") or "application/octet-stream"
+        return body, 206 if byte_range else 200, headers, media_type
+
+    @staticmethod
+    async def get_contest_by_athlete_id(
+        db: AsyncIOMotorDatabase,
+        athlete_id: str,
+        view: ContestView = ContestView.FULL,
+    ):
         contest_collection = db.get_collection(CONTEST_COLLECTION)
         contests = await contest_crud.get_contest_by_athlete_id(
-            contest_collection, athlete_id
+            contest_collection, athlete_id, view
         )
         return contests
+
+    @staticmethod
+    async def export_contests_by_athlete_id(
+        db: AsyncIOMotorDatabase,
+        athlete_id: str,
+        view: ContestView = ContestView.FULL,
+        format: ExportFormat = ExportFormat.NDJSON,
+        batch_size: int = CONTEST_EXPORT_BATCH_SIZE,
+    ) -> AsyncIterator[bytes]:
+        """邊讀 cursor 邊輸出，不論紀錄多少筆，記憶體用量都固定"""
+        contest_collection = db.get_collection(CONTEST_COLLECTION)
+        model = (
+            contest_model.ContestSummaryModel
+            if view == ContestView.SUMMARY
+            else contest_model.ContestResponseModel
+        )
+        contests = contest_crud.iter_contests_by_athlete_id(
+            contest_collection, athlete_id, view, batch_size
+        )
+
+        if format == ExportFormat.NDJSON:
+            prefix, separator, suffix = b"", b"\n", b"\n"
+        else:
+            prefix, separator, suffix = b"[", b",", b"]"
+
+        buffer = bytearray(prefix)
+        first = True
+        async for contest in contests:
+            if not first:
+                buffer += separator
+            first = False
+            buffer += model.model_validate(contest).model_dump_json().encode("utf-8")
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        if format == ExportFormat.JSON or not first:
+            buffer += suffix
+        if buffer:
+            yield bytes(buffer)
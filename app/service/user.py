@@ -1,27 +1,39 @@
-import bcrypt
+import asyncio
+
 from bson.objectid import ObjectId
-from fastapi.encoders import jsonable_encoder
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from redis.asyncio.client import Redis
 
-from app.config import USER_COLLECTION
-from app.model import user_model
+from app.config import ATHLETE_STATS_COLLECTION, USER_COLLECTION
+from app.model import bulk_model, user_model
 from app.schema import user_schema
-from app.sql.crud import user_crud
+from app.sql.bulk import DUPLICATE_KEY
+from app.sql.crud import athlete_stats_crud, user_crud
 from app.utils import create_log
+from app.utils.auth_cache import invalidate_user
+from app.utils.enums import PageMeta
 from app.utils.exception import (
     IdNotValidException,
+    InvalidSortFieldException,
     UserAlreadyExistsException,
     UserNotFoundException,
 )
+from app.utils.hashing import hash_password, hash_passwords
+from app.utils.pagination import next_cursor, split_page
+from app.utils.response_cache import USER_NAMESPACE, response_cache
 from app.utils.security import create_one_time_password, get_now
 
+# 列表分頁 meta=facets 時回傳的分組計數欄位
+USER_FACETS = ("permission",)
+
 
 class UserService:
 
     @staticmethod
     async def get_me(db: AsyncIOMotorDatabase, current_user: dict):
         user_collection = db.get_collection(USER_COLLECTION)
-        user = await user_crud.get_user_by_id(
+        user = await user_crud.load_user_by_id(
             user_collection, ObjectId(current_user["id"])
         )
         if not user:
@@ -31,24 +43,67 @@ class UserService:
     @staticmethod
     async def create_user(
         db: AsyncIOMotorDatabase,
+        redis: Redis,
         user: user_schema.CreateUser,
     ):
         user_collection = db.get_collection(USER_COLLECTION)
-        user_dict = jsonable_encoder(user)
-        user = await user_crud.get_user_by_username(
-            user_collection, user_dict["username"]
-        )
-        if user:
-            raise UserAlreadyExistsException()
-
-        user_dict["password"] = bcrypt.hashpw(
-            user_dict["password"].encode("utf-8"), bcrypt.gensalt()
-        ).decode("utf-8")
+        user_dict = user.model_dump(mode="json")
+        user_dict["password"] = await hash_password(user_dict["password"])
         user_dict["created_time"] = get_now()
-        new_user = await user_crud.create_user(user_collection, user_dict)
+        # 由 username 的唯一索引保證不重複，避免先查再寫的競爭；
+        # 代價是重複的帳號也會先做完一次 bcrypt 才被索引擋下
+        try:
+            new_user = await user_crud.create_user(user_collection, user_dict)
+        except DuplicateKeyError:
+            raise UserAlreadyExistsException()
+        await response_cache.invalidate(redis, USER_NAMESPACE)
         new_user = user_model.UserResponseModel(**new_user)
         return new_user
 
+    @staticmethod
+    async def create_users(
+        db: AsyncIOMotorDatabase,
+        redis: Redis,
+        users: list[user_schema.CreateUser],
+    ):
+        """批次建立使用者：密碼並行雜湊，再以無序 insert_many 寫入"""
+        user_collection = db.get_collection(USER_COLLECTION)
+
+        results: list[bulk_model.BulkItemResult | None] = [None] * len(users)
+        passwords = await hash_passwords([user.password for user in users])
+
+        indexes, new_users = [], []
+        now = get_now()
+        for index, (user, password) in enumerate(zip(users, passwords)):
+            if isinstance(password, Exception):
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=getattr(password, "detail", None)
+                )
+                continue
+            user_dict = user.model_dump(mode="json")
+            user_dict["password"] = password
+            user_dict["created_time"] = now
+            indexes.append(index)
+            new_users.append(user_dict)
+
+        new_users, errors = await user_crud.create_users(user_collection, new_users)
+        for position, index in enumerate(indexes):
+            error = errors.get(position)
+            if error is None:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=True, id=new_users[position]["id"]
+                )
+            elif error.get("code") == DUPLICATE_KEY:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=UserAlreadyExistsException().detail
+                )
+            else:
+                results[index] = bulk_model.BulkItemResult(
+                    index=index, ok=False, error=error.get("errmsg")
+                )
+        await response_cache.invalidate(redis, USER_NAMESPACE)
+        return bulk_model.BulkResponseModel.from_results(results)
+
     @staticmethod
     async def get_all_users(
         db: AsyncIOMotorDatabase,
@@ -56,16 +111,33 @@ class UserService:
         limit: int = 10,
         sort_by: str = "created_time",
         sort_order: int = 1,
+        cursor: str = None,
+        meta: PageMeta = None,
     ):
+        if sort_by not in user_crud.SORTABLE_FIELDS:
+            raise InvalidSortFieldException()
         user_collection = db.get_collection(USER_COLLECTION)
-        users = await user_crud.get_all_users(
+        users_query = user_crud.get_all_users(
             user_collection,
             skip=skip,
-            limit=limit,
+            limit=limit + 1 if meta else limit,
             sort_by=sort_by,
             sort_order=sort_order,
+            cursor=cursor,
         )
-        return users
+        if not meta:
+            users = await users_query
+            # skip 模式不提供 cursor
+            cursor = None if skip else next_cursor(users, limit, sort_by)
+            return users, cursor
+
+        group_fields = USER_FACETS if meta == PageMeta.FACETS else ()
+        users, counts = await asyncio.gather(
+            users_query, user_crud.count_users(user_collection, group_fields)
+        )
+        users, has_next = split_page(users, limit)
+        cursor = None if skip or not has_next else next_cursor(users, limit, sort_by)
+        return {"items": users, "has_next": has_next, **counts}, cursor
 
     @staticmethod
     async def get_all_athletes(db: AsyncIOMotorDatabase):
@@ -80,14 +152,31 @@ class UserService:
         except:
             raise IdNotValidException()
         user_collection = db.get_collection(USER_COLLECTION)
-        user = await user_crud.get_user_by_id(user_collection, user_id)
+        user = await user_crud.load_user_by_id(user_collection, user_id)
         if not user:
             raise UserNotFoundException()
         return user
 
+    @staticmethod
+    async def get_user_stats(db: AsyncIOMotorDatabase, user_id: str):
+        """讀取 change stream 維護的 athlete_stats，單筆 _id 查詢"""
+        try:
+            ObjectId(user_id)
+        except:
+            raise IdNotValidException()
+        stats_collection = db.get_collection(ATHLETE_STATS_COLLECTION)
+        stats = await athlete_stats_crud.get_athlete_stats(stats_collection, user_id)
+        if stats:
+            return user_model.AthleteStatsModel(**stats)
+        # 還沒有任何比賽的選手沒有統計資料
+        user_collection = db.get_collection(USER_COLLECTION)
+        if not await user_crud.load_user_by_id(user_collection, ObjectId(user_id)):
+            raise UserNotFoundException()
+        return user_model.AthleteStatsModel(athlete_id=user_id)
+
     @staticmethod
     async def reset_password(
-        db: AsyncIOMotorDatabase, user_id: str, current_user: dict
+        db: AsyncIOMotorDatabase, redis: Redis, user_id: str, current_user: dict
     ):
         user_collection = db.get_collection(USER_COLLECTION)
         try:
@@ -103,15 +192,17 @@ class UserService:
         otp = create_one_time_password(user_in_db["id"])
 
         # 將 OTP 加密
-        bcrypt_password = bcrypt.hashpw(otp.encode("utf-8"), bcrypt.gensalt()).decode(
-            "utf-8"
-        )
-        # 更新使用 OTP 登入的狀態
-        await user_crud.update_user(
+        bcrypt_password = await hash_password(otp)
+        # 更新使用 OTP 登入的狀態，使用者可能在雜湊期間被刪除
+        user = await user_crud.update_user(
             user_collection,
             ObjectId(user_in_db["id"]),
             {"is_use_otp": True, "password": bcrypt_password},
         )
+        if not user:
+            raise UserNotFoundException()
+        await invalidate_user(redis, user_in_db["username"])
+        await response_cache.invalidate(redis, USER_NAMESPACE)
         create_log(
             f"user {current_user['username']} reset password for user {user_in_db['username']}"
         )
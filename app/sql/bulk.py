@@ -0,0 +1,38 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+def _write_errors(e: BulkWriteError) -> dict[int, dict]:
+    return {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+
+async def insert_many_unordered(
+    collection: AsyncIOMotorCollection, documents: list[dict]
+) -> dict[int, dict]:
+    """無序批次寫入，單筆失敗不影響其他筆；回傳 {index: writeError}
+
+    insert_many 會在送出前替每筆文件補上 _id，成功的文件可直接使用。
+    """
+    if not documents:
+        return {}
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        return _write_errors(e)
+    return {}
+
+
+async def update_many_unordered(
+    collection: AsyncIOMotorCollection, updates: list[UpdateOne]
+) -> tuple[dict[int, dict], int]:
+    """無序 bulk_write，回傳 ({index: writeError}, matched 筆數)"""
+    if not updates:
+        return {}, 0
+    try:
+        result = await collection.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        return _write_errors(e), e.details.get("nMatched", 0)
+    return {}, result.matched_count
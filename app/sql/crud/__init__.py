@@ -1,2 +1,7 @@
 from app.sql.crud import user as user_crud
-from app.sql.crud import contest as contest_crud
\ No newline at end of file
+from app.sql.crud import contest as contest_crud
+from app.sql.crud import athlete_stats as athlete_stats_crud
+from app.sql.crud import shot as shot_crud
+from app.sql.crud import video as video_crud
+from app.sql.crud import contest_child as contest_child_crud
+from app.sql.crud import slow_query as slow_query_crud
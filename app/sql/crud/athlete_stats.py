@@ -0,0 +1,149 @@
+from typing import Optional
+
+from bson.timestamp import Timestamp
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError
+
+from app.utils import get_now
+
+# 會影響統計結果的比賽欄位，其他欄位（影片、指標、描述）更新時不需要重算
+STATS_FIELDS = ("name", "status", "train_type", "created_time", "athlete")
+
+_LATEST_FIELDS = ("name", "status", "train_type", "created_time")
+
+
+def _latest(contest: dict) -> dict:
+    latest = {field: contest.get(field) for field in _LATEST_FIELDS}
+    latest["id"] = str(contest["_id"])
+    return latest
+
+
+def _counter(path: str) -> dict:
+    return {"$add": [{"$ifNull": [f"${path}", 0]}, 1]}
+
+
+def insert_update(contest: dict, cluster_time: Timestamp) -> tuple[dict, list[dict]]:
+    """新增一場比賽時的增量更新，回傳 (filter, update pipeline)
+
+    seen_until 記錄已套用到的 oplog 時間，重播同一個事件時 filter 不會命中。
+    """
+    status = contest["status"]
+    train_type = contest["train_type"]
+    created_time = contest["created_time"]
+    query = {
+        "_id": contest["athlete"]["id"],
+        "seen_until": {"$not": {"$gte": cluster_time}},
+    }
+    update = [
+        {
+            "$set": {
+                "total": _counter("total"),
+                f"by_status.{status}": _counter(f"by_status.{status}"),
+                f"by_train_type.{train_type}": _counter(f"by_train_type.{train_type}"),
+                "latest": {
+                    "$cond": [
+                        {"$gte": [created_time, "$latest.created_time"]},
+                        {"$literal": _latest(contest)},
+                        "$latest",
+                    ]
+                },
+                "seen_until": cluster_time,
+                "updated_time": "$$NOW",
+            }
+        }
+    ]
+    return query, update
+
+
+async def apply_insert(
+    stats_collection: AsyncIOMotorCollection, contest: dict, cluster_time: Timestamp
+) -> bool:
+    query, update = insert_update(contest, cluster_time)
+    try:
+        result = await stats_collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # 文件已存在但 seen_until 較新，代表這個事件已經算過
+        return False
+    return bool(result.modified_count or result.upserted_id)
+
+
+async def rebuild_athlete(
+    stats_collection: AsyncIOMotorCollection,
+    contest_collection: AsyncIOMotorCollection,
+    athlete_id: str,
+    session: AsyncIOMotorClientSession,
+    cluster_time: Optional[Timestamp] = None,
+):
+    """從 contest 重新計算單一選手的統計，走 (athlete.id, created_time) 索引"""
+    pipeline = [
+        {"$match": {"athlete.id": athlete_id}},
+        {"$sort": {"created_time": -1}},
+        {
+            "$facet": {
+                "by_status": [{"$group": {"_id": "$status", "n": {"$sum": 1}}}],
+                "by_train_type": [{"$group": {"_id": "$train_type", "n": {"$sum": 1}}}],
+                "latest": [{"$limit": 1}],
+            }
+        },
+    ]
+    (result,) = await contest_collection.aggregate(pipeline, session=session).to_list(1)
+    # 以這次讀取的 operationTime 為準，之前的事件都已反映在結果中
+    seen_until = session.operation_time
+    if cluster_time is not None and (seen_until is None or cluster_time > seen_until):
+        seen_until = cluster_time
+    by_status = {group["_id"]: group["n"] for group in result["by_status"]}
+    if not by_status:
+        await stats_collection.delete_one({"_id": athlete_id}, session=session)
+        return
+    await stats_collection.replace_one(
+        {"_id": athlete_id},
+        {
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_train_type": {
+                group["_id"]: group["n"] for group in result["by_train_type"]
+            },
+            "latest": _latest(result["latest"][0]),
+            "seen_until": seen_until,
+            "updated_time": get_now(),
+        },
+        upsert=True,
+        session=session,
+    )
+
+
+async def rebuild_all(
+    stats_collection: AsyncIOMotorCollection,
+    contest_collection: AsyncIOMotorCollection,
+    session: AsyncIOMotorClientSession,
+) -> int:
+    athlete_ids = await contest_collection.distinct("athlete.id", session=session)
+    for athlete_id in athlete_ids:
+        await rebuild_athlete(stats_collection, contest_collection, athlete_id, session)
+    return len(athlete_ids)
+
+
+async def get_athlete_stats(
+    stats_collection: AsyncIOMotorCollection, athlete_id: str
+) -> Optional[dict]:
+    stats = await stats_collection.find_one({"_id": athlete_id}, {"seen_until": 0})
+    if stats:
+        stats["athlete_id"] = stats.pop("_id")
+    return stats
+
+
+async def load_resume_token(
+    state_collection: AsyncIOMotorCollection, name: str
+) -> Optional[dict]:
+    state = await state_collection.find_one({"_id": name})
+    return state["resume_token"] if state else None
+
+
+async def save_resume_token(
+    state_collection: AsyncIOMotorCollection, name: str, token: Optional[dict]
+):
+    await state_collection.update_one(
+        {"_id": name},
+        {"$set": {"resume_token": token}, "$currentDate": {"updated_time": True}},
+        upsert=True,
+    )
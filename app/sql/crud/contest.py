@@ -1,11 +1,78 @@
-import re
+from typing import AsyncIterator, Optional
 
 from bson.objectid import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+
+from app.sql.bulk import insert_many_unordered, update_many_unordered
+from app.sql.crud.loader import Loader
+from app.sql.facets import count_facets
+from app.utils.enums import ContestView
+from app.utils.pagination import keyset_indexes, keyset_query, keyset_sort
+from app.utils.search import build_search_grams, normalize, query_grams
+
+# 已搬到子 collection 的舊內嵌欄位，尚未遷移的文件也不讀出
+EMBEDDED_FIELDS = {"videos": 0, "metrics": 0}
+# 搜尋用的索引欄位只在資料庫內部使用，不回傳給前端
+HIDDEN_FIELDS = {"search_grams": 0, "search_text": 0, **EMBEDDED_FIELDS}
+
+# 列表頁只需要少數欄位，不帶出 athlete 快照
+VIEW_PROJECTIONS = {
+    ContestView.SUMMARY: {
+        "name": 1,
+        "status": 1,
+        "train_type": 1,
+        "created_time": 1,
+        "athlete.id": 1,
+        "athlete.name": 1,
+    },
+    ContestView.FULL: HIDDEN_FIELDS,
+}
+
+# 列表可排序的欄位；sort_by 會加進 summary 的投影，不能讓使用者任意指定
+SORTABLE_FIELDS = {
+    "_id",
+    "id",
+    "name",
+    "status",
+    "train_type",
+    "created_time",
+    "athlete.id",
+    "athlete.name",
+}
+
+# 由 app.sql.indexes 在啟動時於背景建立，或透過 python -m app.sql.indexes 同步
+# name / athlete.name 的單欄位查詢由下面 (sort_by, _id) 索引的前綴涵蓋
+INDEXES = [
+    IndexModel([("search_grams", ASCENDING)]),
+    # 選手的比賽列表與匯出依 created_time 排序
+    IndexModel([("athlete.id", ASCENDING), ("created_time", ASCENDING)]),
+] + keyset_indexes(SORTABLE_FIELDS)
+
+
+def search_fields(contest: dict) -> dict:
+    name = contest.get("name") or ""
+    athlete_name = (contest.get("athlete") or {}).get("name") or ""
+    return {
+        "search_grams": build_search_grams(name, athlete_name),
+        "search_text": {"name": normalize(name), "athlete": normalize(athlete_name)},
+    }
 
 
 async def get_contest_by_id(contest_collection: AsyncIOMotorCollection, id: ObjectId):
-    contest = await contest_collection.find_one({"_id": id})
+    contest = await contest_collection.find_one({"_id": id}, HIDDEN_FIELDS)
+    if contest:
+        contest["id"] = str(contest["_id"])
+        del contest["_id"]
+    return contest
+
+
+contest_by_id_loader = Loader("_id", HIDDEN_FIELDS)
+
+
+async def load_contest_by_id(contest_collection: AsyncIOMotorCollection, id: ObjectId):
+    """與 get_contest_by_id 相同，但同時間的查詢會合併成一次"""
+    contest = await contest_by_id_loader.load(contest_collection, id)
     if contest:
         contest["id"] = str(contest["_id"])
         del contest["_id"]
@@ -13,9 +80,13 @@ async def get_contest_by_id(contest_collection: AsyncIOMotorCollection, id: Obje
 
 
 async def get_contest_by_athlete_id(
-    contest_collection: AsyncIOMotorCollection, athlete_id: str
+    contest_collection: AsyncIOMotorCollection,
+    athlete_id: str,
+    view: ContestView = ContestView.FULL,
 ):
-    contests_cursor = contest_collection.find({"athlete.id": athlete_id})
+    contests_cursor = contest_collection.find(
+        {"athlete.id": athlete_id}, VIEW_PROJECTIONS[view]
+    )
     contests = []
     async for contest in contests_cursor:
         contest["id"] = str(contest["_id"])
@@ -24,6 +95,109 @@ async def get_contest_by_athlete_id(
     return contests
 
 
+def _list_projection(view: ContestView, sort_by: str) -> dict:
+    projection = VIEW_PROJECTIONS[view]
+    if view == ContestView.FULL:
+        return projection
+    # 產生下一頁 cursor 需要排序欄位的值
+    if sort_by not in ("_id", "id") and not any(
+        field == sort_by or field.startswith(f"{sort_by}.") for field in projection
+    ):
+        projection = {**projection, sort_by: 1}
+    return projection
+
+
+def _search_projection(view: ContestView, sort_by: str) -> dict:
+    if view == ContestView.FULL:
+        # 排除式投影，順便拿掉計算相關度用的暫存欄位
+        return {**HIDDEN_FIELDS, "_name_pos": 0, "_athlete_pos": 0, "_score": 0}
+    return _list_projection(view, sort_by)
+
+
+async def iter_contests_by_athlete_id(
+    contest_collection: AsyncIOMotorCollection,
+    athlete_id: str,
+    view: ContestView = ContestView.FULL,
+    batch_size: int = 200,
+) -> AsyncIterator[dict]:
+    """逐筆讀取選手的比賽紀錄，記憶體只會保留一個 batch"""
+    contests_cursor = (
+        contest_collection.find({"athlete.id": athlete_id}, VIEW_PROJECTIONS[view])
+        .sort("created_time", 1)
+        .batch_size(batch_size)
+    )
+    async for contest in contests_cursor:
+        contest["id"] = str(contest["_id"])
+        del contest["_id"]
+        yield contest
+
+
+def _search_match(search: str) -> list[dict]:
+    """search_grams 的 $all 查詢走 multikey 索引，只有候選文件需要再比對子字串"""
+    term = normalize(search)
+    name_pos = {"$indexOfCP": ["$search_text.name", term]}
+    athlete_pos = {"$indexOfCP": ["$search_text.athlete", term]}
+    return [
+        {"$match": {"search_grams": {"$all": query_grams(search)}}},
+        {"$addFields": {"_name_pos": name_pos, "_athlete_pos": athlete_pos}},
+        {
+            "$match": {
+                "$expr": {
+                    "$or": [
+                        {"$gte": ["$_name_pos", 0]},
+                        {"$gte": ["$_athlete_pos", 0]},
+                    ]
+                }
+            }
+        },
+    ]
+
+
+async def search_contests(
+    contest_collection: AsyncIOMotorCollection,
+    search: str,
+    skip: int = 0,
+    limit: int = 10,
+    sort_by: str = "created_time",
+    sort_order: int = 1,
+    view: ContestView = ContestView.FULL,
+):
+    """以 n-gram 索引找出候選，再確認子字串並依相關度排序"""
+    term = normalize(search)
+    pipeline = [
+        *_search_match(search),
+        {
+            "$addFields": {
+                "_score": {
+                    "$switch": {
+                        "branches": [
+                            {"case": {"$eq": ["$search_text.name", term]}, "then": 6},
+                            {"case": {"$eq": ["$_name_pos", 0]}, "then": 5},
+                            {"case": {"$gt": ["$_name_pos", 0]}, "then": 4},
+                            {
+                                "case": {"$eq": ["$search_text.athlete", term]},
+                                "then": 3,
+                            },
+                            {"case": {"$eq": ["$_athlete_pos", 0]}, "then": 2},
+                        ],
+                        "default": 1,
+                    }
+                }
+            }
+        },
+        {"$sort": {"_score": -1, **dict(keyset_sort(sort_by, sort_order))}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": _search_projection(view, sort_by)},
+    ]
+    contests = []
+    async for contest in contest_collection.aggregate(pipeline):
+        contest["id"] = str(contest["_id"])
+        del contest["_id"]
+        contests.append(contest)
+    return contests
+
+
 async def get_all_contests(
     contest_collection: AsyncIOMotorCollection,
     search: str = None,
@@ -31,17 +205,36 @@ async def get_all_contests(
     limit: int = 10,
     sort_by: str = "created_time",
     sort_order: int = 1,
+    cursor: str = None,
+    view: ContestView = ContestView.FULL,
 ):
-    query = {}
     if search:
-        # 转义特殊字符并使搜索大小写不敏感
-        escaped_search = re.escape(search)
-        regex_pattern = {"$regex": f".*{escaped_search}.*", "$options": "i"}
-        query = {"$or": [{"name": regex_pattern}, {"athlete.name": regex_pattern}]}
+        if not query_grams(search):
+            # 只有空白的搜尋字串沒有索引詞，不能退回成未篩選的列表
+            return []
+        # 搜尋結果依相關度排序，使用 skip 分頁
+        return await search_contests(
+            contest_collection, search, skip, limit, sort_by, sort_order, view
+        )
+    projection = _list_projection(view, sort_by)
 
-    contests_cursor = (
-        contest_collection.find(query).skip(skip).limit(limit).sort(sort_by, sort_order)
-    )
+    query = {}
+    if skip:
+        # 舊版的 skip 分頁，頁數越深越慢，僅為相容保留
+        contests_cursor = (
+            contest_collection.find(query, projection)
+            .skip(skip)
+            .limit(limit)
+            .sort(sort_by, sort_order)
+        )
+    else:
+        if cursor:
+            query = keyset_query(sort_by, sort_order, cursor)
+        contests_cursor = (
+            contest_collection.find(query, projection)
+            .sort(keyset_sort(sort_by, sort_order))
+            .limit(limit)
+        )
     contests = []
     async for contest in contests_cursor:
         contest["id"] = str(contest["_id"])
@@ -50,19 +243,121 @@ async def get_all_contests(
     return contests
 
 
+async def count_contests(
+    contest_collection: AsyncIOMotorCollection,
+    search: str = None,
+    group_fields: tuple[str, ...] = (),
+) -> dict:
+    """列表的總數與分組計數，篩選條件與 get_all_contests 相同"""
+    # 沒有索引詞時 $all: [] 不會命中任何文件，總數為 0，與列表一致
+    match_stages = _search_match(search) if search else []
+    return await count_facets(contest_collection, match_stages, group_fields)
+
+
 async def create_contest(
     contest_collection: AsyncIOMotorCollection, contest_data: dict
 ):
-    contest = await contest_collection.insert_one(contest_data)
-    new_contest = await contest_collection.find_one({"_id": contest.inserted_id})
-    if new_contest:
-        new_contest["id"] = str(new_contest["_id"])
-        del new_contest["_id"]
+    document = {**contest_data, **search_fields(contest_data)}
+    contest = await contest_collection.insert_one(document)
+    # 直接用寫入的資料組回應，不再讀一次
+    new_contest = {k: v for k, v in document.items() if k not in HIDDEN_FIELDS}
+    new_contest["id"] = str(contest.inserted_id)
+    del new_contest["_id"]
     return new_contest
 
 
 async def update_contest(
     contest_collection: AsyncIOMotorCollection, id: ObjectId, contest_data: dict
 ):
-    await contest_collection.update_one({"_id": id}, {"$set": contest_data})
-    return await get_contest_by_id(contest_collection, id)
+    contest = await contest_collection.find_one_and_update(
+        {"_id": id},
+        {"$set": contest_data},
+        projection=HIDDEN_FIELDS,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not contest:
+        return None
+    if "name" in contest_data or "athlete" in contest_data:
+        # 名稱變更時才需要重建搜尋欄位
+        await contest_collection.update_one(
+            {"_id": id}, {"$set": search_fields(contest)}
+        )
+    contest["id"] = str(contest["_id"])
+    del contest["_id"]
+    return contest
+
+
+async def get_existing_ids(
+    contest_collection: AsyncIOMotorCollection, ids: list[ObjectId]
+) -> set[ObjectId]:
+    cursor = contest_collection.find({"_id": {"$in": ids}}, {"_id": 1})
+    return {contest["_id"] async for contest in cursor}
+
+
+async def create_contests(
+    contest_collection: AsyncIOMotorCollection, contests_data: list[dict]
+) -> tuple[list[dict], dict[int, dict]]:
+    """無序批次新增，回傳 (新增後的比賽, {index: writeError})"""
+    documents = [{**data, **search_fields(data)} for data in contests_data]
+    errors = await insert_many_unordered(contest_collection, documents)
+    new_contests = []
+    for document in documents:
+        new_contest = {k: v for k, v in document.items() if k not in HIDDEN_FIELDS}
+        new_contest["id"] = str(new_contest.pop("_id"))
+        new_contests.append(new_contest)
+    return new_contests, errors
+
+
+async def update_contests(
+    contest_collection: AsyncIOMotorCollection,
+    updates: list[tuple[ObjectId, dict]],
+) -> tuple[dict[int, dict], int]:
+    """以一次 bulk_write 更新多場比賽，回傳 ({index: writeError}, matched 筆數)"""
+    requests = [UpdateOne({"_id": id}, {"$set": data}) for id, data in updates]
+    return await update_many_unordered(contest_collection, requests)
+
+
+async def backfill_search_fields(
+    contest_collection: AsyncIOMotorCollection, batch_size: int = 500
+) -> int:
+    """替舊資料補上搜尋索引欄位，回傳更新的筆數"""
+    updated = 0
+    requests = []
+    cursor = contest_collection.find(
+        {"search_grams": {"$exists": False}}, {"name": 1, "athlete.name": 1}
+    )
+    async for contest in cursor:
+        requests.append(
+            UpdateOne({"_id": contest["_id"]}, {"$set": search_fields(contest)})
+        )
+        if len(requests) >= batch_size:
+            await contest_collection.bulk_write(requests, ordered=False)
+            updated += len(requests)
+            requests = []
+    if requests:
+        await contest_collection.bulk_write(requests, ordered=False)
+        updated += len(requests)
+    return updated
+
+
+async def get_embedded_batch(
+    contest_collection: AsyncIOMotorCollection,
+    after: Optional[ObjectId],
+    batch_size: int,
+) -> list[dict]:
+    """依 _id 順序取出 after 之後仍有內嵌 videos / metrics 的比賽"""
+    query = {"$or": [{field: {"$exists": True}} for field in EMBEDDED_FIELDS]}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    projection = {field: 1 for field in EMBEDDED_FIELDS}
+    cursor = contest_collection.find(query, projection).sort("_id", 1).limit(batch_size)
+    return [contest async for contest in cursor]
+
+
+async def unset_embedded(
+    contest_collection: AsyncIOMotorCollection, ids: list[ObjectId]
+) -> int:
+    result = await contest_collection.update_many(
+        {"_id": {"$in": ids}}, {"$unset": {field: "" for field in EMBEDDED_FIELDS}}
+    )
+    return result.modified_count
@@ -0,0 +1,120 @@
+from typing import Optional
+
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from app.config import CONTEST_METRIC_COLLECTION, CONTEST_VIDEO_COLLECTION
+from app.utils.pagination import keyset_query
+
+# 子 collection 依 contest_id 分頁，以 _id（建立時間）排序
+VIDEO_INDEXES = [
+    IndexModel([("contest_id", ASCENDING), ("_id", ASCENDING)]),
+]
+METRIC_INDEXES = [
+    IndexModel([("contest_id", ASCENDING), ("_id", ASCENDING)]),
+    IndexModel([("contest_id", ASCENDING), ("key", ASCENDING)], unique=True),
+]
+
+# 遷移時使用的內部欄位，不回傳給前端
+HIDDEN_FIELDS = {"legacy_index": 0}
+
+# 比賽文件上原本內嵌的欄位 -> 子 collection；之後新增會持續增長的資料也加在這裡
+EMBEDDED_FIELDS = {
+    "videos": CONTEST_VIDEO_COLLECTION,
+    "metrics": CONTEST_METRIC_COLLECTION,
+}
+
+
+def _to_response(document: dict) -> dict:
+    document["id"] = str(document.pop("_id"))
+    return document
+
+
+async def get_children(
+    collection: AsyncIOMotorCollection,
+    contest_id: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+) -> list[dict]:
+    query = {"contest_id": contest_id}
+    if cursor:
+        query.update(keyset_query("_id", 1, cursor))
+    children_cursor = collection.find(query, HIDDEN_FIELDS).sort("_id", 1).limit(limit)
+    return [_to_response(child) async for child in children_cursor]
+
+
+async def get_child(
+    collection: AsyncIOMotorCollection, contest_id: str, id: ObjectId
+) -> Optional[dict]:
+    child = await collection.find_one(
+        {"_id": id, "contest_id": contest_id}, HIDDEN_FIELDS
+    )
+    return _to_response(child) if child else None
+
+
+async def create_child(
+    collection: AsyncIOMotorCollection, contest_id: str, document: dict
+) -> dict:
+    """document 可帶 _id（例如影片使用 GridFS 的 file id）"""
+    document = {**document, "contest_id": contest_id}
+    result = await collection.insert_one(document)
+    document["_id"] = result.inserted_id
+    return _to_response(document)
+
+
+async def set_video_media(
+    video_collection: AsyncIOMotorCollection,
+    id: ObjectId,
+    thumbnail: str,
+    renditions: list[dict],
+) -> bool:
+    result = await video_collection.update_one(
+        {"_id": id},
+        {"$set": {"thumbnail": thumbnail, "renditions": renditions}},
+    )
+    return result.matched_count > 0
+
+
+def _split_videos(contest_id: str, videos: list) -> list[UpdateOne]:
+    requests = []
+    for index, video in enumerate(videos or []):
+        video = dict(video)
+        video_id = video.pop("id", None)
+        if video_id and ObjectId.is_valid(video_id):
+            key = {"_id": ObjectId(video_id)}
+        else:
+            # 早期沒有 id 的影片以原本的位置當作鍵，重跑遷移時不會重複新增
+            key = {"contest_id": contest_id, "legacy_index": index}
+        requests.append(
+            UpdateOne(
+                key,
+                {"$setOnInsert": {**video, "contest_id": contest_id}},
+                upsert=True,
+            )
+        )
+    return requests
+
+
+def _split_metrics(contest_id: str, metrics: dict) -> list[UpdateOne]:
+    return [
+        UpdateOne(
+            {"contest_id": contest_id, "key": key},
+            {"$setOnInsert": {**metric, "contest_id": contest_id}},
+            upsert=True,
+        )
+        for key, metric in (metrics or {}).items()
+    ]
+
+
+_SPLITTERS = {"videos": _split_videos, "metrics": _split_metrics}
+
+
+def split_contest(contest: dict) -> dict[str, list[UpdateOne]]:
+    """把一場比賽的內嵌資料轉成各子 collection 的 upsert，可重複執行"""
+    contest_id = str(contest["_id"])
+    return {
+        EMBEDDED_FIELDS[field]: _SPLITTERS[field](contest_id, contest.get(field))
+        for field in EMBEDDED_FIELDS
+        if contest.get(field)
+    }
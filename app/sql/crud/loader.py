@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, Hashable, Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import LOADER_BATCH_WINDOW_MS, LOADER_MAX_BATCH_SIZE
+
+
+class _Batch:
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self.futures: dict[Hashable, asyncio.Future] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class Loader:
+    """合併同一個 worker 上短時間內的單筆查詢
+
+    - 相同 key 正在查詢中時，共用同一個 future（singleflight）
+    - 在 window 時間內進來的不同 key 合併成一次 {field: {"$in": [...]}} 查詢
+    每個呼叫者拿到的都是文件的淺拷貝，可以安全地修改最外層欄位。
+    """
+
+    def __init__(
+        self,
+        field: str,
+        projection: Optional[dict] = None,
+        window: float = LOADER_BATCH_WINDOW_MS / 1000,
+        max_batch_size: int = LOADER_MAX_BATCH_SIZE,
+    ):
+        self.field = field
+        self.projection = projection
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._batches: dict[str, _Batch] = {}
+        self._inflight: dict[tuple[str, Hashable], asyncio.Future] = {}
+        # 事件迴圈只保留 task 的弱參照，執行中的查詢要自己留著，否則可能被回收
+        self._tasks: set[asyncio.Task] = set()
+        self.loads = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.keys_fetched = 0
+        self.max_batch_seen = 0
+
+    async def load(self, collection: AsyncIOMotorCollection, key: Hashable):
+        self.loads += 1
+        name = collection.full_name
+        future = self._inflight.get((name, key))
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[(name, key)] = future
+            self._enqueue(collection, key, future)
+        # shield: 單一呼叫者被取消時不影響其他等待同一個結果的請求
+        document = await asyncio.shield(future)
+        return dict(document) if document is not None else None
+
+    def _enqueue(
+        self, collection: AsyncIOMotorCollection, key: Hashable, future: asyncio.Future
+    ):
+        name = collection.full_name
+        batch = self._batches.get(name)
+        if batch is None:
+            batch = self._batches[name] = _Batch(collection)
+            loop = asyncio.get_running_loop()
+            batch.handle = loop.call_later(self.window, self._dispatch, name)
+        batch.futures[key] = future
+        if len(batch.futures) >= self.max_batch_size:
+            batch.handle.cancel()
+            self._dispatch(name)
+
+    def _dispatch(self, name: str):
+        batch = self._batches.pop(name, None)
+        if batch is not None:
+            task = asyncio.get_running_loop().create_task(self._fetch(name, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, name: str, batch: _Batch):
+        keys = list(batch.futures)
+        self.batches += 1
+        self.keys_fetched += len(keys)
+        self.max_batch_seen = max(self.max_batch_seen, len(keys))
+        try:
+            query = {self.field: keys[0] if len(keys) == 1 else {"$in": keys}}
+            found: dict[Any, dict] = {}
+            async for document in batch.collection.find(query, self.projection):
+                found[document.get(self.field)] = document
+        except Exception as e:
+            for key, future in batch.futures.items():
+                self._inflight.pop((name, key), None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.futures.items():
+            self._inflight.pop((name, key), None)
+            if not future.done():
+                future.set_result(found.get(key))
+
+    def stats(self) -> dict:
+        return {
+            "field": self.field,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "keys_fetched": self.keys_fetched,
+            "avg_batch_size": (
+                round(self.keys_fetched / self.batches, 2) if self.batches else 0.0
+            ),
+            "max_batch_size": self.max_batch_seen,
+        }
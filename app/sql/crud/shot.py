@@ -0,0 +1,58 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel
+
+from app.sql.bulk import insert_many_unordered
+from app.utils.scoring import ShotSeries, series_from_columns
+
+# 以 time-series collection 儲存，meta 內放比賽與選手
+TIMESERIES = {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"}
+
+INDEXES = [
+    IndexModel(
+        [
+            ("meta.contest_id", ASCENDING),
+            ("meta.athlete_id", ASCENDING),
+            ("timestamp", ASCENDING),
+        ]
+    ),
+    IndexModel([("meta.athlete_id", ASCENDING), ("timestamp", ASCENDING)]),
+]
+
+
+def new_shot(contest: dict, sample: dict) -> dict:
+    return {
+        "timestamp": sample.pop("timestamp"),
+        "meta": {
+            "contest_id": contest["id"],
+            "athlete_id": contest["athlete"]["id"],
+            "train_type": contest["train_type"],
+        },
+        **sample,
+    }
+
+
+async def create_shots(
+    shot_collection: AsyncIOMotorCollection, shots: list[dict]
+) -> dict[int, dict]:
+    return await insert_many_unordered(shot_collection, shots)
+
+
+async def load_series(
+    shot_collection: AsyncIOMotorCollection, query: dict, batch_size: int = 10000
+) -> ShotSeries:
+    """依時間順序讀出射擊資料，逐欄放進 list 後轉成 NumPy 陣列"""
+    contest_ids, rounds, stations, hits = [], [], [], []
+    cursor = (
+        shot_collection.find(
+            query,
+            {"_id": 0, "meta.contest_id": 1, "round": 1, "station": 1, "hit": 1},
+        )
+        .sort("timestamp", 1)
+        .batch_size(batch_size)
+    )
+    async for shot in cursor:
+        contest_ids.append(shot["meta"]["contest_id"])
+        rounds.append(shot["round"])
+        stations.append(shot["station"])
+        hits.append(shot["hit"])
+    return series_from_columns(contest_ids, rounds, stations, hits)
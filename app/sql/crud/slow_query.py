@@ -0,0 +1,48 @@
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import SLOW_QUERY_COLLECTION_BYTES
+
+# capped collection：只保留最近的紀錄，依寫入順序讀取不需要索引
+COLLECTION_OPTIONS = {"capped": True, "size": SLOW_QUERY_COLLECTION_BYTES}
+
+
+async def create_entry(collection: AsyncIOMotorCollection, entry: dict):
+    await collection.insert_one(entry)
+
+
+async def get_recent(
+    collection: AsyncIOMotorCollection, limit: int = 50, route: Optional[str] = None
+) -> list[dict]:
+    query = {"route": route} if route else {}
+    cursor = collection.find(query, {"_id": 0}).sort("$natural", -1).limit(limit)
+    return [entry async for entry in cursor]
+
+
+async def summarize_shapes(
+    collection: AsyncIOMotorCollection, limit: int = 20
+) -> list[dict]:
+    """依查詢結構分組，總耗時最多的排在前面"""
+    # capped collection 依寫入順序掃描，$last 即為最近一筆
+    pipeline = [
+        {
+            "$group": {
+                "_id": "$shape_id",
+                "command": {"$last": "$command"},
+                "namespace": {"$last": "$namespace"},
+                "shape": {"$last": "$shape"},
+                "count": {"$sum": 1},
+                "total_ms": {"$sum": "$duration_ms"},
+                "max_ms": {"$max": "$duration_ms"},
+                "routes": {"$addToSet": "$route"},
+                "last_seen": {"$last": "$time"},
+                "plan": {"$last": "$explain.plan"},
+            }
+        },
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+        {"$set": {"shape_id": "$_id", "avg_ms": {"$divide": ["$total_ms", "$count"]}}},
+        {"$project": {"_id": 0}},
+    ]
+    return [summary async for summary in collection.aggregate(pipeline)]
@@ -2,6 +2,36 @@ from typing import Optional
 
 from bson.objectid import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from app.sql.bulk import insert_many_unordered
+from app.sql.crud.loader import Loader
+from app.sql.facets import count_facets
+from app.utils.pagination import keyset_indexes, keyset_query, keyset_sort
+
+# 保證資料正確的索引，啟動時同步建立，建立失敗則服務不啟動
+REQUIRED_INDEXES = [
+    # 每個請求都會以 username 查使用者，唯一索引也保證帳號不重複
+    IndexModel([("username", ASCENDING)], unique=True),
+]
+
+# 列表可排序的欄位，每個欄位都有對應的 (sort_by, _id) 索引
+SORTABLE_FIELDS = {"_id", "id", "username", "name", "permission", "created_time"}
+
+# 由 app.sql.indexes 在啟動時於背景建立，或透過 python -m app.sql.indexes 同步
+INDEXES = (
+    REQUIRED_INDEXES
+    + [
+        IndexModel([("permission", ASCENDING), ("created_time", ASCENDING)]),
+        # 只收錄選手，get_all_athletes 只需掃描這個較小的索引
+        IndexModel(
+            [("created_time", ASCENDING)],
+            name="athletes_created_time",
+            partialFilterExpression={"permission": "athlete"},
+        ),
+    ]
+    + keyset_indexes(SORTABLE_FIELDS)
+)
 
 
 async def get_user_by_id(
@@ -14,6 +44,44 @@ async def get_user_by_id(
     return user
 
 
+async def get_users_by_ids(
+    user_collection: AsyncIOMotorCollection, ids: list[ObjectId]
+) -> dict[str, dict]:
+    """一次 $in 查詢取回多位使用者，回傳 {id: user}"""
+    users = {}
+    async for user in user_collection.find({"_id": {"$in": ids}}):
+        user["id"] = str(user["_id"])
+        del user["_id"]
+        users[user["id"]] = user
+    return users
+
+
+user_by_id_loader = Loader("_id")
+user_by_username_loader = Loader("username")
+
+
+async def load_user_by_id(
+    user_collection: AsyncIOMotorCollection, id: ObjectId
+) -> Optional[dict]:
+    """與 get_user_by_id 相同，但同時間的查詢會合併成一次"""
+    user = await user_by_id_loader.load(user_collection, id)
+    if user:
+        user["id"] = str(user["_id"])
+        del user["_id"]
+    return user
+
+
+async def load_user_by_username(
+    user_collection: AsyncIOMotorCollection, username: str
+) -> Optional[dict]:
+    """與 get_user_by_username 相同，但同時間的查詢會合併成一次"""
+    user = await user_by_username_loader.load(user_collection, username)
+    if user:
+        user["id"] = str(user["_id"])
+        del user["_id"]
+    return user
+
+
 async def get_user_by_username(
     user_collection: AsyncIOMotorCollection, username: str
 ) -> Optional[dict]:
@@ -30,10 +98,20 @@ async def get_all_users(
     limit: int = 10,
     sort_by: str = "created_time",
     sort_order: int = 1,
+    cursor: str = None,
 ):
-    users_cursor = (
-        user_collection.find().skip(skip).limit(limit).sort(sort_by, sort_order)
-    )
+    if skip:
+        # 舊版的 skip 分頁，頁數越深越慢，僅為相容保留
+        users_cursor = (
+            user_collection.find().skip(skip).limit(limit).sort(sort_by, sort_order)
+        )
+    else:
+        query = keyset_query(sort_by, sort_order, cursor) if cursor else {}
+        users_cursor = (
+            user_collection.find(query)
+            .sort(keyset_sort(sort_by, sort_order))
+            .limit(limit)
+        )
     users = []
     async for user in users_cursor:
         user["id"] = str(user["_id"])
@@ -42,12 +120,21 @@ async def get_all_users(
     return users
 
 
+async def count_users(
+    user_collection: AsyncIOMotorCollection, group_fields: tuple[str, ...] = ()
+) -> dict:
+    return await count_facets(user_collection, [], group_fields)
+
+
 async def get_all_athletes(
     user_collection: AsyncIOMotorCollection,
     sort_by: str = "created_time",
     sort_order: int = 1,
 ):
-    users_cursor = user_collection.find({"role": "athlete"}).sort(sort_by, sort_order)
+    # 結果會被快取在 Redis，密碼雜湊不能帶出去
+    users_cursor = user_collection.find(
+        {"permission": "athlete"}, {"password": 0}
+    ).sort(sort_by, sort_order)
     users = []
     async for user in users_cursor:
         user["id"] = str(user["_id"])
@@ -57,16 +144,34 @@ async def get_all_athletes(
 
 
 async def create_user(user_collection: AsyncIOMotorCollection, user_data: dict) -> dict:
+    """username 有唯一索引，重複時會丟出 pymongo.errors.DuplicateKeyError"""
     user = await user_collection.insert_one(user_data)
-    new_user = await user_collection.find_one({"_id": user.inserted_id})
-    if new_user:
-        new_user["id"] = str(new_user["_id"])
-        del new_user["_id"]
+    # 直接用寫入的資料組回應，不再讀一次
+    new_user = {k: v for k, v in user_data.items() if k != "_id"}
+    new_user["id"] = str(user.inserted_id)
     return new_user
 
 
 async def update_user(
     user_collection: AsyncIOMotorCollection, id: ObjectId, user_data: dict
 ) -> dict:
-    await user_collection.update_one({"_id": id}, {"$set": user_data})
-    return await get_user_by_id(user_collection, id)
+    user = await user_collection.find_one_and_update(
+        {"_id": id}, {"$set": user_data}, return_document=ReturnDocument.AFTER
+    )
+    if user:
+        user["id"] = str(user["_id"])
+        del user["_id"]
+    return user
+
+
+async def create_users(
+    user_collection: AsyncIOMotorCollection, users_data: list[dict]
+) -> tuple[list[dict], dict[int, dict]]:
+    """無序批次新增，回傳 (新增後的使用者, {index: writeError})"""
+    errors = await insert_many_unordered(user_collection, users_data)
+    new_users = []
+    for user_data in users_data:
+        new_user = {k: v for k, v in user_data.items() if k != "_id"}
+        new_user["id"] = str(user_data["_id"])
+        new_users.append(new_user)
+    return new_users, errors
@@ -0,0 +1,120 @@
+from typing import AsyncIterator, Optional
+
+from bson.objectid import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import (
+    AsyncIOMotorCollection,
+    AsyncIOMotorGridFSBucket,
+    AsyncIOMotorGridOut,
+)
+from pymongo import ASCENDING, IndexModel
+
+from app.config import VIDEO_BUCKET
+from app.utils.exception import VideoTooLargeException
+
+FILES_COLLECTION = f"{VIDEO_BUCKET}.files"
+INDEXES = [
+    # GridFS 第一次寫入時自行建立的索引，宣告在此避免被當成未宣告的索引移除
+    IndexModel([("filename", ASCENDING), ("uploadDate", ASCENDING)]),
+    IndexModel([("metadata.contest_id", ASCENDING), ("uploadDate", ASCENDING)]),
+    # 縮圖與低碼率版本記錄來源影片，重新處理時先刪除舊的輸出
+    IndexModel([("metadata.source_id", ASCENDING)], sparse=True),
+]
+
+
+async def upload_video(
+    bucket: AsyncIOMotorGridFSBucket,
+    filename: str,
+    chunks: AsyncIterator[bytes],
+    metadata: dict,
+    chunk_size: int,
+    max_bytes: int,
+) -> tuple[ObjectId, int]:
+    """邊收邊寫入 GridFS，記憶體中最多只有一個 chunk；回傳 (file_id, 大小)"""
+    file_id = ObjectId()
+    grid_in = bucket.open_upload_stream_with_id(
+        file_id, filename, chunk_size_bytes=chunk_size, metadata=metadata
+    )
+    length = 0
+    try:
+        async for chunk in chunks:
+            length += len(chunk)
+            if length > max_bytes:
+                raise VideoTooLargeException()
+            await grid_in.write(chunk)
+    except BaseException:
+        # 已寫入的 chunk 一併刪除，不留下不完整的檔案
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return file_id, length
+
+
+async def delete_video(bucket: AsyncIOMotorGridFSBucket, file_id: ObjectId) -> bool:
+    try:
+        await bucket.delete(file_id)
+    except NoFile:
+        return False
+    return True
+
+
+async def upload_file(
+    bucket: AsyncIOMotorGridFSBucket,
+    filename: str,
+    path: str,
+    metadata: dict,
+    chunk_size: int,
+) -> tuple[ObjectId, int]:
+    """上傳 worker 產生的本機檔案；回傳 (file_id, 大小)"""
+    with open(path, "rb") as source:
+        file_id = await bucket.upload_from_stream(
+            filename, source, chunk_size_bytes=chunk_size, metadata=metadata
+        )
+        return file_id, source.tell()
+
+
+async def download_file(bucket: AsyncIOMotorGridFSBucket, file_id: ObjectId, path: str):
+    with open(path, "wb") as target:
+        await bucket.download_to_stream(file_id, target)
+
+
+async def delete_derived(
+    bucket: AsyncIOMotorGridFSBucket,
+    files_collection: AsyncIOMotorCollection,
+    source_id: ObjectId,
+) -> int:
+    """刪除某支影片先前產生的縮圖與低碼率版本"""
+    cursor = files_collection.find({"metadata.source_id": source_id}, {"_id": 1})
+    deleted = 0
+    async for file in cursor:
+        try:
+            await bucket.delete(file["_id"])
+            deleted += 1
+        except NoFile:
+            pass
+    return deleted
+
+
+async def open_video(
+    bucket: AsyncIOMotorGridFSBucket, file_id: ObjectId
+) -> Optional[AsyncIOMotorGridOut]:
+    try:
+        return await bucket.open_download_stream(file_id)
+    except NoFile:
+        return None
+
+
+async def iter_range(
+    grid_out: AsyncIOMotorGridOut, start: int, end: int
+) -> AsyncIterator[bytes]:
+    """從 start 讀到 end（含），每次讀一個 GridFS chunk，只在頭尾切割"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.readchunk()
+        if not data:
+            break
+        if len(data) > remaining:
+            data = data[:remaining]
+        remaining -= len(data)
+        yield data
@@ -1,24 +1,95 @@
-from typing import AsyncGenerator
+import asyncio
 
+from fastapi.requests import HTTPConnection
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from redis.asyncio.client import Redis
-from redis.asyncio.connection import ConnectionPool
+from redis.asyncio.connection import BlockingConnectionPool, ConnectionPool
 
-from app.config import MONGO_DB, MONGO_URL, REDIS_URL
+from app.config import (
+    METRICS_ENABLED,
+    MONGO_COMPRESSORS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_URL,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_CONNECT_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_URL,
+    SLOW_QUERY_ENABLED,
+)
+from app.sql.monitoring import pool_stats
+from app.sql.slow_query import slow_query_log
+from app.utils.metrics import InstrumentedRedis, mongo_command_metrics
 
 
-async def get_database() -> AsyncIOMotorDatabase:
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[MONGO_DB]
-    try:
-        yield db
-    finally:
-        client.close()
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "event_listeners": [pool_stats],
+    }
+    if METRICS_ENABLED:
+        options["event_listeners"].append(mongo_command_metrics)
+    if SLOW_QUERY_ENABLED:
+        # 只有呼叫 slow_query_log.start 的行程才會記錄
+        options["event_listeners"].append(slow_query_log.listener)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(MONGO_URL, **options)
 
 
-async def get_redis() -> AsyncGenerator[Redis, None]:
-    redis = Redis(connection_pool=ConnectionPool.from_url(REDIS_URL))
-    try:
-        yield redis
-    finally:
-        await redis.aclose()
+async def warmup_mongo(client: AsyncIOMotorClient, connections: int):
+    # 同時送出多個 ping，讓連線池在接收請求前就建立好連線
+    if connections <= 0:
+        return
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+
+
+def create_redis_pool() -> ConnectionPool:
+    # 連線用完時等待歸還，而不是直接丟出 Too many connections
+    return BlockingConnectionPool.from_url(
+        REDIS_URL,
+        timeout=REDIS_POOL_TIMEOUT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+    )
+
+
+def create_redis(pool: ConnectionPool) -> Redis:
+    if METRICS_ENABLED:
+        return InstrumentedRedis(connection_pool=pool)
+    return Redis(connection_pool=pool)
+
+
+def redis_pool_stats(pool: ConnectionPool) -> dict:
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    available = len(getattr(pool, "_available_connections", ()))
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": in_use,
+        "available": available,
+        "created": in_use + available,
+    }
+
+
+def get_database(conn: HTTPConnection) -> AsyncIOMotorDatabase:
+    return conn.app.mongodb
+
+
+def get_redis(conn: HTTPConnection) -> Redis:
+    return conn.app.redis
@@ -0,0 +1,39 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import PAGE_META_CACHE_SIZE, PAGE_META_CACHE_TTL
+from app.utils.cache import TTLCache
+
+# 同一組查詢條件的計數在短時間內共用，避免每次翻頁都重新掃描
+page_meta_cache = TTLCache(maxsize=PAGE_META_CACHE_SIZE, ttl=PAGE_META_CACHE_TTL)
+
+
+async def count_facets(
+    collection: AsyncIOMotorCollection,
+    match_stages: list[dict],
+    group_fields: tuple[str, ...] = (),
+) -> dict:
+    """以單一 $facet 算出符合條件的總數與各欄位的分組計數
+
+    沒有篩選條件也不需要分組時，改用 estimated_document_count 讀取 collection 中繼資料。
+    """
+    key = (collection.full_name, repr(match_stages), group_fields)
+    cached = page_meta_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if not match_stages and not group_fields:
+        meta = {"total": await collection.estimated_document_count()}
+    else:
+        facet = {"total": [{"$count": "n"}]}
+        for field in group_fields:
+            facet[field] = [{"$group": {"_id": f"${field}", "n": {"$sum": 1}}}]
+        pipeline = [*match_stages, {"$facet": facet}]
+        (result,) = await collection.aggregate(pipeline).to_list(1)
+        meta = {"total": result["total"][0]["n"] if result["total"] else 0}
+        if group_fields:
+            meta["counts"] = {
+                field: {str(group["_id"]): group["n"] for group in result[field]}
+                for field in group_fields
+            }
+    page_meta_cache.set(key, meta)
+    return meta
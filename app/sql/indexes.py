@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.config import (
+    CONTEST_COLLECTION,
+    CONTEST_METRIC_COLLECTION,
+    CONTEST_VIDEO_COLLECTION,
+    MONGO_DB,
+    SHOT_COLLECTION,
+    SLOW_QUERY_COLLECTION,
+    USER_COLLECTION,
+)
+from app.sql.crud import (
+    contest_child_crud,
+    contest_crud,
+    shot_crud,
+    slow_query_crud,
+    user_crud,
+    video_crud,
+)
+from app.sql.db import create_mongo_client
+from app.utils.logger_config import create_log
+
+# 各 collection 的索引宣告放在對應的 crud 模組旁
+INDEX_SPECS: dict[str, list[IndexModel]] = {
+    CONTEST_COLLECTION: contest_crud.INDEXES,
+    USER_COLLECTION: user_crud.INDEXES,
+    SHOT_COLLECTION: shot_crud.INDEXES,
+    video_crud.FILES_COLLECTION: video_crud.INDEXES,
+    CONTEST_VIDEO_COLLECTION: contest_child_crud.VIDEO_INDEXES,
+    CONTEST_METRIC_COLLECTION: contest_child_crud.METRIC_INDEXES,
+}
+
+# 啟動時必須先建好的索引（例如 unique），失敗時中止啟動
+REQUIRED_INDEX_SPECS: dict[str, list[IndexModel]] = {
+    USER_COLLECTION: user_crud.REQUIRED_INDEXES,
+}
+
+# 需要在第一次寫入前以特定選項建立的 collection
+COLLECTION_OPTIONS: dict[str, dict] = {
+    SHOT_COLLECTION: {"timeseries": shot_crud.TIMESERIES},
+    SLOW_QUERY_COLLECTION: slow_query_crud.COLLECTION_OPTIONS,
+}
+
+# 多個 worker 同時啟動時，晚一步的 create_collection 會收到 NamespaceExists
+_NAMESPACE_EXISTS = 48
+
+# 比對既有索引是否與宣告一致時要看的選項
+_COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+)
+
+
+def _signature(index: dict) -> tuple:
+    return (
+        tuple(index["key"].items()),
+        tuple((option, index.get(option)) for option in _COMPARED_OPTIONS),
+    )
+
+
+async def ensure_collections(db: AsyncIOMotorDatabase) -> list[str]:
+    """建立尚不存在的特殊 collection（例如 time-series），只是中繼資料操作"""
+    existing = set(await db.list_collection_names())
+    created = []
+    for name, options in COLLECTION_OPTIONS.items():
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(name, **options)
+        except CollectionInvalid:
+            # 其他 worker 在 list 之後先建立了
+            continue
+        except OperationFailure as e:
+            if e.code != _NAMESPACE_EXISTS:
+                raise
+            continue
+        created.append(name)
+    return created
+
+
+def _error_message(e: OperationFailure) -> str:
+    return e.details.get("errmsg", str(e)) if e.details else str(e)
+
+
+async def ensure_required_indexes(db: AsyncIOMotorDatabase):
+    """同步建立 REQUIRED_INDEX_SPECS；索引已存在時不做事，建立失敗直接丟出例外"""
+    for name, specs in REQUIRED_INDEX_SPECS.items():
+        await db[name].create_indexes(specs)
+
+
+async def plan_indexes(
+    collection: AsyncIOMotorCollection, specs: list[IndexModel]
+) -> dict:
+    """比對宣告與實際索引，回傳缺少、設定不一致與未宣告的索引名稱"""
+    existing = {index["name"]: index async for index in collection.list_indexes()}
+    declared = {spec.document["name"]: spec for spec in specs}
+    missing, conflicting = [], []
+    for name, spec in declared.items():
+        if name not in existing:
+            missing.append(name)
+        elif _signature(existing[name]) != _signature(spec.document):
+            conflicting.append(name)
+    undeclared = [name for name in existing if name != "_id_" and name not in declared]
+    return {"missing": missing, "conflicting": conflicting, "undeclared": undeclared}
+
+
+async def sync_collection(
+    collection: AsyncIOMotorCollection,
+    specs: list[IndexModel],
+    rebuild: bool = False,
+    drop_undeclared: bool = False,
+) -> dict:
+    """建立缺少的索引
+
+    rebuild 時設定不一致的索引先刪除再重建，drop_undeclared 時移除未宣告的索引；
+    這兩者會暫時少掉索引，只由 python -m app.sql.indexes sync 執行，啟動時不做。
+    """
+    plan = await plan_indexes(collection, specs)
+    declared = {spec.document["name"]: spec for spec in specs}
+    created, failed, dropped = [], {}, []
+    to_create = list(plan["missing"])
+    if rebuild:
+        for name in plan["conflicting"]:
+            try:
+                await collection.drop_index(name)
+            except OperationFailure as e:
+                failed[name] = _error_message(e)
+                continue
+            dropped.append(name)
+            to_create.append(name)
+    # 逐一建立，單一索引失敗（例如既有資料違反 unique）不影響其他索引
+    for name in to_create:
+        try:
+            await collection.create_indexes([declared[name]])
+            created.append(name)
+        except OperationFailure as e:
+            failed[name] = _error_message(e)
+    if drop_undeclared:
+        for name in plan["undeclared"]:
+            try:
+                await collection.drop_index(name)
+                dropped.append(name)
+            except OperationFailure as e:
+                failed[name] = _error_message(e)
+    return {
+        "created": created,
+        "dropped": dropped,
+        "failed": failed,
+        "conflicting": [] if rebuild else plan["conflicting"],
+        "undeclared": [] if drop_undeclared else plan["undeclared"],
+    }
+
+
+async def sync_indexes(
+    db: AsyncIOMotorDatabase, rebuild: bool = False, drop_undeclared: bool = False
+) -> dict:
+    return {
+        name: await sync_collection(db[name], specs, rebuild, drop_undeclared)
+        for name, specs in INDEX_SPECS.items()
+    }
+
+
+async def index_report(db: AsyncIOMotorDatabase) -> dict:
+    """以 $indexStats 回報各索引的使用次數，並列出缺少與未被使用的索引"""
+    report = {}
+    for name, specs in INDEX_SPECS.items():
+        collection = db[name]
+        plan = await plan_indexes(collection, specs)
+        usage = {}
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            # 多節點時每個節點各有一筆，使用次數加總
+            entry = usage.setdefault(
+                stat["name"], {"ops": 0, "since": stat["accesses"]["since"]}
+            )
+            entry["ops"] += stat["accesses"]["ops"]
+            entry["since"] = min(entry["since"], stat["accesses"]["since"])
+        report[name] = {
+            **plan,
+            "unused": [
+                index
+                for index, entry in usage.items()
+                if index != "_id_" and entry["ops"] == 0
+            ],
+            "usage": usage,
+        }
+    return report
+
+
+async def reconcile_indexes(db: AsyncIOMotorDatabase):
+    """啟動時在背景執行，不阻塞服務就緒；只建立缺少的索引"""
+    try:
+        result = await sync_indexes(db)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        create_log(f"Index reconciliation failed: {e}")
+        return
+    for name, outcome in result.items():
+        if outcome["created"] or outcome["dropped"]:
+            create_log(
+                f"Indexes on {name}: created {outcome['created']}, "
+                f"dropped {outcome['dropped']}"
+            )
+        if outcome["failed"]:
+            create_log(f"Failed to build indexes on {name}: {outcome['failed']}")
+        if outcome["conflicting"]:
+            create_log(f"Conflicting indexes on {name}: {outcome['conflicting']}")
+        if outcome["undeclared"]:
+            create_log(f"Undeclared indexes on {name}: {outcome['undeclared']}")
+
+
+async def _main(args: argparse.Namespace):
+    client = create_mongo_client()
+    try:
+        db = client[MONGO_DB]
+        if args.command == "sync":
+            await ensure_collections(db)
+            result = await sync_indexes(db, True, args.drop_undeclared)
+        else:
+            result = await index_report(db)
+        print(json.dumps(result, indent=2, default=str))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser(
+        "sync", help="create missing indexes and rebuild conflicting ones"
+    )
+    sync_parser.add_argument(
+        "--drop-undeclared",
+        action="store_true",
+        help="drop indexes that are not declared in the crud modules",
+    )
+    subparsers.add_parser("report", help="report missing and unused indexes")
+    asyncio.run(_main(parser.parse_args()))
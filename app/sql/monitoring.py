@@ -0,0 +1,87 @@
+import threading
+
+from pymongo import monitoring
+
+from app.config import MONGO_MAX_POOL_SIZE
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """統計 MongoDB 連線池的使用狀況（使用中、等待中、取得連線的延遲）
+
+    pending 是所有進行中的 checkout；連線池未滿時它們只是在建立新連線，
+    只有連線都在使用中且已達 max_pool_size 時才算是排隊等待的 waiters。
+    """
+
+    def __init__(self, max_pool_size: int = MONGO_MAX_POOL_SIZE):
+        self._lock = threading.Lock()
+        self.max_pool_size = max_pool_size
+        self.total = 0
+        self.in_use = 0
+        self.pending = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self.checkout_time_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "total": self.total,
+                "in_use": self.in_use,
+                "idle": max(self.total - self.in_use, 0),
+                "pending": self.pending,
+                "waiters": self.pending if self.in_use >= self.max_pool_size else 0,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_avg_ms": round(avg * 1000, 3),
+                "checkout_max_ms": round(self.checkout_time_max * 1000, 3),
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.total += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.total = max(self.total - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.pending += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.pending = max(self.pending - 1, 0)
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        duration = getattr(event, "duration", 0.0) or 0.0
+        with self._lock:
+            self.pending = max(self.pending - 1, 0)
+            self.in_use += 1
+            self.checkouts += 1
+            self.checkout_time_total += duration
+            self.checkout_time_max = max(self.checkout_time_max, duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+
+pool_stats = PoolStatsListener()
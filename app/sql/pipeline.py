@@ -0,0 +1,74 @@
+import asyncio
+
+from redis.asyncio.client import Redis
+
+
+class RedisBatch:
+    """把同一個請求中的多個 Redis 指令合併成一次往返
+
+    用法:
+        async with RedisBatch(redis) as batch:
+            value = batch.get("key")
+            batch.set("other", "1", ex=60)
+        value.result()
+
+    離開 async with 時若有任何指令失敗，丟出第一個錯誤；
+    直接呼叫 execute() 則由各自的 future 回報錯誤。
+    """
+
+    def __init__(self, redis: Redis, transaction: bool = False):
+        self._pipe = redis.pipeline(transaction=transaction)
+        self._futures: list[asyncio.Future] = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self._pipe, name)
+
+        def _queue(*args, **kwargs) -> asyncio.Future:
+            command(*args, **kwargs)
+            future = asyncio.get_running_loop().create_future()
+            self._futures.append(future)
+            return future
+
+        return _queue
+
+    async def execute(self) -> list:
+        futures, self._futures = self._futures, []
+        if not futures:
+            return []
+        try:
+            results = await self._pipe.execute(raise_on_error=False)
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        return results
+
+    async def __aenter__(self) -> "RedisBatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                futures = self._futures
+                results = await self.execute()
+                errors = [result for result in results if isinstance(result, Exception)]
+                if errors:
+                    # 錯誤改由這裡丟出，避免沒人讀取的 future 再記一次錯誤
+                    for future in futures:
+                        future.exception()
+                    raise errors[0]
+        finally:
+            await self._pipe.reset()
+
+
+async def execute_pipelined(redis: Redis, *commands: tuple) -> list:
+    """一次送出多個原始指令，例如 ("GET", "a"), ("EXPIRE", "b", 60)"""
+    async with redis.pipeline(transaction=False) as pipe:
+        for command in commands:
+            pipe.execute_command(*command)
+        return await pipe.execute()
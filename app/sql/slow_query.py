@@ -0,0 +1,419 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from app.config import (
+    SLOW_QUERY_COLLECTION,
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_INTERVAL,
+    SLOW_QUERY_MS,
+    SLOW_QUERY_QUEUE_SIZE,
+)
+from app.sql.crud import slow_query_crud
+from app.utils._datetime import get_now
+from app.utils.cache import TTLCache
+from app.utils.logger_config import create_log
+from app.utils.route_context import current_route
+
+# 連線管理與驗證相關的指令不記錄
+IGNORED_COMMANDS = {
+    "hello",
+    "isMaster",
+    "ismaster",
+    "ping",
+    "buildInfo",
+    "endSessions",
+    "killCursors",
+    "saslStart",
+    "saslContinue",
+    "explain",
+}
+EXPLAINABLE_COMMANDS = {
+    "find",
+    "aggregate",
+    "count",
+    "distinct",
+    "findAndModify",
+    "update",
+    "delete",
+}
+# 含這些階段的 aggregate 不能或不該重新執行
+_NO_EXPLAIN_STAGES = {"$out", "$merge", "$changeStream", "$indexStats", "$collStats"}
+# driver 自動加上的欄位，explain 時要拿掉
+_DRIVER_FIELDS = {
+    "$db",
+    "lsid",
+    "$clusterTime",
+    "txnNumber",
+    "autocommit",
+    "startTransaction",
+    "$readPreference",
+    "readConcern",
+    "writeConcern",
+    "apiVersion",
+    "apiStrict",
+    "apiDeprecationErrors",
+}
+
+
+def redact(value: Any) -> Any:
+    """保留欄位與運算子結構，所有值換成 "?"；$in 之類的陣列只保留不重複的結構"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+def _first_statement(command: dict, field: str) -> dict:
+    statements = command.get(field) or [{}]
+    return statements[0] if isinstance(statements[0], dict) else {}
+
+
+def command_shape(name: str, command: dict) -> dict:
+    """指令的查詢結構；排序、skip、limit 不含使用者資料，保留原值"""
+    shape = {"filter": None, "sort": None, "skip": None, "limit": None}
+    if name == "find":
+        shape.update(
+            filter=redact(command.get("filter", {})),
+            sort=command.get("sort"),
+            skip=command.get("skip"),
+            limit=command.get("limit"),
+        )
+    elif name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        shape["filter"] = redact(pipeline)
+        for stage in pipeline:
+            if "$sort" in stage and shape["sort"] is None:
+                shape["sort"] = stage["$sort"]
+            if "$skip" in stage and shape["skip"] is None:
+                shape["skip"] = stage["$skip"]
+            if "$limit" in stage and shape["limit"] is None:
+                shape["limit"] = stage["$limit"]
+    elif name in ("count", "distinct", "findAndModify"):
+        shape.update(filter=redact(command.get("query", {})), sort=command.get("sort"))
+    elif name == "update":
+        shape["filter"] = redact(_first_statement(command, "updates").get("q", {}))
+    elif name == "delete":
+        shape["filter"] = redact(_first_statement(command, "deletes").get("q", {}))
+    if shape["sort"] is not None:
+        shape["sort"] = dict(shape["sort"])
+    return shape
+
+
+def _bucket(value: Any) -> Any:
+    """skip / limit 只取數量級，深分頁的每一頁才會算成同一種結構"""
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        return value
+    return 10 ** (len(str(value)) - 1)
+
+
+def shape_key(name: str, namespace: str, shape: dict) -> str:
+    """結構的雜湊；skip / limit 以數量級代替原值，原值另外存在紀錄裡"""
+    key = {
+        field: _bucket(value) if field in ("skip", "limit") else value
+        for field, value in shape.items()
+    }
+    return hashlib.sha1(
+        json.dumps([name, namespace, key], default=str).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def summarize_explain(explain: dict) -> dict:
+    """從 explain 結果取出使用的計畫（COLLSCAN / IXSCAN）與掃描筆數"""
+    stages: list[str] = []
+    indexes: list[str] = []
+    stats: Optional[dict] = None
+
+    def walk(node: Any):
+        nonlocal stats
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+        stage = node.get("stage")
+        if isinstance(stage, str) and stage not in stages:
+            stages.append(stage)
+        index_name = node.get("indexName")
+        if isinstance(index_name, str) and index_name not in indexes:
+            indexes.append(index_name)
+        if stats is None and isinstance(node.get("executionStats"), dict):
+            stats = node["executionStats"]
+        for key, value in node.items():
+            # 未被採用的計畫不算
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                walk(value)
+
+    walk(explain)
+    if "COLLSCAN" in stages:
+        plan = "COLLSCAN"
+    elif "IXSCAN" in stages:
+        plan = "IXSCAN"
+    else:
+        plan = stages[0] if stages else None
+    stats = stats or {}
+    return {
+        "plan": plan,
+        "stages": stages,
+        "indexes": indexes,
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def _can_explain(name: str, command: dict) -> bool:
+    if name not in EXPLAINABLE_COMMANDS:
+        return False
+    if name == "aggregate":
+        if not isinstance(command.get("aggregate"), str):
+            return False
+        return not any(
+            key in _NO_EXPLAIN_STAGES
+            for stage in command.get("pipeline", [])
+            for key in stage
+        )
+    return True
+
+
+def _is_awaiting(name: str, command: dict) -> bool:
+    """change stream 與 tailable awaitData cursor，之後的 getMore 會等待新資料"""
+    if name == "aggregate":
+        pipeline = command.get("pipeline") or [{}]
+        return "$changeStream" in pipeline[0]
+    if name == "find":
+        return bool(command.get("tailable") and command.get("awaitData"))
+    return False
+
+
+def _reply_cursor_id(event) -> int:
+    cursor = (getattr(event, "reply", None) or {}).get("cursor") or {}
+    return cursor.get("id", 0)
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """在 driver 執行緒中比對耗時；只有超過門檻的指令才交給事件迴圈處理"""
+
+    def __init__(self, log: "SlowQueryLog"):
+        self._log = log
+        self._started: dict[tuple, tuple] = {}
+        # change stream / tailable cursor 的 id；這些 getMore 本來就會等到有資料或逾時
+        self._awaiting_cursors: set[int] = set()
+        self._awaiting_requests: dict[tuple, Optional[int]] = {}
+
+    def started(self, event):
+        name, command = event.command_name, event.command
+        if name == "killCursors":
+            self._awaiting_cursors.difference_update(command.get("cursors", []))
+        if not self._log.active or name in IGNORED_COMMANDS:
+            return
+        key = (event.connection_id, event.request_id)
+        if name == "getMore" and command.get("getMore") in self._awaiting_cursors:
+            self._awaiting_requests[key] = command["getMore"]
+            return
+        if _is_awaiting(name, command):
+            # 開啟 cursor 本身不算慢查詢，只記下回傳的 cursor id
+            self._awaiting_requests[key] = None
+            return
+        # 寫入慢查詢紀錄本身不記錄
+        if command.get(name) == SLOW_QUERY_COLLECTION:
+            return
+        self._started[key] = (command, event.database_name, current_route())
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+    def _finish(self, event, ok: bool):
+        key = (event.connection_id, event.request_id)
+        if key in self._awaiting_requests:
+            cursor_id = self._awaiting_requests.pop(key)
+            reply_id = _reply_cursor_id(event) if ok else 0
+            if cursor_id is None and reply_id:
+                self._awaiting_cursors.add(reply_id)
+            elif cursor_id is not None and not reply_id:
+                # cursor 已結束或出錯
+                self._awaiting_cursors.discard(cursor_id)
+            return
+        started = self._started.pop(key, None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self._log.threshold_ms:
+            self._log.submit(event.command_name, *started, duration_ms, ok)
+
+    def stats(self) -> dict:
+        return {"awaiting_cursors": len(self._awaiting_cursors)}
+
+
+class SlowQueryLog:
+    """記錄慢查詢並在背景 explain，寫入 capped collection
+
+    listener 只把超過門檻的指令丟進佇列，遮蔽、explain 與寫入都在背景 task 執行；
+    相同結構的查詢在 explain_interval 內重複使用上一次的 explain 結果。
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_MS,
+        explain: bool = SLOW_QUERY_EXPLAIN,
+        explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL,
+        queue_size: int = SLOW_QUERY_QUEUE_SIZE,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.queue_size = queue_size
+        self.listener = SlowQueryListener(self)
+        self._explained = TTLCache(maxsize=1024, ttl=explain_interval)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._collection = None
+        self.recorded = 0
+        self.dropped = 0
+        self.explains = 0
+        self.explain_failures = 0
+        self.write_failures = 0
+
+    @property
+    def active(self) -> bool:
+        return self._loop is not None
+
+    def start(self, db: AsyncIOMotorDatabase) -> asyncio.Task:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self.queue_size)
+        self._client = db.client
+        self._collection = db[SLOW_QUERY_COLLECTION]
+        return self._loop.create_task(self._run())
+
+    def stop(self):
+        self._loop = None
+
+    def submit(
+        self,
+        name: str,
+        command: dict,
+        database: str,
+        route: Optional[str],
+        duration_ms: float,
+        ok: bool,
+    ):
+        """由 driver 執行緒呼叫"""
+        loop = self._loop
+        if loop is None:
+            return
+        item = (name, command, database, route, duration_ms, ok, get_now())
+        try:
+            loop.call_soon_threadsafe(self._enqueue, item)
+        except RuntimeError:
+            # 事件迴圈已關閉
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain": self.explain,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "explains": self.explains,
+            "explain_failures": self.explain_failures,
+            "write_failures": self.write_failures,
+            **self.listener.stats(),
+        }
+
+    def _enqueue(self, item: tuple):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._record(*item)
+            except Exception as e:
+                # 任何錯誤都不能讓背景 task 停下，否則之後的慢查詢都不會被記錄
+                self.write_failures += 1
+                create_log(f"Slow query log error: {e}")
+
+    async def _record(
+        self,
+        name: str,
+        command: dict,
+        database: str,
+        route: Optional[str],
+        duration_ms: float,
+        ok: bool,
+        issued_at,
+    ):
+        collection = command.get(name)
+        if name == "getMore":
+            collection = command.get("collection")
+        shape = command_shape(name, command)
+        namespace = f"{database}.{collection}"
+        shape_json = {
+            key: json.dumps(value, default=str) if key in ("filter", "sort") else value
+            for key, value in shape.items()
+        }
+        shape_id = shape_key(name, namespace, shape_json)
+        entry = {
+            "time": issued_at,
+            "command": name,
+            "namespace": namespace,
+            "route": route or "background",
+            "duration_ms": round(duration_ms, 3),
+            "ok": ok,
+            "shape_id": shape_id,
+            "shape": shape_json,
+            "explain": await self._explain(shape_id, name, command, database),
+        }
+        await slow_query_crud.create_entry(self._collection, entry)
+        self.recorded += 1
+        create_log(
+            f"Slow query {name} on {namespace} from {entry['route']}: "
+            f"{entry['duration_ms']}ms"
+        )
+
+    async def _explain(
+        self, shape_id: str, name: str, command: dict, database: str
+    ) -> Optional[dict]:
+        if not self.explain or not _can_explain(name, command):
+            return None
+        cached = self._explained.get(shape_id)
+        if cached is not None:
+            return cached
+        inner = {
+            key: value for key, value in command.items() if key not in _DRIVER_FIELDS
+        }
+        try:
+            result = await self._client[database].command(
+                {"explain": inner, "verbosity": "executionStats"}
+            )
+        except PyMongoError as e:
+            self.explain_failures += 1
+            create_log(f"Slow query explain failed: {e}")
+            return None
+        self.explains += 1
+        summary = summarize_explain(result)
+        self._explained.set(shape_id, summary)
+        return summary
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import json
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.config import CONTEST_COLLECTION, CONTEST_SPLIT_BATCH_SIZE, MONGO_DB
+from app.sql.crud import contest_child_crud, contest_crud
+from app.sql.db import create_mongo_client
+from app.utils.logger_config import create_log
+
+
+async def split_contests(
+    db: AsyncIOMotorDatabase,
+    batch_size: int = CONTEST_SPLIT_BATCH_SIZE,
+    dry_run: bool = False,
+) -> dict:
+    """把比賽文件內嵌的 videos / metrics 分批搬到子 collection
+
+    每批先 upsert 子文件，成功後才 unset 比賽上的欄位；中途中斷可以直接重跑。
+    """
+    contest_collection = db[CONTEST_COLLECTION]
+    report = {"contests": 0, "batches": 0, "children": {}}
+    after = None
+    while True:
+        contests = await contest_crud.get_embedded_batch(
+            contest_collection, after, batch_size
+        )
+        if not contests:
+            break
+        after = contests[-1]["_id"]
+
+        requests: dict[str, list] = {}
+        for contest in contests:
+            for name, ops in contest_child_crud.split_contest(contest).items():
+                requests.setdefault(name, []).extend(ops)
+        for name, ops in requests.items():
+            report["children"][name] = report["children"].get(name, 0) + len(ops)
+            if not dry_run:
+                await db[name].bulk_write(ops, ordered=False)
+        if not dry_run:
+            await contest_crud.unset_embedded(
+                contest_collection, [contest["_id"] for contest in contests]
+            )
+        report["contests"] += len(contests)
+        report["batches"] += 1
+        create_log(f"Split {report['contests']} contests")
+    return report
+
+
+async def _main(args: argparse.Namespace):
+    client = create_mongo_client()
+    try:
+        report = await split_contests(client[MONGO_DB], args.batch_size, args.dry_run)
+    finally:
+        client.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move embedded contest videos/metrics into child collections"
+    )
+    parser.add_argument("--batch-size", type=int, default=CONTEST_SPLIT_BATCH_SIZE)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="count what would be moved"
+    )
+    asyncio.run(_main(parser.parse_args()))
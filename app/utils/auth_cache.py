@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+from redis.asyncio.client import Redis
+
+from app.config import (
+    AUTH_INVALIDATION_CHANNEL,
+    PRINCIPAL_CACHE_SIZE,
+    PRINCIPAL_CACHE_TTL,
+)
+from app.utils.cache import TTLCache
+from app.utils.logger_config import create_log
+from app.utils.revocation import revocation_mirror
+
+
+class PrincipalCache:
+    """快取已驗證的 token 對應的使用者資料，並可依使用者名稱整批失效"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl, on_evict=self._forget)
+        self._tokens_by_user: dict[str, set[str]] = {}
+        # 每次失效就加一；查詢期間有失效發生時不寫入快取，避免存入已登出的 token
+        self.generation = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        user = self._cache.get(token)
+        if user is None:
+            return None
+        return dict(user)
+
+    def set(self, token: str, user: dict, exp: float, generation: int):
+        """generation 為開始驗證前讀到的 self.generation"""
+        if generation != self.generation:
+            return
+        # 快取時間不能超過 token 本身的有效期限
+        ttl = exp - time.time()
+        if ttl <= 0:
+            return
+        self._cache.set(token, dict(user), ttl=ttl)
+        self._tokens_by_user.setdefault(user["username"], set()).add(token)
+
+    def invalidate_token(self, token: str):
+        self.generation += 1
+        self._cache.pop(token)
+
+    def invalidate_user(self, username: str):
+        self.generation += 1
+        for token in list(self._tokens_by_user.get(username, ())):
+            self._cache.pop(token)
+
+    def clear(self):
+        self.generation += 1
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "users": len(self._tokens_by_user)}
+
+    def _forget(self, token: str, user: dict):
+        tokens = self._tokens_by_user.get(user["username"])
+        if tokens is None:
+            return
+        tokens.discard(token)
+        if not tokens:
+            del self._tokens_by_user[user["username"]]
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def invalidation_message(kind: str, value: str, exp: Optional[float] = None) -> str:
+    return json.dumps({"kind": kind, "value": value, "exp": exp})
+
+
+def apply_invalidation(message: str | bytes):
+    try:
+        data = json.loads(message)
+        kind, value = data["kind"], data["value"]
+    except (ValueError, KeyError, TypeError):
+        create_log(f"Ignore invalid auth invalidation message: {message!r}")
+        return
+    if kind == "token":
+        principal_cache.invalidate_token(value)
+        if data.get("exp"):
+            revocation_mirror.add(value, data["exp"])
+    elif kind == "user":
+        principal_cache.invalidate_user(value)
+
+
+async def invalidate_user(redis: Redis, username: str):
+    message = invalidation_message("user", username)
+    apply_invalidation(message)
+    await redis.publish(AUTH_INVALIDATION_CHANNEL, message)
+
+
+async def listen_invalidations(redis: Redis):
+    """訂閱失效通知，讓其他 worker 的變更也同步到這個行程的快取與黑名單"""
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+            # 斷線期間可能漏掉通知，重新訂閱後清空快取並重新載入黑名單；
+            # 先訂閱再載入，載入期間收到的通知會留在連線上稍後處理
+            principal_cache.clear()
+            await revocation_mirror.seed(redis)
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message["type"] == "message":
+                    apply_invalidation(message["data"])
+                revocation_mirror.purge_expired()
+        except asyncio.CancelledError:
+            revocation_mirror.reset()
+            raise
+        except Exception as e:
+            create_log(f"Auth invalidation listener error: {e}")
+            principal_cache.clear()
+            revocation_mirror.reset()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,220 @@
+import asyncio
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional
+
+from bson.objectid import ObjectId
+from fastapi import WebSocket, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import CONTEST_FEED_AUTH_INTERVAL, CONTEST_FEED_SEND_TIMEOUT
+from app.sql.crud import contest_crud
+from app.utils.logger_config import create_log
+from app.utils.serializer import contest_serializer
+
+# 不是 replica set / sharded cluster 時無法使用 change stream
+_NOT_SUPPORTED = {40573}
+
+_PIPELINE = [{"$match": {"operationType": {"$in": ["update", "replace"]}}}]
+
+
+class Subscriber:
+    """一個 WebSocket 連線，只保留最新一則尚未送出的訊息
+
+    訊息都是完整的比賽快照，送不及時直接以新的取代舊的，
+    因此慢的連線最多佔用一則訊息的記憶體，也不會拖慢其他連線。
+    """
+
+    __slots__ = ("_pending", "_event", "coalesced")
+
+    def __init__(self):
+        self._pending: Optional[str] = None
+        self._event = asyncio.Event()
+        self.coalesced = 0
+
+    def offer(self, message: str):
+        if self._pending is not None:
+            self.coalesced += 1
+        self._pending = message
+        self._event.set()
+
+    async def next(self) -> str:
+        await self._event.wait()
+        self._event.clear()
+        message, self._pending = self._pending, None
+        return message
+
+
+class ContestFeed:
+    """每個 worker 一個 change stream，把比賽的更新分送給訂閱的 WebSocket"""
+
+    def __init__(
+        self,
+        send_timeout: float = CONTEST_FEED_SEND_TIMEOUT,
+        auth_interval: float = CONTEST_FEED_AUTH_INTERVAL,
+    ):
+        self.send_timeout = send_timeout
+        self.auth_interval = auth_interval
+        self._subscribers: dict[str, set[Subscriber]] = {}
+        # 正在重新讀取的比賽；讀取期間又有更新時標記為 dirty，讀完再讀一次
+        self._refreshing: set[str] = set()
+        self._dirty: set[str] = set()
+        # 重新讀取的 task 要保留參照，事件迴圈只有弱參照
+        self._tasks: set[asyncio.Task] = set()
+        self.events = 0
+        self.refreshes = 0
+        self.published = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.auth_disconnects = 0
+
+    def subscribe(self, contest_id: str) -> Subscriber:
+        subscriber = Subscriber()
+        self._subscribers.setdefault(contest_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, contest_id: str, subscriber: Subscriber):
+        self.coalesced += subscriber.coalesced
+        subscribers = self._subscribers.get(contest_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[contest_id]
+
+    def publish(self, contest_id: str, contest: dict):
+        subscribers = self._subscribers.get(contest_id)
+        if not subscribers:
+            return
+        # 每則更新只序列化一次，所有連線共用同一個字串
+        message = contest_serializer.dump_json(contest).decode("utf-8")
+        for subscriber in subscribers:
+            subscriber.offer(message)
+        self.published += 1
+
+    async def serve(
+        self,
+        websocket: WebSocket,
+        contest_id: str,
+        contest: dict,
+        authorize: Optional[Callable[[], Awaitable[bool]]] = None,
+    ):
+        """送出目前的比賽快照，之後持續推送更新直到連線關閉
+
+        authorize 每 auth_interval 秒呼叫一次，回傳 False 時以 1008 關閉連線。
+        """
+        subscriber = self.subscribe(contest_id)
+        subscriber.offer(contest_serializer.dump_json(contest).decode("utf-8"))
+        send = asyncio.create_task(self._send(websocket, subscriber))
+        receive = asyncio.create_task(self._receive(websocket))
+        tasks = {send, receive}
+        auth = None
+        if authorize is not None:
+            auth = asyncio.create_task(self._authorize(authorize))
+            tasks.add(auth)
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            errors = [task.exception() for task in done if not task.cancelled()]
+            if any(isinstance(error, asyncio.TimeoutError) for error in errors):
+                self.slow_disconnects += 1
+                with suppress(Exception):
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            elif auth in done:
+                self.auth_disconnects += 1
+                with suppress(Exception):
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.unsubscribe(contest_id, subscriber)
+
+    async def run(self, contest_collection: AsyncIOMotorCollection):
+        while True:
+            try:
+                async with contest_collection.watch(_PIPELINE) as stream:
+                    async for change in stream:
+                        self.events += 1
+                        contest_id = str(change["documentKey"]["_id"])
+                        if contest_id in self._subscribers:
+                            self._notify(contest_collection, contest_id)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _NOT_SUPPORTED:
+                    create_log(f"Contest feed disabled: {e}")
+                    return
+                create_log(f"Contest feed error: {e}")
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                create_log(f"Contest feed error: {e}")
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "contests": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "events": self.events,
+            "refreshes": self.refreshes,
+            "published": self.published,
+            "coalesced": self.coalesced
+            + sum(
+                subscriber.coalesced
+                for subscribers in self._subscribers.values()
+                for subscriber in subscribers
+            ),
+            "slow_disconnects": self.slow_disconnects,
+            "auth_disconnects": self.auth_disconnects,
+        }
+
+    def _notify(self, contest_collection: AsyncIOMotorCollection, contest_id: str):
+        if contest_id in self._refreshing:
+            self._dirty.add(contest_id)
+            return
+        self._refreshing.add(contest_id)
+        task = asyncio.get_running_loop().create_task(
+            self._refresh(contest_collection, contest_id)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(
+        self, contest_collection: AsyncIOMotorCollection, contest_id: str
+    ):
+        # change stream 不帶 fullDocument，只有有人訂閱的比賽才重新讀取；
+        # 連續多次更新合併成一次讀取。不經過 loader，否則可能併入寫入前就已送出的查詢
+        try:
+            while True:
+                self._dirty.discard(contest_id)
+                contest = await contest_crud.get_contest_by_id(
+                    contest_collection, ObjectId(contest_id)
+                )
+                self.refreshes += 1
+                if contest:
+                    self.publish(contest_id, contest)
+                if contest_id not in self._dirty:
+                    break
+        except Exception as e:
+            create_log(f"Contest feed refresh error: {e}")
+        finally:
+            self._refreshing.discard(contest_id)
+
+    async def _send(self, websocket: WebSocket, subscriber: Subscriber):
+        while True:
+            message = await subscriber.next()
+            await asyncio.wait_for(websocket.send_text(message), self.send_timeout)
+
+    async def _authorize(self, authorize: Callable[[], Awaitable[bool]]):
+        while True:
+            await asyncio.sleep(self.auth_interval)
+            if not await authorize():
+                return
+
+    async def _receive(self, websocket: WebSocket):
+        # 用戶端不需要送資料，這裡只是為了偵測斷線
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+
+contest_feed = ContestFeed()
@@ -12,6 +12,21 @@ class TrainType(str, Enum):
     SKEET_SHOOT = "skeet_shoot"
 
 
+class ContestView(str, Enum):
+    SUMMARY = "summary"
+    FULL = "full"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class PageMeta(str, Enum):
+    TOTAL = "total"
+    FACETS = "facets"
+
+
 class ContestStatus(str, Enum):
     INIT = "init"
     STOPPED = "stopped"
@@ -48,3 +48,56 @@ class ContestNotFoundException(HTTPException):
 class ContestAlreadyExistsException(HTTPException):
     def __init__(self):
         super().__init__(status_code=400, detail="Contest already exists")
+
+
+class ContestNotRunningException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Contest is not running")
+
+
+class VideoNotFoundException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=404, detail="Video not found")
+
+
+class VideoTooLargeException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=413, detail="Video too large")
+
+
+class ContentLengthNotValidException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Content-Length not valid")
+
+
+class RangeNotSatisfiableException(HTTPException):
+    def __init__(self, size: int):
+        super().__init__(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+
+class ServiceBusyException(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            status_code=503,
+            detail="Service busy, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Cursor not valid")
+
+
+class InvalidSortFieldException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Sort field not valid")
+
+
+class CursorNotSupportedException(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=400, detail="Cursor cannot be used with search")
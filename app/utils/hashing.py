@@ -0,0 +1,120 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import bcrypt
+
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_WORKERS
+from app.utils.exception import ServiceBusyException
+
+
+class PasswordHasher:
+    """在獨立的執行緒池執行 bcrypt，避免卡住 event loop
+
+    bcrypt 計算時會釋放 GIL，所以執行緒池就能平行處理。
+    同時排隊的工作數有上限，超過時丟出 ServiceBusyException (503)。
+    """
+
+    def __init__(self, workers: int, queue_size: int, rounds: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(
+            bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt(self.rounds)
+        )
+        return hashed.decode("utf-8")
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(
+            bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8")
+        )
+
+    async def hash_many(self, passwords: list[str]) -> list[str | Exception]:
+        """批次雜湊，同時送出的工作數不超過 worker 數，不會一次塞滿佇列"""
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def _hash(password: str) -> str:
+            async with semaphore:
+                return await self.hash(password)
+
+        return await asyncio.gather(
+            *(_hash(password) for password in passwords), return_exceptions=True
+        )
+
+    async def _run(self, fn: Callable, *args):
+        if self._pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise ServiceBusyException()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password-hash"
+            )
+
+        def _job():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started, time.perf_counter()
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        enqueued = time.perf_counter()
+        try:
+            result, started, finished = await loop.run_in_executor(self._executor, _job)
+        finally:
+            self._pending -= 1
+
+        wait, elapsed = started - enqueued, finished - started
+        self.completed += 1
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.hash_time_total += elapsed
+        self.hash_time_max = max(self.hash_time_max, elapsed)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / completed * 1000, 3),
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+            "hash_time_avg_ms": round(self.hash_time_total / completed * 1000, 3),
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 3),
+        }
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, BCRYPT_ROUNDS
+)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+
+async def hash_passwords(passwords: list[str]) -> list[str | Exception]:
+    return await password_hasher.hash_many(passwords)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
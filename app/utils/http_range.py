@@ -0,0 +1,32 @@
+import re
+from typing import Optional
+
+from app.utils.exception import RangeNotSatisfiableException
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """解析單一 bytes Range，回傳 (start, end)，end 含在範圍內
+
+    沒有 Range、格式不支援（例如多段範圍）時回傳 None，改回完整內容。
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N：最後 N 個 bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiableException(size)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiableException(size)
+    return start, end
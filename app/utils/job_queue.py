@@ -0,0 +1,267 @@
+import json
+import time
+from dataclasses import dataclass
+
+from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+
+from app.config import (
+    MEDIA_JOB_DEAD_LETTER,
+    MEDIA_JOB_DEAD_LETTER_MAXLEN,
+    MEDIA_JOB_GROUP,
+    MEDIA_JOB_MAX_ATTEMPTS,
+    MEDIA_JOB_STREAM,
+    MEDIA_JOB_VISIBILITY_TIMEOUT_MS,
+)
+
+VIDEO_PROCESS_JOB = "video.process"
+
+# 每種工作保留最近幾筆耗時，用來計算 p50 / p95
+TIMINGS_KEEP = 500
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: dict
+    # 之前已失敗的次數（不含這一次）
+    attempts: int
+
+    @classmethod
+    def from_entry(cls, entry_id, fields: dict) -> "Job":
+        fields = {_text(key): _text(value) for key, value in fields.items()}
+        return cls(
+            id=_text(entry_id),
+            kind=fields["kind"],
+            payload=json.loads(fields["payload"]),
+            attempts=int(fields.get("attempts", 0)),
+        )
+
+    @property
+    def enqueued_ms(self) -> int:
+        # stream entry id 的前半段就是加入佇列的毫秒時間
+        return int(self.id.split("-")[0])
+
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize_timings(records: list[dict]) -> dict:
+    """依工作種類統計最近幾筆的執行與等待時間"""
+    kinds: dict[str, dict[str, list]] = {}
+    for record in records:
+        kind = kinds.setdefault(record["kind"], {"run": [], "wait": [], "failed": []})
+        kind["run"].append(record["run_ms"])
+        kind["wait"].append(record["wait_ms"])
+        kind["failed"].append(record["status"] != "done")
+    return {
+        name: {
+            "samples": len(values["run"]),
+            "failed": sum(values["failed"]),
+            "run_ms_avg": round(sum(values["run"]) / len(values["run"]), 3),
+            "run_ms_p50": round(percentile(values["run"], 0.5), 3),
+            "run_ms_p95": round(percentile(values["run"], 0.95), 3),
+            "run_ms_max": round(max(values["run"]), 3),
+            "wait_ms_p50": round(percentile(values["wait"], 0.5), 3),
+            "wait_ms_p95": round(percentile(values["wait"], 0.95), 3),
+        }
+        for name, values in kinds.items()
+    }
+
+
+class JobQueue:
+    """以 Redis Streams 與 consumer group 實作的工作佇列
+
+    - 每個工作只會交給 group 內的一個 consumer，完成後 XACK 並 XDEL，
+      所以 stream 長度就是尚未完成的工作數量。
+    - 執行失敗時以 attempts + 1 重新加入佇列，達到 max_attempts 後移到 dead-letter stream。
+    - worker 當掉時工作留在 pending list，閒置超過 visibility_timeout 後由其他 worker 接手；
+      被接手的次數也算在嘗試次數內，避免讓 worker 當掉的工作無限重試。
+    - 執行時間較長的工作要定期呼叫 heartbeat 重設閒置時間。
+    """
+
+    def __init__(
+        self,
+        stream: str = MEDIA_JOB_STREAM,
+        group: str = MEDIA_JOB_GROUP,
+        dead_letter: str = MEDIA_JOB_DEAD_LETTER,
+        max_attempts: int = MEDIA_JOB_MAX_ATTEMPTS,
+        visibility_timeout_ms: int = MEDIA_JOB_VISIBILITY_TIMEOUT_MS,
+        dead_letter_maxlen: int = MEDIA_JOB_DEAD_LETTER_MAXLEN,
+    ):
+        self.stream = stream
+        self.group = group
+        self.dead_letter = dead_letter
+        self.max_attempts = max_attempts
+        self.visibility_timeout_ms = visibility_timeout_ms
+        self.dead_letter_maxlen = dead_letter_maxlen
+        self.timings_key = f"{stream}:timings"
+
+    async def enqueue(
+        self, redis: Redis, kind: str, payload: dict, attempts: int = 0
+    ) -> str:
+        job = Job(id="", kind=kind, payload=payload, attempts=attempts)
+        entry_id = await redis.xadd(self.stream, self._fields(job))
+        return _text(entry_id)
+
+    async def ensure_group(self, redis: Redis):
+        try:
+            await redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(
+        self, redis: Redis, consumer: str, count: int, block_ms: int
+    ) -> list[Job]:
+        response = await redis.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=count, block=block_ms
+        )
+        return [
+            Job.from_entry(entry_id, fields)
+            for _, entries in response or []
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def claim_stale(self, redis: Redis, consumer: str, count: int) -> list[Job]:
+        """接手閒置過久的工作；已被接手太多次的直接移到 dead-letter"""
+        pending = await redis.xpending_range(
+            self.stream,
+            self.group,
+            min="-",
+            max="+",
+            count=count,
+            idle=self.visibility_timeout_ms,
+        )
+        if not pending:
+            return []
+        deliveries = {
+            _text(item["message_id"]): item["times_delivered"] for item in pending
+        }
+        claimed = await redis.xclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=self.visibility_timeout_ms,
+            message_ids=list(deliveries),
+        )
+        jobs = []
+        for entry_id, fields in claimed:
+            entry_id = _text(entry_id)
+            if not fields:
+                # 內容已被刪除，只剩 pending 紀錄
+                await redis.xack(self.stream, self.group, entry_id)
+                continue
+            job = Job.from_entry(entry_id, fields)
+            # 之前每一次交付都沒有完成，視為失敗
+            job.attempts += deliveries.get(entry_id, 1) - 1
+            if job.attempts >= self.max_attempts:
+                async with redis.pipeline(transaction=True) as pipe:
+                    self._dead_letter(pipe, job, "worker lost while running job")
+                    await pipe.execute()
+                continue
+            jobs.append(job)
+        return jobs
+
+    async def heartbeat(self, redis: Redis, consumer: str, job: Job):
+        # JUSTID 不會增加交付次數，只重設閒置時間
+        await redis.xclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=0,
+            message_ids=[job.id],
+            justid=True,
+        )
+
+    async def ack(self, redis: Redis, job: Job, started: float):
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+            self._record(pipe, job, started, "done")
+            await pipe.execute()
+
+    async def fail(self, redis: Redis, job: Job, error: str, started: float) -> bool:
+        """記錄失敗並重新加入佇列；回傳是否已移到 dead-letter"""
+        job.attempts += 1
+        dead = job.attempts >= self.max_attempts
+        async with redis.pipeline(transaction=True) as pipe:
+            self._record(pipe, job, started, "failed")
+            if dead:
+                self._dead_letter(pipe, job, error)
+            else:
+                pipe.xadd(self.stream, self._fields(job))
+                pipe.xack(self.stream, self.group, job.id)
+                pipe.xdel(self.stream, job.id)
+            await pipe.execute()
+        return dead
+
+    async def stats(self, redis: Redis) -> dict:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.xlen(self.stream)
+            pipe.xpending(self.stream, self.group)
+            pipe.xlen(self.dead_letter)
+            pipe.lrange(self.timings_key, 0, -1)
+            depth, pending, dead, timings = await pipe.execute(raise_on_error=False)
+        if isinstance(pending, ResponseError):
+            # consumer group 尚未建立（還沒有 worker 啟動過）
+            pending = {"pending": 0, "consumers": []}
+        for result in (depth, dead, timings):
+            if isinstance(result, Exception):
+                raise result
+        records = [json.loads(record) for record in timings or []]
+        in_progress = pending["pending"]
+        return {
+            "stream": self.stream,
+            "depth": depth,
+            "waiting": max(depth - in_progress, 0),
+            "in_progress": in_progress,
+            "consumers": {
+                _text(consumer["name"]): consumer["pending"]
+                for consumer in pending.get("consumers") or []
+            },
+            "dead_letter": dead,
+            "max_attempts": self.max_attempts,
+            "timings": summarize_timings(records),
+        }
+
+    def _dead_letter(self, pipe, job: Job, error: str):
+        fields = {**self._fields(job), "job_id": job.id, "error": error[:2000]}
+        pipe.xadd(self.dead_letter, fields, maxlen=self.dead_letter_maxlen)
+        pipe.xack(self.stream, self.group, job.id)
+        pipe.xdel(self.stream, job.id)
+
+    @staticmethod
+    def _fields(job: Job) -> dict:
+        return {
+            "kind": job.kind,
+            "payload": json.dumps(job.payload),
+            "attempts": job.attempts,
+        }
+
+    def _record(self, pipe, job: Job, started: float, status: str):
+        now = time.time()
+        record = {
+            "id": job.id,
+            "kind": job.kind,
+            "status": status,
+            "attempts": job.attempts,
+            "wait_ms": round(max(started * 1000 - job.enqueued_ms, 0), 3),
+            "run_ms": round((now - started) * 1000, 3),
+        }
+        pipe.lpush(self.timings_key, json.dumps(record))
+        pipe.ltrim(self.timings_key, 0, TIMINGS_KEEP - 1)
+
+
+media_queue = JobQueue()
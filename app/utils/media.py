@@ -0,0 +1,100 @@
+import os
+import subprocess
+import time
+from dataclasses import dataclass
+
+from app.config import FFMPEG_BINARY, MEDIA_JOB_TIMEOUT
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    height: int
+    bitrate: str
+
+
+class MediaProcessingError(Exception):
+    pass
+
+
+def parse_renditions(value: str) -> list[RenditionSpec]:
+    """解析 "360:600k,720:2500k"，依高度由低到高排序"""
+    specs = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        height, _, bitrate = item.partition(":")
+        if not height.isdigit() or not bitrate:
+            raise ValueError(f"Invalid rendition {item!r}, expected HEIGHT:BITRATE")
+        specs.append(RenditionSpec(height=int(height), bitrate=bitrate))
+    return sorted(set(specs), key=lambda spec: spec.height)
+
+
+def thumbnail_command(source: str, target: str, width: int) -> list[str]:
+    # thumbnail 濾鏡從前 50 格中挑出最具代表性的一格，避免取到黑畫面
+    return [
+        FFMPEG_BINARY,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        source,
+        "-vf",
+        f"thumbnail=50,scale={width}:-2",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "3",
+        target,
+    ]
+
+
+def rendition_command(source: str, target: str, spec: RenditionSpec) -> list[str]:
+    # 原始影片比目標還小時不放大
+    return [
+        FFMPEG_BINARY,
+        "-nostdin",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        source,
+        "-vf",
+        f"scale=-2:min({spec.height}\\,ih)",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-b:v",
+        spec.bitrate,
+        "-maxrate",
+        spec.bitrate,
+        "-bufsize",
+        spec.bitrate,
+        "-c:a",
+        "aac",
+        "-b:a",
+        "128k",
+        "-movflags",
+        "+faststart",
+        target,
+    ]
+
+
+def run_ffmpeg(command: list[str], timeout: float = MEDIA_JOB_TIMEOUT) -> float:
+    """在 process pool 內執行，回傳耗時（毫秒）；輸出檔不存在時視為失敗"""
+    start = time.perf_counter()
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=timeout)
+    except FileNotFoundError:
+        raise MediaProcessingError(f"{command[0]} not found")
+    except subprocess.TimeoutExpired:
+        raise MediaProcessingError(f"ffmpeg timed out after {timeout}s")
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode("utf-8", "replace").strip()
+        raise MediaProcessingError(f"ffmpeg exited with {e.returncode}: {stderr}")
+    target = command[-1]
+    if not os.path.exists(target) or not os.path.getsize(target):
+        raise MediaProcessingError(f"ffmpeg produced no output for {target}")
+    return (time.perf_counter() - start) * 1000
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import time
+from typing import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+from redis.asyncio.client import Pipeline, Redis
+
+from app.config import METRICS_SAMPLE_INTERVAL, PROMETHEUS_MULTIPROC_DIR
+
+# 沒有對應到任何路由的請求（404 掃描等）統一歸到同一個 label，避免 label 數量爆增
+UNMATCHED_ROUTE = "<unmatched>"
+
+_LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled wake-up of the sampler and when it actually ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency measured by the driver",
+    ["command", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REDIS_COMMAND_LATENCY = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency; pipelines are recorded as PIPELINE / MULTI",
+    ["command", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+POOL_CONNECTIONS = Gauge(
+    "pool_connections",
+    "Connection pool usage per worker, summed across workers",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "In-process cache lookups by result",
+    ["cache", "result"],
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """記錄每個 MongoDB 指令的耗時與成功/失敗次數，由 driver 的執行緒呼叫"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "ok").observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "error").observe(
+            event.duration_micros / 1e6
+        )
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def _observe_redis(command, start: float, status: str):
+    name = command.decode() if isinstance(command, bytes) else str(command)
+    REDIS_COMMAND_LATENCY.labels(name.upper(), status).observe(
+        time.perf_counter() - start
+    )
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        command = "MULTI" if self.is_transaction else "PIPELINE"
+        try:
+            result = await super().execute(raise_on_error)
+        except Exception:
+            _observe_redis(command, start, "error")
+            raise
+        _observe_redis(command, start, "ok")
+        return result
+
+
+class InstrumentedRedis(Redis):
+    """記錄每個 Redis 指令耗時的 client；pub/sub 與阻塞讀取不經過這裡"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            result = await super().execute_command(*args, **options)
+        except Exception:
+            _observe_redis(args[0], start, "error")
+            raise
+        _observe_redis(args[0], start, "ok")
+        return result
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class MetricsMiddleware:
+    """純 ASGI middleware，路由比對完成後以 scope["route"] 的路徑樣板當作 label"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method, getattr(route, "path", UNMATCHED_ROUTE), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+class CounterDelta:
+    """把物件內部累計的計數轉成 Prometheus counter，只在取樣時增加差值"""
+
+    def __init__(self, counter, read: Callable[[], float]):
+        self.counter = counter
+        self.read = read
+        self.last = 0.0
+
+    def sample(self):
+        value = self.read()
+        if value > self.last:
+            self.counter.inc(value - self.last)
+        self.last = value
+
+
+class MetricsSampler:
+    """定期量測事件迴圈延遲，並更新連線池與快取計數
+
+    快取與連線池本身已有計數，在這裡取差值寫入，請求路徑上不需要多做事。
+    """
+
+    def __init__(self, interval: float = METRICS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._counters: list[CounterDelta] = []
+        self._gauges: list[tuple[Gauge, Callable[[], float]]] = []
+
+    def track_counter(self, cache: str, result: str, read: Callable[[], float]):
+        self._counters.append(CounterDelta(CACHE_REQUESTS.labels(cache, result), read))
+
+    def track_gauge(self, pool: str, state: str, read: Callable[[], float]):
+        self._gauges.append((POOL_CONNECTIONS.labels(pool, state), read))
+
+    def sample(self):
+        for counter in self._counters:
+            counter.sample()
+        for gauge, read in self._gauges:
+            gauge.set(read())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0.0))
+            self.sample()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        # 合併所有 worker 寫在 PROMETHEUS_MULTIPROC_DIR 的數值
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    # 讓 live* 模式的 gauge 不再計入已結束的 worker
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,81 @@
+import base64
+from typing import Any, Optional
+
+from bson import json_util
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel
+
+from app.utils.exception import InvalidCursorException
+
+
+def encode_cursor(value: Any, id: str) -> str:
+    """把最後一筆的排序欄位值與 _id 編成不透明的 cursor 字串"""
+    raw = json_util.dumps({"v": value, "id": ObjectId(id)})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value, id = data["v"], data["id"]
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidCursorException()
+    if not isinstance(id, ObjectId):
+        raise InvalidCursorException()
+    return value, id
+
+
+def get_field(document: dict, path: str) -> Any:
+    # 支援 "athlete.name" 這種巢狀欄位
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def keyset_sort(sort_by: str, sort_order: int) -> list[tuple[str, int]]:
+    if sort_by in ("_id", "id"):
+        return [("_id", sort_order)]
+    return [(sort_by, sort_order), ("_id", sort_order)]
+
+
+def keyset_indexes(sortable_fields: set[str]) -> list[IndexModel]:
+    """每個可排序欄位各一個 (sort_by, _id) 複合索引，反向排序時可倒著掃描"""
+    return [
+        IndexModel([(field, ASCENDING), ("_id", ASCENDING)])
+        for field in sorted(sortable_fields - {"_id", "id"})
+    ]
+
+
+def keyset_query(sort_by: str, sort_order: int, cursor: str) -> dict:
+    """產生「排在 cursor 之後」的查詢條件，搭配 keyset_sort 與 (sort_by, _id) 索引使用"""
+    value, id = decode_cursor(cursor)
+    op = "$gt" if sort_order >= 0 else "$lt"
+    if sort_by in ("_id", "id"):
+        return {"_id": {op: id}}
+
+    tie = {sort_by: value, "_id": {op: id}}
+    # MongoDB 排序時 null/缺少欄位排在最前面，但 $gt/$lt 不會比對到 null
+    if value is None:
+        if op == "$gt":
+            return {"$or": [{sort_by: {"$ne": None}}, tie]}
+        return tie
+    if op == "$lt":
+        return {"$or": [{sort_by: {op: value}}, tie, {sort_by: None}]}
+    return {"$or": [{sort_by: {op: value}}, tie]}
+
+
+def next_cursor(items: list[dict], limit: int, sort_by: str) -> Optional[str]:
+    if limit <= 0 or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(get_field(last, sort_by), last["id"])
+
+
+def split_page(items: list[dict], limit: int) -> tuple[list[dict], bool]:
+    """查詢時多取一筆，用來判斷是否還有下一頁"""
+    return items[:limit], len(items) > limit
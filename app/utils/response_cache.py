@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from fastapi import Request, Response
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from app.config import RESPONSE_CACHE_STALE_TTL, RESPONSE_CACHE_TTL
+from app.utils.logger_config import create_log
+from app.utils.serializer import TrustedSerializer
+
+CONTEST_NAMESPACE = "contest"
+USER_NAMESPACE = "user"
+
+# load 回傳 (資料, 額外的 response header)
+Loader = Callable[[], Awaitable[tuple[Any, dict]]]
+
+
+def _default(value: Any):
+    return str(value)
+
+
+class ResponseCache:
+    """以 Redis 快取序列化後的回應，支援 ETag / If-None-Match 與 stale-while-revalidate
+
+    每個 namespace 有一個版本號放在快取 key 裡，寫入時加一讓舊的 key 全部失效；
+    失效前就開始的查詢會寫回舊版本的 key，不會被讀到，舊 key 等 TTL 到期自然清除。
+    """
+
+    def __init__(
+        self, ttl: int = RESPONSE_CACHE_TTL, stale_ttl: int = RESPONSE_CACHE_STALE_TTL
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._refreshing: set[str] = set()
+        # 背景更新的 task 要保留參照，事件迴圈只有弱參照
+        self._tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @staticmethod
+    def cache_key(
+        namespace: str, request: Request, current_user: dict, version: int = 0
+    ) -> str:
+        # 權限等級與查詢參數都算在 key 內
+        tier = current_user.get("permission", "")
+        query = sorted(request.query_params.multi_items())
+        raw = f"{request.url.path}?{query}"
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"rc:{namespace}:v{version}:{tier}:{digest}"
+
+    @staticmethod
+    def version_key(namespace: str) -> str:
+        return f"rc_version:{namespace}"
+
+    async def respond(
+        self,
+        namespace: str,
+        request: Request,
+        current_user: dict,
+        redis: Redis,
+        load: Loader,
+        serializer: Optional[TrustedSerializer] = None,
+    ) -> Response:
+        try:
+            version = int(await redis.get(self.version_key(namespace)) or 0)
+            key = self.cache_key(namespace, request, current_user, version)
+            entry = await redis.hgetall(key)
+        except RedisError as e:
+            self._error(e)
+            # Redis 無法使用時直接查詢，不寫入快取
+            key, entry = None, None
+
+        if entry:
+            if float(entry[b"fresh_until"]) > time.time():
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(key, redis, load, serializer)
+            body, etag = entry[b"body"], entry[b"etag"].decode("utf-8")
+            headers = json.loads(entry[b"headers"])
+        else:
+            self.misses += 1
+            body, etag, headers = await self._load(key, redis, load, serializer)
+        return self._response(request, body, etag, headers)
+
+    async def invalidate(self, redis: Redis, namespace: str):
+        self.invalidations += 1
+        try:
+            await redis.incr(self.version_key(namespace))
+        except RedisError as e:
+            self._error(e)
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+    async def _load(
+        self,
+        key: Optional[str],
+        redis: Redis,
+        load: Loader,
+        serializer: Optional[TrustedSerializer],
+    ) -> tuple[bytes, str, dict]:
+        data, headers = await load()
+        if serializer is not None:
+            body = serializer.dump_json(data)
+        else:
+            body = orjson.dumps(data, default=_default)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if key is None:
+            return body, etag, headers
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hset(
+                    key,
+                    mapping={
+                        "body": body,
+                        "etag": etag,
+                        "headers": json.dumps(headers),
+                        "fresh_until": time.time() + self.ttl,
+                    },
+                )
+                pipe.expire(key, self.ttl + self.stale_ttl)
+                await pipe.execute()
+        except RedisError as e:
+            self._error(e)
+        return body, etag, headers
+
+    def _schedule_refresh(
+        self,
+        key: str,
+        redis: Redis,
+        load: Loader,
+        serializer: Optional[TrustedSerializer],
+    ):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def _refresh():
+            try:
+                # 多個 worker 同時發現過期時，只讓一個去重新查詢
+                if await redis.set(f"{key}:lock", "1", nx=True, ex=self.ttl or 1):
+                    await self._load(key, redis, load, serializer)
+                    self.refreshes += 1
+            except Exception as e:
+                self._error(e)
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(_refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _response(
+        self, request: Request, body: bytes, etag: str, headers: dict
+    ) -> Response:
+        headers = {
+            **headers,
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def _error(self, e: Exception):
+        self.errors += 1
+        create_log(f"Response cache error: {e}")
+
+
+response_cache = ResponseCache()
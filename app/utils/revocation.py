@@ -0,0 +1,92 @@
+import time
+
+from redis.asyncio.client import Redis
+
+BLACKLIST_PREFIX = "blacklist_"
+
+
+class RevocationMirror:
+    """每個 worker 保留一份已登出 token 的清單，避免每個請求都去 Redis 查黑名單
+
+    在與 Redis 同步完成前（啟動中或 pub/sub 斷線時）synced 為 False，
+    這段期間呼叫端仍需向 Redis 確認。
+    """
+
+    PURGE_INTERVAL = 30
+
+    def __init__(self):
+        self._revoked: dict[str, float] = {}
+        self._last_purge = time.time()
+        self.synced = False
+        self.local_hits = 0
+        self.local_misses = 0
+        self.redis_checks = 0
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, token: str, exp: float):
+        if exp > time.time():
+            self._revoked[token] = exp
+
+    def is_revoked(self, token: str) -> bool:
+        exp = self._revoked.get(token)
+        if exp is None:
+            self.local_misses += 1
+            return False
+        if exp <= time.time():
+            del self._revoked[token]
+            self.local_misses += 1
+            return False
+        self.local_hits += 1
+        return True
+
+    def purge_expired(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        for token, exp in list(self._revoked.items()):
+            if exp <= now:
+                del self._revoked[token]
+
+    def reset(self):
+        self.synced = False
+        self._revoked.clear()
+
+    async def seed(self, redis: Redis, batch_size: int = 1000):
+        """從 Redis 載入目前所有黑名單 token，過期時間以 key 剩餘的 TTL 推算"""
+        cursor = 0
+        while True:
+            cursor, keys = await redis.scan(
+                cursor, match=f"{BLACKLIST_PREFIX}*", count=batch_size
+            )
+            if keys:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.ttl(key)
+                    ttls = await pipe.execute()
+                now = time.time()
+                for key, ttl in zip(keys, ttls):
+                    if ttl is None or ttl == -2:
+                        continue
+                    if isinstance(key, bytes):
+                        key = key.decode("utf-8")
+                    token = key[len(BLACKLIST_PREFIX) :]
+                    # -1 代表沒有設定過期時間，保守地視為一直有效
+                    self._revoked[token] = now + ttl if ttl >= 0 else float("inf")
+            if cursor == 0:
+                break
+        self.synced = True
+
+    def stats(self) -> dict:
+        return {
+            "synced": self.synced,
+            "size": len(self._revoked),
+            "local_hits": self.local_hits,
+            "local_misses": self.local_misses,
+            "redis_checks": self.redis_checks,
+        }
+
+
+revocation_mirror = RevocationMirror()
@@ -0,0 +1,33 @@
+from contextvars import ContextVar
+from typing import Optional
+
+# 目前請求的 ASGI scope；背景工作中為 None
+_current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+def current_route() -> Optional[str]:
+    """發出查詢的路由樣板，例如 GET /contests/{contest_id}
+
+    motor 在 driver 執行緒中執行時會複製 context，所以 pymongo 的 listener 也讀得到。
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', 'WS')} {path}"
+
+
+class RouteContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
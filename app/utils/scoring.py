@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.config import ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL
+from app.utils.cache import TTLCache
+from app.utils.enums import TrainType
+
+
+@dataclass(frozen=True)
+class Discipline:
+    targets_per_round: int
+    stations: int
+
+
+DISCIPLINES = {
+    TrainType.TRAP_SHOOT: Discipline(targets_per_round=25, stations=5),
+    TrainType.SKEET_SHOOT: Discipline(targets_per_round=25, stations=8),
+}
+
+# 每場比賽 / 每位選手的分析結果，避免重複讀取與計算
+score_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class ShotSeries:
+    """依時間排序的射擊資料，每個欄位一個陣列"""
+
+    contest: np.ndarray  # 比賽編號（對應 contest_ids 的索引）
+    round: np.ndarray
+    station: np.ndarray
+    hit: np.ndarray
+    contest_ids: list[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.hit)
+
+
+def _int_column(values: list[int], dtype, size: int) -> np.ndarray:
+    # 資料庫中可能有超出 dtype 範圍的舊資料，先以 int64 讀入再截斷，避免 OverflowError
+    column = np.fromiter(values, dtype=np.int64, count=size)
+    info = np.iinfo(dtype)
+    return np.clip(column, info.min, info.max).astype(dtype)
+
+
+def series_from_columns(
+    contest_ids: list[str], rounds: list[int], stations: list[int], hits: list[bool]
+) -> ShotSeries:
+    """由逐欄收集的 list 建立陣列，比賽 id 依出現順序轉成整數編號"""
+    size = len(hits)
+    codes: dict[str, int] = {}
+    contest = np.fromiter(
+        (codes.setdefault(contest_id, len(codes)) for contest_id in contest_ids),
+        dtype=np.int32,
+        count=size,
+    )
+    return ShotSeries(
+        contest=contest,
+        round=_int_column(rounds, np.int32, size),
+        station=_int_column(stations, np.int16, size),
+        hit=np.fromiter(hits, dtype=bool, count=size),
+        contest_ids=list(codes),
+    )
+
+
+def round_index(series: ShotSeries) -> np.ndarray:
+    """每一發所屬的回合編號（跨比賽連續編號），比賽或回合改變時加一"""
+    if not series.size:
+        return np.zeros(0, dtype=np.int64)
+    boundary = np.empty(series.size, dtype=bool)
+    boundary[0] = True
+    np.not_equal(series.round[1:], series.round[:-1], out=boundary[1:])
+    boundary[1:] |= series.contest[1:] != series.contest[:-1]
+    return np.cumsum(boundary) - 1
+
+
+def round_scores(series: ShotSeries) -> np.ndarray:
+    index = round_index(series)
+    return np.bincount(index, weights=series.hit).astype(np.int64)
+
+
+def station_hit_rates(series: ShotSeries, discipline: Discipline) -> np.ndarray:
+    """各站的命中率，沒有資料的站為 nan"""
+    length = discipline.stations + 1
+    # 超出範圍的站號歸到 0，不計入任何一站
+    station = np.where(series.station > discipline.stations, 0, series.station)
+    shots = np.bincount(station, minlength=length)
+    hits = np.bincount(station, weights=series.hit, minlength=length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = hits / shots
+    # 站號從 1 開始
+    return rates[1:]
+
+
+def streaks(hit: np.ndarray) -> tuple[int, int]:
+    """(最長連續命中, 目前連續命中)"""
+    if not len(hit):
+        return 0, 0
+    padded = np.concatenate(([False], hit, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = edges[1::2] - edges[::2]
+    longest = int(runs.max()) if len(runs) else 0
+    current = int(runs[-1]) if hit[-1] else 0
+    return longest, current
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """以 cumsum 計算移動平均，長度為 len(values) - window + 1"""
+    if window <= 0 or len(values) < window:
+        return np.zeros(0, dtype=np.float64)
+    cumsum = np.cumsum(values, dtype=np.float64)
+    cumsum[window:] = cumsum[window:] - cumsum[:-window]
+    return cumsum[window - 1 :] / window
+
+
+def _rate(hits: int, shots: int) -> float:
+    return round(hits / shots, 4) if shots else 0.0
+
+
+def score_contest(series: ShotSeries, train_type: TrainType) -> dict:
+    discipline = DISCIPLINES[train_type]
+    hits = int(series.hit.sum())
+    longest, current = streaks(series.hit)
+    rates = station_hit_rates(series, discipline)
+    return {
+        "train_type": train_type,
+        "targets_per_round": discipline.targets_per_round,
+        "shots": series.size,
+        "hits": hits,
+        "hit_rate": _rate(hits, series.size),
+        "round_scores": round_scores(series).tolist(),
+        "station_hit_rates": {
+            str(station): round(float(rate), 4)
+            for station, rate in enumerate(rates, start=1)
+            if not np.isnan(rate)
+        },
+        "longest_streak": longest,
+        "current_streak": current,
+    }
+
+
+def analyze_history(
+    series: ShotSeries, train_type: TrainType, window: int, last: int
+) -> dict:
+    """選手的歷史分析；移動平均以回合分數計算，只回傳最後 last 個點"""
+    discipline = DISCIPLINES[train_type]
+    scores = round_scores(series)
+    hits = int(series.hit.sum())
+    longest, _ = streaks(series.hit)
+    average = moving_average(scores, window)[-last:] if last > 0 else []
+    return {
+        "train_type": train_type,
+        "targets_per_round": discipline.targets_per_round,
+        "contests": len(series.contest_ids),
+        "rounds": len(scores),
+        "shots": series.size,
+        "hits": hits,
+        "hit_rate": _rate(hits, series.size),
+        "best_round": int(scores.max()) if len(scores) else 0,
+        "longest_streak": longest,
+        "window": window,
+        "moving_average": [round(float(value), 3) for value in average],
+    }
@@ -0,0 +1,31 @@
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    # 全形轉半形、大小寫不敏感
+    return unicodedata.normalize("NFKC", text or "").casefold().strip()
+
+
+def _tokens(text: str) -> list[str]:
+    return normalize(text).split()
+
+
+def build_search_grams(*texts: str) -> list[str]:
+    """建立 unigram + bigram 索引詞，中文名稱沒有空白分詞也能做子字串搜尋"""
+    grams = set()
+    for text in texts:
+        for token in _tokens(text):
+            grams.update(token)
+            grams.update(token[i : i + 2] for i in range(len(token) - 1))
+    return sorted(grams)
+
+
+def query_grams(term: str) -> list[str]:
+    """搜尋字串拆成的索引詞，文件必須包含全部的詞才可能命中"""
+    grams = set()
+    for token in _tokens(term):
+        if len(token) == 1:
+            grams.add(token)
+        else:
+            grams.update(token[i : i + 2] for i in range(len(token) - 1))
+    return sorted(grams)
@@ -1,10 +1,10 @@
 from datetime import timedelta
+from typing import Optional
 
-import bcrypt
 import jwt
 from redis.asyncio.client import Redis
 from bson.objectid import ObjectId
-from fastapi import Depends
+from fastapi import Depends, Query, WebSocket, WebSocketException, status
 from fastapi.security import HTTPBearer
 from fastapi.security.http import HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
@@ -12,14 +12,23 @@ from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 from app.config import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     ALGORITHM,
+    AUTH_INVALIDATION_CHANNEL,
     SECRET_KEY,
     USER_COLLECTION,
 )
 from app.sql.crud import user_crud
 from app.sql.db import get_database, get_redis
+from app.sql.pipeline import RedisBatch
 from app.utils import get_now
+from app.utils.auth_cache import (
+    apply_invalidation,
+    invalidation_message,
+    principal_cache,
+)
 from app.utils.enums import UserPermission
 from app.utils.exception import CredentialsException, ForbiddenException
+from app.utils.hashing import verify_password
+from app.utils.revocation import BLACKLIST_PREFIX, revocation_mirror
 
 # oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 security_scheme = HTTPBearer()
@@ -61,22 +70,24 @@ async def check_otp(
     password: str,
 ):
     user = await user_crud.get_user_by_id(user_collection, user_id)
-    if user["is_use_otp"] and bcrypt.checkpw(
-        password.encode("utf-8"), user["password"].encode("utf-8")
-    ):
+    if user["is_use_otp"] and await verify_password(password, user["password"]):
         return user
     return None
 
 
-async def get_current_user(
-    token: HTTPAuthorizationCredentials = Depends(security_scheme),
-    redis: Redis = Depends(get_redis),
-    db: AsyncIOMotorDatabase = Depends(get_database),
-):
+async def authenticate(credentials: str, redis: Redis, db: AsyncIOMotorDatabase):
+    # 命中快取代表 token 已驗證過且未被登出（登出會透過 pub/sub 讓快取失效）
+    user = principal_cache.get(credentials)
+    if user is not None:
+        user["access_token"] = credentials
+        return user
+
     user_collection = db[USER_COLLECTION]
+    # 必須在檢查黑名單之前讀取，之後的 await 期間若有失效通知就不快取結果
+    generation = principal_cache.generation
 
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(credentials, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise CredentialsException()
@@ -84,17 +95,31 @@ async def get_current_user(
         raise CredentialsException()
 
     # Check if token is blacklisted
-    is_blacklisted = await redis.get(f"blacklist_{token.credentials}")
-    if is_blacklisted:
+    if revocation_mirror.is_revoked(credentials):
         raise CredentialsException()
+    # 本地黑名單尚未與 Redis 同步完成前，仍以 Redis 為準
+    if not revocation_mirror.synced:
+        revocation_mirror.redis_checks += 1
+        is_blacklisted = await redis.get(f"{BLACKLIST_PREFIX}{credentials}")
+        if is_blacklisted:
+            raise CredentialsException()
 
-    user = await user_crud.get_user_by_username(user_collection, username)
+    user = await user_crud.load_user_by_username(user_collection, username)
     if user is None:
         raise CredentialsException()
-    user["access_token"] = token.credentials
+    principal_cache.set(credentials, user, payload["exp"], generation)
+    user["access_token"] = credentials
     return user
 
 
+async def get_current_user(
+    token: HTTPAuthorizationCredentials = Depends(security_scheme),
+    redis: Redis = Depends(get_redis),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    return await authenticate(token.credentials, redis, db)
+
+
 def check_permission(user_permission: list[UserPermission]):
     def _check_permission(current_user: dict = Depends(get_current_user)):
         if current_user.get("permission", None) not in user_permission:
@@ -104,5 +129,62 @@ def check_permission(user_permission: list[UserPermission]):
     return _check_permission
 
 
+async def is_authorized(
+    token: str,
+    redis: Redis,
+    db: AsyncIOMotorDatabase,
+    user_permission: list[UserPermission],
+) -> bool:
+    """重新驗證已建立的長連線；token 被登出、撤銷或過期時回傳 False"""
+    try:
+        current_user = await authenticate(token, redis, db)
+    except CredentialsException:
+        return False
+    return current_user.get("permission", None) in user_permission
+
+
+def check_ws_permission(user_permission: list[UserPermission]):
+    """WebSocket 版的 check_permission
+
+    瀏覽器的 WebSocket 無法自訂 Authorization header，因此也接受 ?token= 參數；
+    驗證失敗時在 accept 之前以 1008 關閉連線。
+    """
+
+    async def _check_ws_permission(
+        websocket: WebSocket,
+        token: Optional[str] = Query(None),
+        redis: Redis = Depends(get_redis),
+        db: AsyncIOMotorDatabase = Depends(get_database),
+    ):
+        if token is None:
+            scheme, _, value = websocket.headers.get("authorization", "").partition(" ")
+            token = value if scheme.lower() == "bearer" else None
+        try:
+            if not token:
+                raise CredentialsException()
+            current_user = await authenticate(token, redis, db)
+        except CredentialsException:
+            raise WebSocketException(
+                code=status.WS_1008_POLICY_VIOLATION,
+                reason="Could not validate credentials",
+            )
+        if current_user.get("permission", None) not in user_permission:
+            raise WebSocketException(
+                code=status.WS_1008_POLICY_VIOLATION, reason="Forbidden"
+            )
+        return current_user
+
+    return _check_ws_permission
+
+
 async def blacklist_token(token: str, redis: Redis):
-    await redis.set(f"blacklist_{token}", "true", ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    # 黑名單只需保留到 token 本身過期為止
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False})["exp"]
+    except (jwt.PyJWTError, KeyError):
+        exp = get_now().timestamp() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    message = invalidation_message("token", token, exp)
+    apply_invalidation(message)
+    async with RedisBatch(redis) as batch:
+        batch.set(f"{BLACKLIST_PREFIX}{token}", "true", exat=int(exp) + 1)
+        batch.publish(AUTH_INVALIDATION_CHANNEL, message)
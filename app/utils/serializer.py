@@ -0,0 +1,64 @@
+from typing import Any, Mapping, Optional
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+from app.config import FAST_SERIALIZATION
+from app.model import contest_model, user_model
+
+
+def _default(value: Any):
+    # ObjectId 等 orjson 不認得的型別
+    return str(value)
+
+
+class TrustedSerializer:
+    """用 response model 的 TypeAdapter 直接輸出 JSON bytes
+
+    驗證與序列化都在 pydantic-core 內一次完成，輸出與 FastAPI 預設流程相同
+    （日期格式、巢狀模型多餘欄位的處理），但省掉 jsonable_encoder 與 Python 端的中間物件。
+    TypeAdapter 在建立時就先編譯好。
+    """
+
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        self._one = TypeAdapter(model)
+        self._many = TypeAdapter(list[model])
+
+    def dump_json(self, data: dict | list[dict]) -> bytes:
+        adapter = self._many if isinstance(data, list) else self._one
+        return adapter.dump_json(adapter.validate_python(data))
+
+
+contest_serializer = TrustedSerializer(contest_model.ContestResponseModel)
+contest_summary_serializer = TrustedSerializer(contest_model.ContestSummaryModel)
+user_serializer = TrustedSerializer(user_model.UserResponseModel)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+
+def respond(
+    data: Any,
+    serializer: Optional[TrustedSerializer] = None,
+    headers: Optional[Mapping[str, str]] = None,
+):
+    """FAST_SERIALIZATION 開啟時直接把資料序列化成 bytes 回傳
+
+    回傳 Response 物件時 FastAPI 會跳過 response_model 驗證與 jsonable_encoder，
+    資料只會被序列化一次。關閉時原樣回傳，走 FastAPI 的一般流程。
+    直接回傳 Response 時注入的 Response 參數上的 header 不會被套用，需由 headers 傳入。
+    """
+    if not FAST_SERIALIZATION:
+        return data
+    if serializer is not None:
+        body = serializer.dump_json(data)
+    elif isinstance(data, BaseModel):
+        body = data.__pydantic_serializer__.to_json(data)
+    else:
+        body = orjson.dumps(data, default=_default)
+    if headers is not None:
+        headers = {k: v for k, v in headers.items() if k.lower() != "content-length"}
+    return FastJSONResponse(body, headers=headers)
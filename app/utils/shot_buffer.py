@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+from app.config import SHOT_BUFFER_MAX, SHOT_FLUSH_INTERVAL_MS, SHOT_FLUSH_SIZE
+from app.sql.crud import shot_crud
+from app.utils.logger_config import create_log
+
+
+class ShotBuffer:
+    """射擊資料的寫入緩衝，累積到 flush_size 筆或每 flush_interval 秒寫入一次
+
+    緩衝滿了（資料庫跟不上）時新的資料直接丟棄並回報筆數，讓設備端決定是否重送，
+    記憶體用量因此有上限。每個 worker 一個，寫入時使用無序 insert_many。
+    """
+
+    def __init__(
+        self,
+        flush_size: int = SHOT_FLUSH_SIZE,
+        flush_interval: float = SHOT_FLUSH_INTERVAL_MS / 1000,
+        max_size: int = SHOT_BUFFER_MAX,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._collection: Optional[AsyncIOMotorCollection] = None
+        self._buffer: list[dict] = []
+        self._received: list[float] = []
+        self._wake = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self.accepted = 0
+        self.written = 0
+        self.dropped_overflow = 0
+        self.dropped_write = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def add(self, collection: AsyncIOMotorCollection, shots: list[dict]) -> int:
+        """放入緩衝，回傳因緩衝已滿而丟棄的筆數"""
+        self._collection = collection
+        accepted = shots[: max(self.max_size - len(self._buffer), 0)]
+        dropped = len(shots) - len(accepted)
+        self.dropped_overflow += dropped
+        self.accepted += len(accepted)
+        self._buffer.extend(accepted)
+        self._received.extend([time.monotonic()] * len(accepted))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+        if len(self._buffer) >= self.flush_size:
+            self._wake.set()
+        return dropped
+
+    async def flush(self):
+        while self._buffer and self._collection is not None:
+            shots = self._buffer[: self.flush_size]
+            received = self._received[: self.flush_size]
+            del self._buffer[: self.flush_size]
+            del self._received[: self.flush_size]
+            start = time.monotonic()
+            try:
+                errors = await shot_crud.create_shots(self._collection, shots)
+            except PyMongoError as e:
+                # 連線錯誤時放回緩衝前端，下次再試；超過容量的部分丟棄
+                self.flush_failures += 1
+                create_log(f"Shot flush failed: {e}")
+                keep = max(self.max_size - len(self._buffer), 0)
+                self.dropped_write += max(len(shots) - keep, 0)
+                self._buffer[:0] = shots[:keep]
+                self._received[:0] = received[:keep]
+                return
+            now = time.monotonic()
+            self.flushes += 1
+            self.written += len(shots) - len(errors)
+            self.dropped_write += len(errors)
+            self.last_flush_ms = (now - start) * 1000
+            # 從收到資料到寫入完成的最長等待時間
+            self.last_lag_ms = (now - received[0]) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+    async def close(self):
+        # 不直接 cancel，避免寫到一半的資料遺失
+        self._closing = True
+        self._wake.set()
+        if self._flusher is not None:
+            await self._flusher
+        await self.flush()
+
+    def stats(self) -> dict:
+        oldest = self._received[0] if self._received else None
+        return {
+            "buffered": len(self._buffer),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "written": self.written,
+            "dropped_overflow": self.dropped_overflow,
+            "dropped_write": self.dropped_write,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "buffer_age_ms": (
+                round((time.monotonic() - oldest) * 1000, 3) if oldest else 0.0
+            ),
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+        }
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                create_log(f"Shot flush error: {e}")
+
+
+shot_buffer = ShotBuffer()
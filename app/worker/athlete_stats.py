@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.config import (
+    ATHLETE_STATS_COLLECTION,
+    CONTEST_COLLECTION,
+    MONGO_DB,
+    STREAM_STATE_COLLECTION,
+)
+from app.sql.crud import athlete_stats_crud
+from app.sql.crud.athlete_stats import STATS_FIELDS
+from app.sql.db import create_mongo_client
+from app.utils import create_log
+
+STREAM_NAME = "athlete_stats"
+
+# 不是 replica set / sharded cluster 時無法使用 change stream
+_NOT_SUPPORTED = {40573}
+# resume token 已不在 oplog 內，只能重建後從現在開始
+_HISTORY_LOST = {260, 280, 286}
+
+_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}
+]
+
+
+def _touches_stats(change: dict) -> bool:
+    if change["operationType"] != "update":
+        return True
+    description = change.get("updateDescription", {})
+    fields = list(description.get("updatedFields", {})) + list(
+        description.get("removedFields", [])
+    )
+    return any(field.split(".")[0] in STATS_FIELDS for field in fields)
+
+
+async def _rebuild(client: AsyncIOMotorClient, db: AsyncIOMotorDatabase):
+    """沒有 resume token 時全部重算，並從重算開始前的時間點接續 change stream"""
+    async with await client.start_session() as session:
+        await db.command("ping", session=session)
+        start_at = session.operation_time
+        rebuilt = await athlete_stats_crud.rebuild_all(
+            db[ATHLETE_STATS_COLLECTION], db[CONTEST_COLLECTION], session
+        )
+    create_log(f"Rebuilt athlete stats for {rebuilt} athletes")
+    return start_at
+
+
+async def _apply(client: AsyncIOMotorClient, db: AsyncIOMotorDatabase, change: dict):
+    stats_collection = db[ATHLETE_STATS_COLLECTION]
+    contest_collection = db[CONTEST_COLLECTION]
+    operation = change["operationType"]
+    if operation == "insert":
+        await athlete_stats_crud.apply_insert(
+            stats_collection, change["fullDocument"], change["clusterTime"]
+        )
+        return
+    if operation == "delete":
+        # API 不會刪除比賽；手動刪除後請執行 python -m app.worker.athlete_stats --rebuild
+        create_log(f"Contest {change['documentKey']['_id']} deleted, stats not updated")
+        return
+    # 只重算更新後的選手；若比賽改掛到其他選手，舊選手要等下次 --rebuild 才會修正
+    contest = change.get("fullDocument")
+    if not contest or not _touches_stats(change):
+        return
+    async with await client.start_session() as session:
+        await athlete_stats_crud.rebuild_athlete(
+            stats_collection,
+            contest_collection,
+            contest["athlete"]["id"],
+            session,
+            change["clusterTime"],
+        )
+
+
+async def _consume(client: AsyncIOMotorClient, db: AsyncIOMotorDatabase):
+    state_collection = db[STREAM_STATE_COLLECTION]
+    token = await athlete_stats_crud.load_resume_token(state_collection, STREAM_NAME)
+    options = {"resume_after": token} if token else {}
+    if not token:
+        options["start_at_operation_time"] = await _rebuild(client, db)
+    async with db[CONTEST_COLLECTION].watch(
+        _PIPELINE, full_document="updateLookup", **options
+    ) as stream:
+        async for change in stream:
+            await _apply(client, db, change)
+            # 更新是冪等的，先套用再記錄 token，重啟時最多重播一個事件
+            await athlete_stats_crud.save_resume_token(
+                state_collection, STREAM_NAME, stream.resume_token
+            )
+
+
+async def run_athlete_stats(client: AsyncIOMotorClient, db: AsyncIOMotorDatabase):
+    """追蹤 contest 的 change stream，增量維護 athlete_stats"""
+    while True:
+        try:
+            await _consume(client, db)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in _NOT_SUPPORTED:
+                create_log(f"Athlete stats worker disabled: {e}")
+                return
+            if e.code in _HISTORY_LOST:
+                create_log(f"Athlete stats resume token lost, rebuilding: {e}")
+                await athlete_stats_crud.save_resume_token(
+                    db[STREAM_STATE_COLLECTION], STREAM_NAME, None
+                )
+                continue
+            create_log(f"Athlete stats worker error: {e}")
+            await asyncio.sleep(1)
+        except PyMongoError as e:
+            create_log(f"Athlete stats worker error: {e}")
+            await asyncio.sleep(1)
+
+
+async def _main(args: argparse.Namespace):
+    client = create_mongo_client()
+    db = client[MONGO_DB]
+    try:
+        if args.rebuild:
+            await athlete_stats_crud.save_resume_token(
+                db[STREAM_STATE_COLLECTION], STREAM_NAME, None
+            )
+        await run_athlete_stats(client, db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the athlete_stats view")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="recompute every athlete before tailing the change stream",
+    )
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bson.objectid import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from app.config import (
+    CONTEST_VIDEO_COLLECTION,
+    MEDIA_JOB_VISIBILITY_TIMEOUT_MS,
+    MEDIA_RENDITIONS,
+    MEDIA_THUMBNAIL_WIDTH,
+    MEDIA_WORKER_PROCESSES,
+    MONGO_DB,
+    VIDEO_BUCKET,
+    VIDEO_CHUNK_SIZE,
+)
+from app.model import contest_model
+from app.sql.crud import contest_child_crud, video_crud
+from app.sql.db import create_mongo_client, create_redis_pool
+from app.utils import create_log
+from app.utils.job_queue import VIDEO_PROCESS_JOB, Job, media_queue
+from app.utils.media import (
+    MediaProcessingError,
+    parse_renditions,
+    rendition_command,
+    run_ffmpeg,
+    thumbnail_command,
+)
+from app.utils.response_cache import CONTEST_NAMESPACE, response_cache
+
+RENDITIONS = parse_renditions(MEDIA_RENDITIONS)
+
+# 必須小於 REDIS_SOCKET_TIMEOUT，否則阻塞讀取會被當成連線逾時
+READ_BLOCK_MS = 2000
+
+
+async def _run_commands(pool: ProcessPoolExecutor, commands: list[list[str]]):
+    loop = asyncio.get_running_loop()
+    # 全部等到結束再拋出錯誤，避免暫存目錄在其他 ffmpeg 還在寫入時被刪除
+    results = await asyncio.gather(
+        *(loop.run_in_executor(pool, run_ffmpeg, command) for command in commands),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def process_video(
+    db: AsyncIOMotorDatabase, redis: Redis, pool: ProcessPoolExecutor, job: Job
+):
+    """產生縮圖與低碼率版本，上傳到 GridFS 後寫回比賽的影片資料"""
+    contest_id, video_id = job.payload["contest_id"], job.payload["video_id"]
+    source_id = ObjectId(video_id)
+    bucket = AsyncIOMotorGridFSBucket(db, bucket_name=VIDEO_BUCKET)
+    files_collection = db[video_crud.FILES_COLLECTION]
+    metadata = {"contest_id": contest_id, "source_id": source_id}
+
+    with tempfile.TemporaryDirectory(prefix="media-") as workdir:
+        source = os.path.join(workdir, "source")
+        try:
+            await video_crud.download_file(bucket, source_id, source)
+        except NoFile:
+            create_log(f"Video {video_id} no longer exists, skipping")
+            return
+        # 上一次嘗試失敗時可能已上傳部分輸出
+        await video_crud.delete_derived(bucket, files_collection, source_id)
+
+        thumbnail = os.path.join(workdir, "thumbnail.jpg")
+        outputs = [os.path.join(workdir, f"{spec.height}p.mp4") for spec in RENDITIONS]
+        await _run_commands(
+            pool,
+            [thumbnail_command(source, thumbnail, MEDIA_THUMBNAIL_WIDTH)]
+            + [
+                rendition_command(source, output, spec)
+                for spec, output in zip(RENDITIONS, outputs)
+            ],
+        )
+
+        thumbnail_id, _ = await video_crud.upload_file(
+            bucket,
+            f"{video_id}-thumbnail.jpg",
+            thumbnail,
+            {**metadata, "content_type": "image/jpeg", "kind": "thumbnail"},
+            VIDEO_CHUNK_SIZE,
+        )
+        renditions = []
+        for spec, output in zip(RENDITIONS, outputs):
+            file_id, length = await video_crud.upload_file(
+                bucket,
+                f"{video_id}-{spec.height}p.mp4",
+                output,
+                {**metadata, "content_type": "video/mp4", "kind": "rendition"},
+                VIDEO_CHUNK_SIZE,
+            )
+            renditions.append(
+                contest_model.Rendition(
+                    id=str(file_id),
+                    url=f"/contests/{contest_id}/videos/{file_id}",
+                    height=spec.height,
+                    bitrate=spec.bitrate,
+                    length=length,
+                ).model_dump()
+            )
+
+    updated = await contest_child_crud.set_video_media(
+        db[CONTEST_VIDEO_COLLECTION],
+        source_id,
+        f"/contests/{contest_id}/videos/{thumbnail_id}",
+        renditions,
+    )
+    if not updated:
+        # 處理期間比賽或影片已被移除
+        await video_crud.delete_derived(bucket, files_collection, source_id)
+        return
+    await response_cache.invalidate(redis, CONTEST_NAMESPACE)
+
+
+HANDLERS = {VIDEO_PROCESS_JOB: process_video}
+
+
+async def _heartbeat(redis: Redis, consumer: str, job: Job):
+    while True:
+        await asyncio.sleep(MEDIA_JOB_VISIBILITY_TIMEOUT_MS / 3000)
+        try:
+            await media_queue.heartbeat(redis, consumer, job)
+        except RedisError as e:
+            create_log(f"Media job {job.id} heartbeat failed: {e}")
+
+
+async def _run_job(
+    db: AsyncIOMotorDatabase,
+    redis: Redis,
+    pool: ProcessPoolExecutor,
+    consumer: str,
+    job: Job,
+):
+    started = time.time()
+    heartbeat = asyncio.create_task(_heartbeat(redis, consumer, job))
+    try:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            raise MediaProcessingError(f"Unknown job kind {job.kind}")
+        await handler(db, redis, pool, job)
+    except asyncio.CancelledError:
+        # worker 關閉時工作留在 pending list，由其他 worker 接手
+        raise
+    except Exception as e:
+        dead = await media_queue.fail(redis, job, f"{type(e).__name__}: {e}", started)
+        action = "moved to dead-letter" if dead else "will retry"
+        create_log(f"Media job {job.id} ({job.kind}) failed, {action}: {e}")
+    else:
+        await media_queue.ack(redis, job, started)
+        create_log(
+            f"Media job {job.id} ({job.kind}) done in {time.time() - started:.1f}s"
+        )
+    finally:
+        heartbeat.cancel()
+
+
+async def run_media_worker(
+    db: AsyncIOMotorDatabase, redis: Redis, processes: int, consumer: str
+):
+    """從佇列取出工作，同時執行的工作數量等於 process pool 大小"""
+    await media_queue.ensure_group(redis)
+    running: set[asyncio.Task] = set()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        try:
+            while True:
+                free = processes - len(running)
+                if free <= 0:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    # 先接手其他 worker 留下的工作，再讀新的
+                    jobs = await media_queue.claim_stale(redis, consumer, free)
+                    if not jobs:
+                        jobs = await media_queue.read(
+                            redis, consumer, free, READ_BLOCK_MS
+                        )
+                except RedisError as e:
+                    create_log(f"Media worker error: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for job in jobs:
+                    task = asyncio.create_task(_run_job(db, redis, pool, consumer, job))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+        finally:
+            for task in running:
+                task.cancel()
+
+
+async def _main(args: argparse.Namespace):
+    client = create_mongo_client()
+    redis_pool = create_redis_pool()
+    redis = Redis(connection_pool=redis_pool)
+    create_log(f"Media worker {args.consumer} started with {args.processes} processes")
+    try:
+        await run_media_worker(client[MONGO_DB], redis, args.processes, args.consumer)
+    finally:
+        await redis.aclose()
+        await redis_pool.disconnect()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process uploaded contest videos")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=MEDIA_WORKER_PROCESSES,
+        help="size of the ffmpeg process pool and number of concurrent jobs",
+    )
+    parser.add_argument(
+        "--consumer",
+        default=f"media-{socket.gethostname()}-{os.getpid()}",
+        help="consumer name in the Redis Streams group",
+    )
+    asyncio.run(_main(parser.parse_args()))
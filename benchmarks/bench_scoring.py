@@ -0,0 +1,89 @@
+"""比較 NumPy 向量化的成績分析與逐筆 Python 迴圈的耗時
+
+執行: python -m benchmarks.bench_scoring
+不需要 MongoDB，以亂數產生 10^6 發（每場 4 回合、每回合 25 發）的選手歷史。
+"""
+
+import time
+
+import numpy as np
+
+from app.utils.enums import TrainType
+from app.utils.scoring import analyze_history, score_contest, series_from_columns
+
+SHOTS = 1_000_000
+TARGETS_PER_ROUND = 25
+ROUNDS_PER_CONTEST = 4
+REPEAT = 5
+
+
+def make_columns(shots: int) -> tuple[list, list, list, list]:
+    rng = np.random.default_rng(0)
+    index = np.arange(shots)
+    rounds = index // TARGETS_PER_ROUND
+    contest_ids = [f"c{i}" for i in rounds // ROUNDS_PER_CONTEST]
+    round_numbers = (rounds % ROUNDS_PER_CONTEST + 1).tolist()
+    stations = (index % TARGETS_PER_ROUND // 5 + 1).tolist()
+    hits = (rng.random(shots) < 0.8).tolist()
+    return contest_ids, round_numbers, stations, hits
+
+
+def python_history(contest_ids, rounds, stations, hits, window: int) -> dict:
+    """逐筆迴圈的參考實作，用來比較與驗證結果"""
+    scores, station_shots, station_hits = [], {}, {}
+    longest = current = 0
+    previous = None
+    for contest_id, round_number, station, hit in zip(
+        contest_ids, rounds, stations, hits
+    ):
+        if (contest_id, round_number) != previous:
+            scores.append(0)
+            previous = (contest_id, round_number)
+        scores[-1] += hit
+        station_shots[station] = station_shots.get(station, 0) + 1
+        station_hits[station] = station_hits.get(station, 0) + hit
+        current = current + 1 if hit else 0
+        longest = max(longest, current)
+    average = [
+        sum(scores[i - window + 1 : i + 1]) / window
+        for i in range(window - 1, len(scores))
+    ]
+    return {
+        "scores": scores,
+        "rates": {s: station_hits[s] / station_shots[s] for s in station_shots},
+        "longest": longest,
+        "moving_average": average,
+    }
+
+
+def measure(func, *args) -> tuple[float, object]:
+    result = func(*args)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(*args)
+    return (time.perf_counter() - start) / REPEAT * 1000, result
+
+
+def main():
+    columns = make_columns(SHOTS)
+    build_ms, series = measure(series_from_columns, *columns)
+    python_ms, expected = measure(python_history, *columns, 5)
+    contest_ms, scores = measure(score_contest, series, TrainType.TRAP_SHOOT)
+    history_ms, history = measure(
+        analyze_history, series, TrainType.TRAP_SHOOT, 5, 1_000_000
+    )
+
+    assert scores["round_scores"] == expected["scores"]
+    assert scores["longest_streak"] == expected["longest"]
+    assert len(history["moving_average"]) == len(expected["moving_average"])
+
+    print(f"shots: {SHOTS:,}")
+    print(f"{'step':<28}{'ms':>10}")
+    print(f"{'build arrays from columns':<28}{build_ms:>10.1f}")
+    print(f"{'python loop (reference)':<28}{python_ms:>10.1f}")
+    print(f"{'score_contest':<28}{contest_ms:>10.1f}")
+    print(f"{'analyze_history':<28}{history_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
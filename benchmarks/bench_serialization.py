@@ -0,0 +1,115 @@
+"""比較 FastAPI 預設序列化流程與 FAST_SERIALIZATION 快速路徑的每個請求 CPU 時間
+
+執行: python -m benchmarks.bench_serialization
+不需要 MongoDB，直接用假資料建立兩組相同的路由互相比較。
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.model import contest_model
+from app.utils import serializer
+from app.utils.serializer import contest_serializer
+
+REQUESTS = 500
+
+
+def make_contest(i: int) -> dict:
+    return {
+        "id": str(ObjectId()),
+        "name": f"全國飛靶錦標賽 第{i}場",
+        "description": "決賽",
+        "athlete": {
+            "id": str(ObjectId()),
+            "username": f"athlete{i}",
+            "name": "王小明",
+            "permission": "athlete",
+            "created_time": datetime(2024, 8, 8),
+        },
+        "status": "running",
+        "train_type": "trap_shoot",
+        "metrics": {
+            f"m{j}": {"name": f"m{j}", "description": "hits", "unit": "shot"}
+            for j in range(5)
+        },
+        "videos": [
+            {
+                "name": f"v{j}",
+                "description": "round",
+                "url": f"https://example.com/{j}.mp4",
+                "thumbnail": f"https://example.com/{j}.jpg",
+                "created_time": datetime(2024, 8, 8),
+            }
+            for j in range(5)
+        ],
+        "created_time": datetime(2024, 8, 8),
+    }
+
+
+CONTESTS = [make_contest(i) for i in range(100)]
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default/list")
+    async def default_list() -> list[contest_model.ContestResponseModel]:
+        return CONTESTS
+
+    @app.get("/default/detail", response_model=contest_model.ContestResponseModel)
+    async def default_detail():
+        return CONTESTS[0]
+
+    @app.get("/default/raw")
+    async def default_raw():
+        return CONTESTS
+
+    @app.get("/fast/list", response_class=ORJSONResponse)
+    async def fast_list():
+        return serializer.respond(CONTESTS, contest_serializer)
+
+    @app.get("/fast/detail", response_class=ORJSONResponse)
+    async def fast_detail():
+        return serializer.respond(CONTESTS[0], contest_serializer)
+
+    @app.get("/fast/raw", response_class=ORJSONResponse)
+    async def fast_raw():
+        return serializer.respond(CONTESTS)
+
+    return app
+
+
+async def measure(client: AsyncClient, path: str) -> float:
+    for _ in range(20):
+        await client.get(path)
+    start = time.process_time()
+    for _ in range(REQUESTS):
+        response = await client.get(path)
+        assert response.status_code == 200
+    return (time.process_time() - start) / REQUESTS * 1000
+
+
+async def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    serializer.FAST_SERIALIZATION = True
+    app = build_app()
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        print(f"{'endpoint':<10}{'default ms':>12}{'fast ms':>12}{'saved':>10}")
+        for name in ("list", "detail", "raw"):
+            default = await measure(client, f"/default/{name}")
+            fast = await measure(client, f"/fast/{name}")
+            saved = (1 - fast / default) * 100
+            print(f"{name:<10}{default:>12.3f}{fast:>12.3f}{saved:>9.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
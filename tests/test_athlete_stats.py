@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from bson.timestamp import Timestamp
+
+from app.sql.crud.athlete_stats import insert_update
+from app.worker.athlete_stats import _touches_stats
+
+
+def test_insert_update_is_guarded_by_cluster_time():
+    contest = {
+        "_id": ObjectId(),
+        "name": "morning",
+        "athlete": {"id": "athlete-1"},
+        "status": "init",
+        "train_type": "trap_shoot",
+        "created_time": datetime(2024, 1, 1),
+    }
+    cluster_time = Timestamp(1700000000, 3)
+
+    query, update = insert_update(contest, cluster_time)
+
+    assert query == {
+        "_id": "athlete-1",
+        "seen_until": {"$not": {"$gte": cluster_time}},
+    }
+    fields = update[0]["$set"]
+    assert {"total", "by_status.init", "by_train_type.trap_shoot"} <= set(fields)
+    assert fields["seen_until"] == cluster_time
+    assert fields["latest"]["$cond"][1]["$literal"]["id"] == str(contest["_id"])
+
+
+def test_only_stat_fields_trigger_recompute():
+    def update(*fields):
+        return {
+            "operationType": "update",
+            "updateDescription": {"updatedFields": dict.fromkeys(fields, 1)},
+        }
+
+    assert _touches_stats(update("status"))
+    assert _touches_stats(update("athlete.name"))
+    assert not _touches_stats(update("videos", "description"))
+    assert _touches_stats({"operationType": "replace"})
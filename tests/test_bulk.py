@@ -0,0 +1,158 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.config import CONTEST_COLLECTION, USER_COLLECTION
+from app.schema import contest_schema, user_schema
+from app.service import user as user_service
+from app.service.contest import ContestService
+from app.service.user import UserService
+from app.sql.bulk import DUPLICATE_KEY
+from app.utils.exception import (
+    ContestNotFoundException,
+    IdNotValidException,
+    UserAlreadyExistsException,
+    UserNotFoundException,
+)
+
+
+class FakeCursor:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+
+class FakeCollection:
+    def __init__(self, documents: list[dict] = (), unique: str = None):
+        self.documents = [dict(document) for document in documents]
+        self.unique = unique
+        self.bulk_requests = []
+
+    def find(self, query: dict, projection: dict = None):
+        ids = query["_id"]["$in"]
+        return FakeCursor([doc for doc in self.documents if doc["_id"] in ids])
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        errors = []
+        for index, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            if self.unique and any(
+                doc[self.unique] == document[self.unique] for doc in self.documents
+            ):
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": "dup"})
+                continue
+            self.documents.append(dict(document))
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": 0})
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        self.bulk_requests.extend(requests)
+        return type("Result", (), {"matched_count": len(requests)})()
+
+
+class FakeDatabase:
+    def __init__(self, **collections: FakeCollection):
+        self.collections = collections
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self.collections[name]
+
+
+class FakeRedis:
+    async def incr(self, key: str):
+        return 1
+
+
+@pytest.mark.asyncio
+async def test_create_contests_reports_each_item():
+    athlete = {
+        "_id": ObjectId(),
+        "username": "athlete",
+        "name": "Athlete",
+        "permission": "athlete",
+        "created_time": datetime(2024, 1, 1),
+    }
+    contests = FakeCollection()
+    db = FakeDatabase(
+        **{CONTEST_COLLECTION: contests, USER_COLLECTION: FakeCollection([athlete])}
+    )
+    items = [
+        contest_schema.CreateContest(
+            name="ok", athlete_id=str(athlete["_id"]), train_type="trap_shoot"
+        ),
+        contest_schema.CreateContest(
+            name="bad id", athlete_id="not-an-id", train_type="trap_shoot"
+        ),
+        contest_schema.CreateContest(
+            name="missing", athlete_id=str(ObjectId()), train_type="skeet_shoot"
+        ),
+    ]
+
+    res = await ContestService.create_contests(db, FakeRedis(), items, {})
+
+    assert (res.succeeded, res.failed) == (1, 2)
+    ok, bad_id, missing = res.results
+    assert ok.ok and ok.id == str(contests.documents[0]["_id"])
+    assert bad_id.error == IdNotValidException().detail
+    assert missing.error == UserNotFoundException().detail
+    assert [result.index for result in res.results] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_update_contests_reports_each_item():
+    existing = ObjectId()
+    contests = FakeCollection([{"_id": existing}])
+    db = FakeDatabase(**{CONTEST_COLLECTION: contests})
+    items = [
+        contest_schema.UpdateContest(id=str(existing), status="finished"),
+        contest_schema.UpdateContest(id="not-an-id", status="finished"),
+        contest_schema.UpdateContest(id=str(ObjectId()), description="gone"),
+        contest_schema.UpdateContest(id=str(existing), status=None),
+        contest_schema.UpdateContest(id=str(existing)),
+    ]
+
+    res = await ContestService.update_contests(db, FakeRedis(), items)
+
+    assert (res.succeeded, res.failed) == (1, 4)
+    ok, bad_id, missing, null_status, empty = res.results
+    assert ok.ok and ok.id == str(existing)
+    assert bad_id.error == IdNotValidException().detail
+    assert missing.error == ContestNotFoundException().detail
+    assert null_status.error == "Status cannot be null"
+    assert empty.error == "Nothing to update"
+    # 只有合法的那筆送進 bulk_write，狀態不會被寫成 null
+    (request,) = contests.bulk_requests
+    assert request._doc == {"$set": {"status": "finished"}}
+
+
+@pytest.mark.asyncio
+async def test_create_users_reports_duplicate_username(monkeypatch):
+    async def hash_passwords(passwords):
+        return [f"hashed-{password}" for password in passwords]
+
+    monkeypatch.setattr(user_service, "hash_passwords", hash_passwords)
+    users = FakeCollection([{"_id": ObjectId(), "username": "taken"}], "username")
+    db = FakeDatabase(**{USER_COLLECTION: users})
+    items = [
+        user_schema.CreateUser(
+            username=username, password="pw", name=username, permission="athlete"
+        )
+        for username in ("new", "taken", "other")
+    ]
+
+    res = await UserService.create_users(db, FakeRedis(), items)
+
+    assert (res.succeeded, res.failed) == (2, 1)
+    new, taken, other = res.results
+    assert new.ok and other.ok
+    assert taken.error == UserAlreadyExistsException().detail
+    assert users.documents[1]["password"] == "hashed-pw"
+    assert new.id == str(users.documents[1]["_id"])
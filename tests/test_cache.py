@@ -0,0 +1,70 @@
+import time
+
+from app.utils.auth_cache import PrincipalCache
+from app.utils.cache import TTLCache
+from app.utils.revocation import RevocationMirror
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_principal_cache_invalidate_user():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    exp = time.time() + 60
+    cache.set("token1", {"username": "testuser"}, exp, cache.generation)
+    cache.set("token2", {"username": "testuser"}, exp, cache.generation)
+    cache.set("token3", {"username": "other"}, exp, cache.generation)
+
+    cache.invalidate_user("testuser")
+
+    assert cache.get("token1") is None
+    assert cache.get("token2") is None
+    assert cache.get("token3") == {"username": "other"}
+
+
+def test_principal_cache_skips_expired_token():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.set("token", {"username": "testuser"}, time.time() - 1, cache.generation)
+
+    assert cache.get("token") is None
+
+
+def test_principal_cache_skips_result_loaded_across_invalidation():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    # 驗證途中收到登出通知，這時快取裡還沒有這個 token
+    cache.invalidate_token("token")
+    cache.set("token", {"username": "testuser"}, time.time() + 60, generation)
+
+    assert cache.get("token") is None
+
+
+def test_revocation_mirror_expires_on_token_exp():
+    mirror = RevocationMirror()
+    mirror.add("revoked", time.time() + 60)
+    mirror.add("expired", time.time() - 1)
+
+    assert mirror.is_revoked("revoked")
+    assert not mirror.is_revoked("expired")
+    assert not mirror.is_revoked("unknown")
+    assert not mirror.synced
@@ -0,0 +1,36 @@
+from bson.objectid import ObjectId
+
+from app.config import CONTEST_METRIC_COLLECTION, CONTEST_VIDEO_COLLECTION
+from app.sql.crud.contest_child import split_contest
+
+
+def test_split_contest_upserts_each_embedded_item():
+    contest_id = ObjectId()
+    video_id = ObjectId()
+    contest = {
+        "_id": contest_id,
+        "videos": [
+            {"id": str(video_id), "name": "round 1", "url": "/a"},
+            {"name": "legacy", "url": "/b"},
+        ],
+        "metrics": {"speed": {"name": "speed", "description": "", "unit": "m/s"}},
+    }
+
+    requests = split_contest(contest)
+
+    videos = [op._filter for op in requests[CONTEST_VIDEO_COLLECTION]]
+    # 有 GridFS id 的影片沿用 id，沒有 id 的以原本位置當作鍵
+    assert videos == [
+        {"_id": video_id},
+        {"contest_id": str(contest_id), "legacy_index": 1},
+    ]
+    inserted = requests[CONTEST_VIDEO_COLLECTION][0]._doc["$setOnInsert"]
+    assert inserted == {"name": "round 1", "url": "/a", "contest_id": str(contest_id)}
+
+    (metric,) = requests[CONTEST_METRIC_COLLECTION]
+    assert metric._filter == {"contest_id": str(contest_id), "key": "speed"}
+    assert metric._upsert is True
+
+
+def test_split_contest_skips_empty_fields():
+    assert split_contest({"_id": ObjectId(), "videos": None, "metrics": {}}) == {}
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from app.sql.crud import contest_crud
+from app.utils.contest_feed import ContestFeed, Subscriber
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+        self.disconnected = asyncio.Event()
+
+    async def send_text(self, message: str):
+        self.sent.append(json.loads(message))
+
+    async def close(self, code: int):
+        self.closed = code
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "websocket.disconnect"}
+
+
+ATHLETE = {
+    "id": "u1",
+    "username": "athlete",
+    "name": "Athlete",
+    "permission": "athlete",
+    "created_time": datetime(2024, 1, 1),
+}
+
+
+def _contest(status: str, **fields) -> dict:
+    return {
+        "id": "c1",
+        "name": "final",
+        "athlete": ATHLETE,
+        "status": status,
+        "train_type": "trap_shoot",
+        "created_time": datetime(2024, 1, 1),
+        **fields,
+    }
+
+
+@pytest.mark.asyncio
+async def test_subscriber_keeps_only_latest_message():
+    subscriber = Subscriber()
+    subscriber.offer("a")
+    subscriber.offer("b")
+    subscriber.offer("c")
+
+    assert await subscriber.next() == "c"
+    assert subscriber.coalesced == 2
+
+
+@pytest.mark.asyncio
+async def test_feed_sends_snapshot_then_updates():
+    feed = ContestFeed(send_timeout=1)
+    websocket = FakeWebSocket()
+
+    serving = asyncio.create_task(feed.serve(websocket, "c1", _contest("init")))
+    await asyncio.sleep(0.01)
+    feed.publish("c1", _contest("running"))
+    feed.publish("other", _contest("stopped"))
+    await asyncio.sleep(0.01)
+    websocket.disconnected.set()
+    await serving
+
+    assert [message["status"] for message in websocket.sent] == ["init", "running"]
+    assert feed.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_closes_when_token_is_no_longer_valid():
+    feed = ContestFeed(send_timeout=1, auth_interval=0.01)
+    websocket = FakeWebSocket()
+    checks = []
+
+    async def authorize():
+        checks.append(True)
+        # 第二次檢查時 token 已被登出
+        return len(checks) < 2
+
+    await asyncio.wait_for(
+        feed.serve(websocket, "c1", _contest("init"), authorize), timeout=1
+    )
+
+    assert websocket.closed == 1008
+    assert len(checks) == 2
+    assert feed.stats()["auth_disconnects"] == 1
+    assert feed.stats()["subscribers"] == 0
+
+
+class SlowCollection:
+    """find（loader 使用）會卡住並回傳呼叫當下的文件；find_one 直接回傳目前的文件"""
+
+    full_name = "_test.contest"
+
+    def __init__(self, document: dict):
+        self.document = document
+        self.release = asyncio.Event()
+
+    def find(self, query, projection=None):
+        snapshot = dict(self.document)
+
+        async def _cursor():
+            await self.release.wait()
+            yield snapshot
+
+        return _cursor()
+
+    async def find_one(self, query, projection=None):
+        return dict(self.document)
+
+
+@pytest.mark.asyncio
+async def test_refresh_does_not_join_a_read_started_before_the_write():
+    contest_id = ObjectId()
+    document = _contest("init", _id=contest_id)
+    del document["id"]
+    collection = SlowCollection(document)
+    feed = ContestFeed(send_timeout=1)
+    subscriber = feed.subscribe(str(contest_id))
+
+    # 一般請求的讀取還在進行中
+    pending = asyncio.create_task(
+        contest_crud.load_contest_by_id(collection, contest_id)
+    )
+    await asyncio.sleep(0.01)
+    collection.document["status"] = "running"
+    feed._notify(collection, str(contest_id))
+
+    message = await asyncio.wait_for(subscriber.next(), timeout=1)
+    assert json.loads(message)["status"] == "running"
+
+    collection.release.set()
+    assert (await pending)["status"] == "init"
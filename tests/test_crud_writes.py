@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import USER_COLLECTION
+from app.schema import user_schema
+from app.service import user as user_service
+from app.service.user import UserService
+from app.sql.crud import contest_crud, user_crud
+from app.utils.exception import UserAlreadyExistsException, UserNotFoundException
+
+
+class FakeCollection:
+    """只記錄呼叫，任何重新讀取都會失敗"""
+
+    def __init__(self, documents: list[dict] = (), duplicate: bool = False):
+        self.documents = {document["_id"]: dict(document) for document in documents}
+        self.duplicate = duplicate
+        self.calls = []
+
+    async def insert_one(self, document: dict):
+        self.calls.append("insert_one")
+        if self.duplicate:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        document["_id"] = ObjectId()
+        self.documents[document["_id"]] = dict(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def find_one_and_update(
+        self, query: dict, update: dict, projection=None, return_document=None
+    ):
+        self.calls.append(("find_one_and_update", return_document))
+        document = self.documents.get(query["_id"])
+        if document is None:
+            return None
+        document.update(update["$set"])
+        return dict(document)
+
+    async def update_one(self, query: dict, update: dict):
+        self.calls.append("update_one")
+        self.documents[query["_id"]].update(update["$set"])
+
+    async def find_one(self, *args, **kwargs):
+        raise AssertionError("write paths must not read the document back")
+
+
+@pytest.mark.asyncio
+async def test_create_user_builds_response_from_inserted_document():
+    collection = FakeCollection()
+    user = await user_crud.create_user(
+        collection, {"username": "a", "password": "hashed"}
+    )
+    (inserted,) = collection.documents
+    assert user == {"username": "a", "password": "hashed", "id": str(inserted)}
+    assert collection.calls == ["insert_one"]
+
+
+@pytest.mark.asyncio
+async def test_create_contest_hides_search_fields_without_reread():
+    collection = FakeCollection()
+    contest = await contest_crud.create_contest(
+        collection, {"name": "Morning", "athlete": {"name": "Ann"}}
+    )
+    (inserted,) = collection.documents
+    assert contest["id"] == str(inserted)
+    assert "search_grams" in collection.documents[inserted]
+    assert "search_grams" not in contest and "_id" not in contest
+    assert collection.calls == ["insert_one"]
+
+
+@pytest.mark.asyncio
+async def test_update_user_returns_document_after_update():
+    id = ObjectId()
+    collection = FakeCollection([{"_id": id, "username": "a", "is_use_otp": True}])
+    user = await user_crud.update_user(collection, id, {"is_use_otp": False})
+    assert user == {"id": str(id), "username": "a", "is_use_otp": False}
+    assert collection.calls == [("find_one_and_update", ReturnDocument.AFTER)]
+
+    assert await user_crud.update_user(collection, ObjectId(), {"name": "b"}) is None
+
+
+@pytest.mark.asyncio
+async def test_update_contest_rebuilds_search_fields_only_on_rename():
+    id = ObjectId()
+    collection = FakeCollection([{"_id": id, "name": "old", "status": "init"}])
+    contest = await contest_crud.update_contest(collection, id, {"status": "running"})
+    assert contest["status"] == "running" and contest["id"] == str(id)
+    assert collection.calls == [("find_one_and_update", ReturnDocument.AFTER)]
+
+    collection.calls.clear()
+    await contest_crud.update_contest(collection, id, {"name": "new"})
+    assert collection.calls[-1] == "update_one"
+    assert "search_grams" in collection.documents[id]
+
+    assert await contest_crud.update_contest(collection, ObjectId(), {}) is None
+
+
+class FakeDatabase:
+    def __init__(self, collection: FakeCollection):
+        self.collection = collection
+
+    def get_collection(self, name: str) -> FakeCollection:
+        assert name == USER_COLLECTION
+        return self.collection
+
+
+class FakeRedis:
+    async def incr(self, key: str):
+        return 1
+
+    async def delete(self, *keys: str):
+        return len(keys)
+
+
+@pytest.fixture
+def cheap_hash(monkeypatch):
+    async def hash_password(password: str) -> str:
+        return f"hashed-{password}"
+
+    monkeypatch.setattr(user_service, "hash_password", hash_password)
+
+
+@pytest.mark.asyncio
+async def test_create_user_maps_duplicate_key_error(cheap_hash):
+    db = FakeDatabase(FakeCollection(duplicate=True))
+    user = user_schema.CreateUser(
+        username="taken", password="pw", name="Taken", permission="athlete"
+    )
+    with pytest.raises(UserAlreadyExistsException):
+        await UserService.create_user(db, FakeRedis(), user)
+
+
+@pytest.mark.asyncio
+async def test_reset_password_reports_user_deleted_before_update(
+    cheap_hash, monkeypatch
+):
+    id = ObjectId()
+
+    async def get_user_by_id(collection, user_id):
+        # 查詢時還在，更新時已被刪除
+        return {"id": str(user_id), "username": "gone"}
+
+    monkeypatch.setattr(user_crud, "get_user_by_id", get_user_by_id)
+    with pytest.raises(UserNotFoundException):
+        await UserService.reset_password(
+            FakeDatabase(FakeCollection()), FakeRedis(), str(id), {}
+        )
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from app.config import CONTEST_COLLECTION
+from app.service import contest as contest_service
+from app.service.contest import ContestService
+from app.utils.enums import ContestView, ExportFormat
+
+
+class FakeCursor:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self.sorted_by = None
+        self.batch = None
+
+    def sort(self, key: str, direction: int):
+        self.sorted_by = (key, direction)
+        return self
+
+    def batch_size(self, size: int):
+        self.batch = size
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+
+class FakeDatabase:
+    def __init__(self, documents: list[dict]):
+        self.cursor = FakeCursor(documents)
+        self.queries = []
+
+    def get_collection(self, name: str):
+        assert name == CONTEST_COLLECTION
+        return self
+
+    def find(self, query: dict, projection: dict):
+        self.queries.append(query)
+        return self.cursor
+
+
+def make_contests(count: int) -> list[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"contest {i}",
+            "athlete": {"id": "a1", "name": "Ann"},
+            "status": "finished",
+            "train_type": "trap_shoot",
+            "created_time": datetime(2024, 1, 1, i),
+        }
+        for i in range(count)
+    ]
+
+
+async def export(db: FakeDatabase, format: ExportFormat, **kwargs) -> list[bytes]:
+    chunks = ContestService.export_contests_by_athlete_id(
+        db, "a1", ContestView.SUMMARY, format, **kwargs
+    )
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio
+async def test_export_empty_history():
+    assert await export(FakeDatabase([]), ExportFormat.JSON) == [b"[]"]
+    assert await export(FakeDatabase([]), ExportFormat.NDJSON) == []
+
+
+@pytest.mark.asyncio
+async def test_export_json_array_separators(monkeypatch):
+    # 每筆都超過 chunk 大小，逗號與結尾的 ] 必須跨 chunk 也正確
+    monkeypatch.setattr(contest_service, "STREAM_CHUNK_SIZE", 1)
+    contests = make_contests(3)
+    chunks = await export(FakeDatabase(contests), ExportFormat.JSON)
+
+    body = b"".join(chunks)
+    assert len(chunks) == 4 and chunks[-1] == b"]"
+    assert body.startswith(b"[{") and body.endswith(b"}]")
+    assert body.count(b"},{") == 2
+    assert [item["id"] for item in json.loads(body)] == [
+        str(contest["_id"]) for contest in contests
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_lines():
+    contests = make_contests(2)
+    body = b"".join(await export(FakeDatabase(contests), ExportFormat.NDJSON))
+
+    assert body.endswith(b"}\n")
+    lines = body.decode("utf-8").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["contest 0", "contest 1"]
+
+
+@pytest.mark.asyncio
+async def test_export_passes_batch_size_to_cursor():
+    db = FakeDatabase(make_contests(1))
+    await export(db, ExportFormat.JSON, batch_size=37)
+
+    assert db.cursor.batch == 37
+    assert db.cursor.sorted_by == ("created_time", 1)
+    assert db.queries == [{"athlete.id": "a1"}]
@@ -0,0 +1,57 @@
+import pytest
+
+from app.sql.facets import count_facets, page_meta_cache
+
+
+class FakeCursor:
+    def __init__(self, result: dict):
+        self.result = result
+
+    async def to_list(self, length: int):
+        return [self.result]
+
+
+class FakeCollection:
+    full_name = "test.contest"
+
+    def __init__(self):
+        self.pipelines = []
+        self.estimated_calls = 0
+
+    async def estimated_document_count(self):
+        self.estimated_calls += 1
+        return 42
+
+    def aggregate(self, pipeline: list[dict]):
+        self.pipelines.append(pipeline)
+        return FakeCursor(
+            {
+                "total": [{"n": 3}],
+                "status": [{"_id": "init", "n": 2}, {"_id": "finished", "n": 1}],
+            }
+        )
+
+
+@pytest.mark.asyncio
+async def test_count_facets_uses_estimate_without_filter():
+    page_meta_cache.clear()
+    collection = FakeCollection()
+
+    assert await count_facets(collection, []) == {"total": 42}
+    assert await count_facets(collection, []) == {"total": 42}
+    assert collection.estimated_calls == 1
+    assert collection.pipelines == []
+
+
+@pytest.mark.asyncio
+async def test_count_facets_groups_in_one_aggregation():
+    page_meta_cache.clear()
+    collection = FakeCollection()
+    match = [{"$match": {"search_grams": {"$all": ["ab"]}}}]
+
+    meta = await count_facets(collection, match, ("status",))
+
+    assert meta == {"total": 3, "counts": {"status": {"init": 2, "finished": 1}}}
+    (pipeline,) = collection.pipelines
+    assert pipeline[0] == match[0]
+    assert set(pipeline[1]["$facet"]) == {"total", "status"}
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from app.utils.exception import ServiceBusyException
+from app.utils.hashing import PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, queue_size=1, rounds=4)
+    hashed = await hasher.hash("testpassword")
+
+    assert await hasher.verify("testpassword", hashed)
+    assert not await hasher.verify("wrongpassword", hashed)
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_reject_when_queue_full():
+    hasher = PasswordHasher(workers=1, queue_size=1, rounds=4)
+    results = await asyncio.gather(
+        *(hasher.hash("testpassword") for _ in range(4)), return_exceptions=True
+    )
+
+    assert sum(isinstance(r, ServiceBusyException) for r in results) == 2
+    assert hasher.stats()["rejected"] == 2
+    hasher.shutdown()
@@ -0,0 +1,21 @@
+import pytest
+
+from app.utils.exception import RangeNotSatisfiableException
+from app.utils.http_range import parse_range
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-200", 100) == (0, 99)
+    # 多段範圍不支援，改回完整內容
+    assert parse_range("bytes=0-1,5-6", 100) is None
+
+
+def test_parse_range_not_satisfiable():
+    with pytest.raises(RangeNotSatisfiableException) as e:
+        parse_range("bytes=100-", 100)
+    assert e.value.headers["Content-Range"] == "bytes */100"
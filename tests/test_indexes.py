@@ -0,0 +1,120 @@
+import pytest
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.config import SHOT_COLLECTION, USER_COLLECTION
+from app.sql.indexes import (
+    ensure_collections,
+    ensure_required_indexes,
+    plan_indexes,
+    sync_collection,
+)
+
+
+class FakeCollection:
+    def __init__(self, indexes: list[dict]):
+        self.indexes = indexes
+
+    async def list_indexes(self):
+        for index in self.indexes:
+            yield index
+
+
+@pytest.mark.asyncio
+async def test_plan_indexes_reports_missing_conflicting_and_undeclared():
+    specs = [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("permission", ASCENDING), ("created_time", ASCENDING)]),
+        IndexModel([("created_time", ASCENDING), ("_id", ASCENDING)]),
+    ]
+    collection = FakeCollection(
+        [
+            {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+            {"v": 2, "key": {"username": 1}, "name": "username_1"},
+            {
+                "v": 2,
+                "key": {"created_time": 1, "_id": 1},
+                "name": "created_time_1__id_1",
+            },
+            {"v": 2, "key": {"athlete.id": 1}, "name": "athlete.id_1"},
+        ]
+    )
+
+    plan = await plan_indexes(collection, specs)
+
+    assert plan == {
+        "missing": ["permission_1_created_time_1"],
+        "conflicting": ["username_1"],
+        "undeclared": ["athlete.id_1"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_required_indexes_are_built_and_errors_propagate():
+    class FakeDatabase(dict):
+        def __missing__(self, name):
+            collection = self[name] = FakeIndexCollection()
+            return collection
+
+    class FakeIndexCollection:
+        def __init__(self):
+            self.created = []
+
+        async def create_indexes(self, specs):
+            if any(spec.document.get("unique") for spec in specs) and fail:
+                raise OperationFailure("E11000 duplicate key error", code=11000)
+            self.created.extend(spec.document["name"] for spec in specs)
+
+    fail = False
+    db = FakeDatabase()
+    await ensure_required_indexes(db)
+    assert db[USER_COLLECTION].created == ["username_1"]
+
+    fail = True
+    with pytest.raises(OperationFailure):
+        await ensure_required_indexes(FakeDatabase())
+
+
+@pytest.mark.asyncio
+async def test_startup_sync_only_creates_missing_indexes():
+    class SyncCollection(FakeCollection):
+        def __init__(self, indexes: list[dict]):
+            super().__init__(indexes)
+            self.created, self.dropped = [], []
+
+        async def create_indexes(self, specs):
+            self.created.extend(spec.document["name"] for spec in specs)
+
+        async def drop_index(self, name):
+            self.dropped.append(name)
+
+    specs = [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("created_time", ASCENDING), ("_id", ASCENDING)]),
+    ]
+    collection = SyncCollection(
+        [
+            {"v": 2, "key": {"_id": 1}, "name": "_id_"},
+            {"v": 2, "key": {"username": 1}, "name": "username_1"},
+        ]
+    )
+
+    outcome = await sync_collection(collection, specs)
+
+    assert collection.dropped == []
+    assert outcome["created"] == ["created_time_1__id_1"]
+    assert outcome["conflicting"] == ["username_1"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_collections_tolerates_concurrent_creation():
+    class RacingDatabase:
+        async def list_collection_names(self):
+            return []
+
+        async def create_collection(self, name, **options):
+            if name == SHOT_COLLECTION:
+                raise CollectionInvalid(f"collection {name} already exists")
+            raise OperationFailure("Collection already exists", code=48)
+
+    assert await ensure_collections(RacingDatabase()) == []
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from app.utils.job_queue import Job, percentile, summarize_timings
+from app.utils.media import (
+    RenditionSpec,
+    parse_renditions,
+    rendition_command,
+    thumbnail_command,
+)
+
+
+def test_job_from_stream_entry():
+    job = Job.from_entry(
+        b"1700000000000-0",
+        {
+            b"kind": b"video.process",
+            b"payload": json.dumps({"video_id": "abc"}).encode(),
+            b"attempts": b"2",
+        },
+    )
+    assert job.id == "1700000000000-0"
+    assert job.payload == {"video_id": "abc"}
+    assert job.attempts == 2
+    assert job.enqueued_ms == 1700000000000
+
+
+def test_summarize_timings_by_kind():
+    records = [
+        {"kind": "a", "status": "done", "run_ms": ms, "wait_ms": 1.0}
+        for ms in (10.0, 20.0, 30.0, 40.0)
+    ] + [{"kind": "b", "status": "failed", "run_ms": 5.0, "wait_ms": 2.0}]
+    summary = summarize_timings(records)
+    assert summary["a"]["samples"] == 4
+    assert summary["a"]["failed"] == 0
+    assert summary["a"]["run_ms_avg"] == 25.0
+    assert summary["a"]["run_ms_max"] == 40.0
+    assert summary["b"]["failed"] == 1
+    assert percentile([], 0.5) == 0.0
+
+
+def test_parse_renditions_sorted_and_validated():
+    assert parse_renditions("720:2500k, 360:600k,") == [
+        RenditionSpec(360, "600k"),
+        RenditionSpec(720, "2500k"),
+    ]
+    with pytest.raises(ValueError):
+        parse_renditions("hd")
+
+
+def test_ffmpeg_commands_write_to_target():
+    thumbnail = thumbnail_command("in.mp4", "thumb.jpg", 640)
+    assert thumbnail[-1] == "thumb.jpg"
+    assert "thumbnail=50,scale=640:-2" in thumbnail
+
+    rendition = rendition_command("in.mp4", "360p.mp4", RenditionSpec(360, "600k"))
+    assert rendition[-1] == "360p.mp4"
+    # 不放大比目標小的影片
+    assert "scale=-2:min(360\\,ih)" in rendition
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.sql.crud.loader import Loader
+
+
+class FakeCollection:
+    full_name = "_test.user"
+
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        condition = query["username"]
+        keys = condition["$in"] if isinstance(condition, dict) else [condition]
+
+        async def _cursor():
+            for document in self.documents:
+                if document["username"] in keys:
+                    yield dict(document)
+
+        return _cursor()
+
+
+@pytest.mark.asyncio
+async def test_loader_coalesces_and_batches():
+    collection = FakeCollection([{"username": "a"}, {"username": "b"}])
+    loader = Loader("username", window=0.001)
+
+    results = await asyncio.gather(
+        loader.load(collection, "a"),
+        loader.load(collection, "a"),
+        loader.load(collection, "b"),
+        loader.load(collection, "missing"),
+    )
+
+    assert results == [{"username": "a"}, {"username": "a"}, {"username": "b"}, None]
+    assert len(collection.queries) == 1
+    assert loader.stats()["coalesced"] == 1
+    assert loader.stats()["max_batch_size"] == 3
+
+
+@pytest.mark.asyncio
+async def test_loader_returns_independent_copies():
+    collection = FakeCollection([{"username": "a"}])
+    loader = Loader("username", window=0.001)
+
+    first, second = await asyncio.gather(
+        loader.load(collection, "a"), loader.load(collection, "a")
+    )
+    first["access_token"] = "token"
+
+    assert "access_token" not in second
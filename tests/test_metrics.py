@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY, Counter
+
+from app.utils.metrics import (
+    UNMATCHED_ROUTE,
+    CounterDelta,
+    MetricsMiddleware,
+    mongo_command_metrics,
+)
+
+
+def sample(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_request_histogram_uses_route_template():
+    router = APIRouter(prefix="/metrics-test")
+
+    @router.get("/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+    labels = {"method": "GET", "route": "/metrics-test/{item_id}", "status": "200"}
+    unmatched = {"method": "GET", "route": UNMATCHED_ROUTE, "status": "404"}
+    before = sample("http_request_duration_seconds_count", labels)
+    before_unmatched = sample("http_request_duration_seconds_count", unmatched)
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        await client.get("/metrics-test/1")
+        await client.get("/metrics-test/2")
+        await client.get("/no-such-route")
+
+    assert sample("http_request_duration_seconds_count", labels) == before + 2
+    assert (
+        sample("http_request_duration_seconds_count", unmatched) == before_unmatched + 1
+    )
+
+
+def test_mongo_command_listener_records_status():
+    labels = {"command": "find", "status": "error"}
+    before = sample("mongodb_command_duration_seconds_count", labels)
+    mongo_command_metrics.failed(
+        SimpleNamespace(command_name="find", duration_micros=1500)
+    )
+    assert sample("mongodb_command_duration_seconds_count", labels) == before + 1
+
+
+def test_counter_delta_only_adds_increase():
+    counter = Counter("metrics_test_delta", "test")
+    values = iter([3, 5, 5])
+    delta = CounterDelta(counter, lambda: next(values))
+    for _ in range(3):
+        delta.sample()
+    assert REGISTRY.get_sample_value("metrics_test_delta_total") == 5
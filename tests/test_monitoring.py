@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from app.sql.monitoring import PoolStatsListener
+
+
+def test_waiters_only_counted_when_pool_is_full():
+    listener = PoolStatsListener(max_pool_size=2)
+    event = SimpleNamespace(duration=0.001)
+
+    listener.connection_check_out_started(event)
+    listener.connection_checked_out(event)
+    # 連線池未滿，進行中的 checkout 只是在建立連線
+    listener.connection_check_out_started(event)
+    assert listener.snapshot()["pending"] == 1
+    assert listener.snapshot()["waiters"] == 0
+
+    listener.connection_checked_out(event)
+    listener.connection_check_out_started(event)
+    assert listener.snapshot()["waiters"] == 1
+
+    listener.connection_checked_in(event)
+    listener.connection_checked_out(event)
+    assert listener.snapshot()["waiters"] == 0
+    assert listener.snapshot()["in_use"] == 2
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from app.service import ContestService, UserService
+from app.sql.crud import contest_crud, user_crud
+from app.utils.exception import (
+    CursorNotSupportedException,
+    InvalidCursorException,
+    InvalidSortFieldException,
+)
+from app.utils.pagination import (
+    decode_cursor,
+    encode_cursor,
+    keyset_indexes,
+    keyset_query,
+    keyset_sort,
+    next_cursor,
+    split_page,
+)
+
+
+def test_cursor_round_trip():
+    id = ObjectId()
+    value = datetime(2024, 8, 8, 12, 30)
+
+    assert decode_cursor(encode_cursor(value, str(id))) == (value, id)
+
+
+def test_invalid_cursor():
+    with pytest.raises(InvalidCursorException):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_query_ascending():
+    id = ObjectId()
+    cursor = encode_cursor(10, str(id))
+
+    assert keyset_query("score", 1, cursor) == {
+        "$or": [{"score": {"$gt": 10}}, {"score": 10, "_id": {"$gt": id}}]
+    }
+    assert keyset_sort("score", 1) == [("score", 1), ("_id", 1)]
+
+
+def test_next_cursor_only_on_full_page():
+    items = [{"id": str(ObjectId()), "athlete": {"name": "a"}} for _ in range(2)]
+
+    assert next_cursor(items, 3, "athlete.name") is None
+    value, id = decode_cursor(next_cursor(items, 2, "athlete.name"))
+    assert (value, str(id)) == ("a", items[-1]["id"])
+
+
+def test_split_page_detects_next_page():
+    items = [{"id": str(i)} for i in range(3)]
+
+    assert split_page(items, 2) == (items[:2], True)
+    assert split_page(items, 3) == (items, False)
+
+
+@pytest.mark.asyncio
+async def test_contest_list_rejects_unknown_sort_field():
+    with pytest.raises(InvalidSortFieldException):
+        # 驗證在碰到資料庫之前就失敗
+        await ContestService.get_all_contests(None, sort_by="athlete.name.x")
+
+
+@pytest.mark.asyncio
+async def test_user_list_rejects_unknown_sort_field():
+    with pytest.raises(InvalidSortFieldException):
+        await UserService.get_all_users(None, sort_by="password")
+
+
+@pytest.mark.asyncio
+async def test_contest_list_rejects_cursor_with_search():
+    cursor = encode_cursor("x", str(ObjectId()))
+    with pytest.raises(CursorNotSupportedException):
+        await ContestService.get_all_contests(None, search="final", cursor=cursor)
+
+
+def test_every_sortable_field_has_a_keyset_index():
+    assert [index.document["key"] for index in keyset_indexes({"_id", "name"})] == [
+        {"name": 1, "_id": 1}
+    ]
+    for crud in (contest_crud, user_crud):
+        keys = [list(index.document["key"]) for index in crud.INDEXES]
+        for field in crud.SORTABLE_FIELDS - {"_id", "id"}:
+            assert [field, "_id"] in keys
@@ -0,0 +1,97 @@
+import pytest
+from redis.exceptions import ResponseError
+
+from app.sql.pipeline import RedisBatch, execute_pipelined
+
+
+class FakePipeline:
+    def __init__(self, replies: dict):
+        self.replies = replies
+        self.commands = []
+        self.raise_on_error = None
+        self.was_reset = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.reset()
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def get(self, key):
+        self.commands.append(("GET", key))
+
+    def set(self, key, value, **kwargs):
+        self.commands.append(("SET", key, value))
+
+    async def execute(self, raise_on_error: bool = True):
+        self.raise_on_error = raise_on_error
+        results = [self.replies.get(command, True) for command in self.commands]
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def reset(self):
+        self.was_reset = True
+
+
+class FakeRedis:
+    def __init__(self, replies: dict = None):
+        self.pipe = FakePipeline(replies or {})
+
+    def pipeline(self, transaction: bool = True):
+        return self.pipe
+
+
+@pytest.mark.asyncio
+async def test_batch_results_follow_queue_order():
+    redis = FakeRedis({("GET", "a"): b"1", ("GET", "b"): b"2"})
+    async with RedisBatch(redis) as batch:
+        b = batch.get("b")
+        stored = batch.set("c", "3")
+        a = batch.get("a")
+
+    assert (a.result(), b.result(), stored.result()) == (b"1", b"2", True)
+    assert redis.pipe.commands == [("GET", "b"), ("SET", "c", "3"), ("GET", "a")]
+    assert redis.pipe.was_reset
+
+
+@pytest.mark.asyncio
+async def test_batch_raises_failed_command_on_exit():
+    error = ResponseError("OOM command not allowed")
+    redis = FakeRedis({("SET", "blacklist_token", "true"): error})
+
+    with pytest.raises(ResponseError):
+        async with RedisBatch(redis) as batch:
+            batch.get("other")
+            batch.set("blacklist_token", "true")
+
+    assert redis.pipe.was_reset
+
+
+@pytest.mark.asyncio
+async def test_batch_execute_reports_errors_on_futures():
+    error = ResponseError("READONLY")
+    redis = FakeRedis({("GET", "b"): error})
+    batch = RedisBatch(redis)
+    a = batch.get("a")
+    b = batch.get("b")
+
+    await batch.execute()
+
+    assert a.result() is True
+    assert b.exception() is error
+
+
+@pytest.mark.asyncio
+async def test_execute_pipelined_keeps_order_and_raises():
+    redis = FakeRedis({("GET", "a"): b"1", ("TTL", "b"): 60})
+    assert await execute_pipelined(redis, ("TTL", "b"), ("GET", "a")) == [60, b"1"]
+
+    redis = FakeRedis({("GET", "a"): ResponseError("WRONGTYPE")})
+    with pytest.raises(ResponseError):
+        await execute_pipelined(redis, ("GET", "a"))
@@ -0,0 +1,112 @@
+import pytest
+from starlette.requests import Request
+
+from app.utils.response_cache import ResponseCache
+
+
+def _request(query: str = "", headers: dict = None) -> Request:
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/contests/",
+            "query_string": query.encode(),
+            "headers": raw_headers,
+        }
+    )
+
+
+def test_cache_key_depends_on_query_and_permission():
+    admin = {"permission": "admin"}
+    athlete = {"permission": "athlete"}
+
+    key = ResponseCache.cache_key("contest", _request("limit=10&skip=0"), admin)
+
+    assert key == ResponseCache.cache_key("contest", _request("skip=0&limit=10"), admin)
+    assert key != ResponseCache.cache_key("contest", _request("limit=20&skip=0"), admin)
+    assert key != ResponseCache.cache_key(
+        "contest", _request("limit=10&skip=0"), athlete
+    )
+
+
+def test_matching_etag_returns_not_modified():
+    cache = ResponseCache(ttl=30, stale_ttl=300)
+    etag = '"abc"'
+
+    response = cache._response(
+        _request(headers={"If-None-Match": f'"other", {etag}'}), b"[]", etag, {}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = cache._response(_request(), b"[]", etag, {"X-Next-Cursor": "c"})
+    assert response.status_code == 200
+    assert response.body == b"[]"
+    assert response.headers["x-next-cursor"] == "c"
+    assert cache.stats()["not_modified"] == 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def hgetall(self, key):
+        return self.data.get(key, {})
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, key, mapping):
+        self.redis.data[key] = {
+            k.encode(): v if isinstance(v, bytes) else str(v).encode()
+            for k, v in mapping.items()
+        }
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        return []
+
+
+@pytest.mark.asyncio
+async def test_load_racing_invalidate_is_not_served():
+    cache = ResponseCache(ttl=30, stale_ttl=300)
+    redis = FakeRedis()
+    calls = []
+
+    async def load():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            # 查詢途中有寫入，這次讀到的是寫入前的資料
+            await cache.invalidate(redis, "contest")
+        return {"calls": len(calls)}, {}
+
+    admin = {"permission": "admin"}
+    first = await cache.respond("contest", _request(), admin, redis, load)
+    second = await cache.respond("contest", _request(), admin, redis, load)
+    third = await cache.respond("contest", _request(), admin, redis, load)
+
+    assert first.body == b'{"calls":1}'
+    assert second.body == b'{"calls":2}'
+    assert third.body == b'{"calls":2}'
+    assert len(calls) == 2
@@ -0,0 +1,68 @@
+import numpy as np
+
+from app.utils.enums import TrainType
+from app.utils.scoring import (
+    analyze_history,
+    moving_average,
+    round_scores,
+    score_contest,
+    series_from_columns,
+    streaks,
+)
+
+
+def _series():
+    # 兩場比賽，第一場兩個回合，第二場一個回合
+    return series_from_columns(
+        contest_ids=["a", "a", "a", "a", "b", "b"],
+        rounds=[1, 1, 2, 2, 1, 1],
+        stations=[1, 2, 1, 2, 1, 9],
+        hits=[True, True, False, True, True, True],
+    )
+
+
+def test_round_scores_restart_per_contest():
+    assert round_scores(_series()).tolist() == [2, 1, 2]
+
+
+def test_streaks():
+    hit = np.array([True, True, False, True, True, True, False, True])
+    assert streaks(hit) == (3, 1)
+    assert streaks(np.array([], dtype=bool)) == (0, 0)
+
+
+def test_moving_average():
+    assert moving_average(np.array([1, 2, 3, 4]), 2).tolist() == [1.5, 2.5, 3.5]
+    assert moving_average(np.array([1]), 2).tolist() == []
+
+
+def test_score_contest_ignores_unknown_stations():
+    scores = score_contest(_series(), TrainType.TRAP_SHOOT)
+
+    assert scores["shots"] == 6
+    assert scores["hits"] == 5
+    assert scores["station_hit_rates"] == {"1": 0.6667, "2": 1.0}
+    assert scores["longest_streak"] == 3
+    assert scores["current_streak"] == 3
+
+
+def test_analyze_history():
+    analytics = analyze_history(_series(), TrainType.SKEET_SHOOT, window=2, last=1)
+
+    assert analytics["contests"] == 2
+    assert analytics["rounds"] == 3
+    assert analytics["best_round"] == 2
+    assert analytics["moving_average"] == [1.5]
+
+
+def test_out_of_range_columns_are_clipped():
+    series = series_from_columns(
+        contest_ids=["a", "a"],
+        rounds=[1, 2**40],
+        stations=[1, 40000],
+        hits=[True, False],
+    )
+
+    assert series.station.tolist() == [1, np.iinfo(np.int16).max]
+    assert series.round.tolist() == [1, np.iinfo(np.int32).max]
+    assert score_contest(series, TrainType.TRAP_SHOOT)["hits"] == 1
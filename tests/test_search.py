@@ -0,0 +1,52 @@
+import pytest
+
+from app.sql.crud import contest_crud
+from app.sql.facets import page_meta_cache
+from app.utils.search import build_search_grams, query_grams
+
+
+def test_query_grams_are_subset_of_document_grams():
+    grams = set(build_search_grams("全國飛靶錦標賽", "王小明"))
+
+    assert set(query_grams("錦標")) <= grams
+    assert set(query_grams("小明")) <= grams
+    assert set(query_grams("明")) <= grams
+    assert not set(query_grams("大明")) <= grams
+
+
+def test_search_is_case_and_width_insensitive():
+    grams = set(build_search_grams("Trap Final"))
+
+    assert set(query_grams("ＴＲＡＰ")) <= grams
+    assert set(query_grams("final")) <= grams
+
+
+class FakeCollection:
+    full_name = "test.contest"
+
+    def __init__(self):
+        self.pipelines = []
+
+    async def estimated_document_count(self):
+        raise AssertionError("blank search must not count the whole collection")
+
+    def aggregate(self, pipeline: list[dict]):
+        self.pipelines.append(pipeline)
+        return self
+
+    async def to_list(self, length: int):
+        return [{"total": []}]
+
+
+@pytest.mark.asyncio
+async def test_blank_search_matches_nothing():
+    page_meta_cache.clear()
+    collection = FakeCollection()
+
+    # 不能退回未篩選的列表
+    assert await contest_crud.get_all_contests(collection, search="  \u3000 ") == []
+    assert collection.pipelines == []
+
+    assert await contest_crud.count_contests(collection, search=" ") == {"total": 0}
+    (pipeline,) = collection.pipelines
+    assert pipeline[0] == {"$match": {"search_grams": {"$all": []}}}
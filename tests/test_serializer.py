@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson.objectid import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.model import contest_model
+from app.utils import serializer
+from app.utils.serializer import contest_serializer, user_serializer
+
+
+def make_contest(i: int) -> dict:
+    return {
+        "id": str(ObjectId()),
+        "name": f"飛靶 第{i}場",
+        "description": None if i % 2 else "決賽",
+        "athlete": {
+            "id": str(ObjectId()),
+            "username": f"athlete{i}",
+            "name": "王小明",
+            "permission": "athlete",
+            # 巢狀的多餘欄位不能被輸出
+            "password": "hashed",
+            "created_time": datetime(2024, 8, 8, 12, 30, 0, 1500),
+        },
+        "status": "running",
+        "train_type": "trap_shoot",
+        "search_grams": ["abc"],
+        "created_time": datetime(2024, 8, 8, tzinfo=timezone(timedelta(hours=8))),
+    }
+
+
+CONTESTS = [make_contest(i) for i in range(3)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("response_class", [JSONResponse, ORJSONResponse])
+async def test_contest_serializer_matches_default_path(response_class):
+    app = FastAPI(default_response_class=response_class)
+
+    @app.get("/list")
+    async def default_list() -> list[contest_model.ContestResponseModel]:
+        return CONTESTS
+
+    @app.get("/detail")
+    async def default_detail() -> contest_model.ContestResponseModel:
+        return CONTESTS[0]
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        default_list_body = (await client.get("/list")).content
+        default_detail_body = (await client.get("/detail")).content
+
+    assert contest_serializer.dump_json(CONTESTS) == default_list_body
+    assert contest_serializer.dump_json(CONTESTS[0]) == default_detail_body
+    assert b"password" not in default_list_body
+
+
+def test_user_serializer_fills_defaults_and_drops_private_fields():
+    user = {
+        "id": "1",
+        "username": "a",
+        "password": "hashed",
+        "permission": "admin",
+        "created_time": datetime(2024, 1, 1),
+    }
+    assert user_serializer.dump_json([user]) == (
+        b'[{"id":"1","username":"a","name":null,"permission":"admin",'
+        b'"created_time":"2024-01-01T00:00:00"}]'
+    )
+
+
+def test_respond_returns_bytes_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(serializer, "FAST_SERIALIZATION", False)
+    assert serializer.respond(CONTESTS, contest_serializer) is CONTESTS
+
+    monkeypatch.setattr(serializer, "FAST_SERIALIZATION", True)
+    response = serializer.respond(
+        CONTESTS[0], contest_serializer, {"ETag": "x", "Content-Length": "1"}
+    )
+    assert response.body == contest_serializer.dump_json(CONTESTS[0])
+    assert response.headers["etag"] == "x"
+    assert response.headers["content-length"] == str(len(response.body))
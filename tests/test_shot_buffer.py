@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from app.utils.shot_buffer import ShotBuffer
+
+
+class FakeCollection:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        assert ordered is False
+        self.batches.append(list(documents))
+
+
+@pytest.mark.asyncio
+async def test_shot_buffer_flushes_by_size_and_on_close():
+    buffer = ShotBuffer(flush_size=3, flush_interval=60, max_size=100)
+    collection = FakeCollection()
+
+    assert buffer.add(collection, [{"n": i} for i in range(4)]) == 0
+    await asyncio.sleep(0.01)
+    assert [len(batch) for batch in collection.batches] == [3, 1]
+
+    buffer.add(collection, [{"n": 4}])
+    await buffer.close()
+    assert [len(batch) for batch in collection.batches] == [3, 1, 1]
+    assert buffer.stats()["written"] == 5
+
+
+@pytest.mark.asyncio
+async def test_shot_buffer_drops_when_full():
+    buffer = ShotBuffer(flush_size=10, flush_interval=60, max_size=3)
+    collection = FakeCollection()
+
+    assert buffer.add(collection, [{"n": i} for i in range(5)]) == 2
+    await buffer.close()
+
+    stats = buffer.stats()
+    assert stats["dropped_overflow"] == 2
+    assert stats["written"] == 3
@@ -0,0 +1,230 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.sql.slow_query import (
+    SlowQueryLog,
+    command_shape,
+    redact,
+    shape_key,
+    summarize_explain,
+)
+from app.utils.route_context import RouteContextMiddleware, current_route
+
+
+def test_redact_keeps_structure_only():
+    query = {
+        "athlete.id": "abc",
+        "status": {"$in": ["running", "finished", "init"]},
+        "$or": [{"name": "x"}, {"name": "y"}],
+    }
+    assert redact(query) == {
+        "athlete.id": "?",
+        "status": {"$in": ["?"]},
+        "$or": [{"name": "?"}],
+    }
+
+
+def test_command_shape_for_aggregate_search():
+    command = {
+        "aggregate": "contest",
+        "pipeline": [
+            {"$match": {"search_grams": {"$all": ["abc", "bcd"]}}},
+            {"$sort": {"_score": -1, "created_time": 1}},
+            {"$skip": 5000},
+            {"$limit": 10},
+        ],
+    }
+    shape = command_shape("aggregate", command)
+    assert shape["filter"][0] == {"$match": {"search_grams": {"$all": ["?"]}}}
+    assert shape["sort"] == {"_score": -1, "created_time": 1}
+    assert shape["skip"] == 5000
+    assert shape["limit"] == 10
+
+
+def test_summarize_explain_find_and_aggregate():
+    find = {
+        "queryPlanner": {
+            "winningPlan": {"stage": "SKIP", "inputStage": {"stage": "COLLSCAN"}},
+            "rejectedPlans": [{"stage": "IXSCAN", "indexName": "name_1"}],
+        },
+        "executionStats": {
+            "nReturned": 10,
+            "executionTimeMillis": 120,
+            "totalKeysExamined": 0,
+            "totalDocsExamined": 5010,
+        },
+    }
+    summary = summarize_explain(find)
+    assert summary["plan"] == "COLLSCAN"
+    assert summary["indexes"] == []
+    assert summary["docs_examined"] == 5010
+
+    aggregate = {
+        "stages": [
+            {
+                "$cursor": {
+                    "queryPlanner": {
+                        "winningPlan": {
+                            "stage": "FETCH",
+                            "inputStage": {
+                                "stage": "IXSCAN",
+                                "indexName": "search_grams_1",
+                            },
+                        }
+                    },
+                    "executionStats": {"totalDocsExamined": 42, "nReturned": 3},
+                }
+            },
+            {"$sort": {"sortKey": {"_score": -1}}},
+        ]
+    }
+    summary = summarize_explain(aggregate)
+    assert summary["plan"] == "IXSCAN"
+    assert summary["indexes"] == ["search_grams_1"]
+    assert summary["docs_examined"] == 42
+
+
+class FakeCollection:
+    def __init__(self):
+        self.entries = []
+
+    async def insert_one(self, document: dict):
+        self.entries.append(document)
+
+
+@pytest.mark.asyncio
+async def test_listener_records_slow_commands_with_route():
+    log = SlowQueryLog(threshold_ms=50, explain=False, queue_size=10)
+    collection = FakeCollection()
+    log._loop = asyncio.get_running_loop()
+    log._queue = asyncio.Queue(10)
+    log._collection = collection
+    task = asyncio.create_task(log._run())
+
+    async def endpoint(scope, receive, send):
+        scope["route"] = SimpleNamespace(path="/contests/")
+        for request_id, micros in ((1, 10_000), (2, 80_000)):
+            log.listener.started(
+                SimpleNamespace(
+                    command_name="find",
+                    command={"find": "contest", "filter": {"name": "x"}, "skip": 9},
+                    database_name="db",
+                    connection_id=("localhost", 27017),
+                    request_id=request_id,
+                )
+            )
+            log.listener.succeeded(
+                SimpleNamespace(
+                    command_name="find",
+                    connection_id=("localhost", 27017),
+                    request_id=request_id,
+                    duration_micros=micros,
+                )
+            )
+
+    await RouteContextMiddleware(endpoint)(
+        {"type": "http", "method": "GET", "path": "/contests/"}, None, None
+    )
+    assert current_route() is None
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    (entry,) = collection.entries
+    assert entry["route"] == "GET /contests/"
+    assert entry["namespace"] == "db.contest"
+    assert entry["duration_ms"] == 80.0
+    assert entry["shape"]["filter"] == '{"name": "?"}'
+    assert entry["shape"]["skip"] == 9
+    assert log.stats()["recorded"] == 1
+
+
+def test_listener_skips_change_stream_get_more():
+    submitted = []
+    log = SlowQueryLog(threshold_ms=50, explain=False)
+    log._loop = object()
+    log.submit = lambda *args: submitted.append(args)
+    listener = log.listener
+
+    def run(request_id, command, micros, reply=None):
+        name = next(iter(command))
+        listener.started(
+            SimpleNamespace(
+                command_name=name,
+                command=command,
+                database_name="db",
+                connection_id=("localhost", 27017),
+                request_id=request_id,
+            )
+        )
+        listener.succeeded(
+            SimpleNamespace(
+                command_name=name,
+                connection_id=("localhost", 27017),
+                request_id=request_id,
+                duration_micros=micros,
+                reply=reply or {},
+            )
+        )
+
+    watch = {"aggregate": "contest", "pipeline": [{"$changeStream": {}}]}
+    run(1, watch, 1_000, {"cursor": {"id": 42, "firstBatch": []}})
+    run(
+        2,
+        {"getMore": 42, "collection": "contest"},
+        1_000_000,
+        {"cursor": {"id": 42, "nextBatch": []}},
+    )
+    run(3, {"getMore": 7, "collection": "contest"}, 80_000)
+    assert [item[0] for item in submitted] == ["getMore"]
+    assert submitted[0][1]["getMore"] == 7
+    assert log.stats()["awaiting_cursors"] == 1
+
+    run(4, {"killCursors": "contest", "cursors": [42]}, 1_000)
+    assert log.stats()["awaiting_cursors"] == 0
+
+
+def test_shape_key_buckets_skip_and_limit():
+    def key(skip, limit=10):
+        command = {"find": "contest", "filter": {"name": "x"}, "skip": skip}
+        command["limit"] = limit
+        return shape_key("find", "db.contest", command_shape("find", command))
+
+    assert key(5000) == key(7000) == key(1000)
+    assert key(5000) != key(50)
+    assert key(20) == key(20, limit=15)
+    assert key(None) != key(20)
+
+
+@pytest.mark.asyncio
+async def test_deep_pages_reuse_explain_and_errors_do_not_stop_the_task():
+    log = SlowQueryLog(threshold_ms=50, explain=True, queue_size=10)
+    explained = []
+
+    async def command(spec):
+        explained.append(spec["explain"]["skip"])
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+    class BrokenCollection(FakeCollection):
+        async def insert_one(self, document: dict):
+            if document["shape"]["skip"] == 2000:
+                raise ValueError("not encodable")
+            await super().insert_one(document)
+
+    collection = BrokenCollection()
+    log._loop = asyncio.get_running_loop()
+    log._queue = asyncio.Queue(10)
+    log._collection = collection
+    log._client = {"db": SimpleNamespace(command=command)}
+    task = asyncio.create_task(log._run())
+    for skip in (1000, 2000, 3000):
+        command_doc = {"find": "contest", "filter": {}, "skip": skip, "limit": 10}
+        log._enqueue(("find", command_doc, "db", None, 80.0, True, None))
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    assert explained == [1000]
+    assert [entry["shape"]["skip"] for entry in collection.entries] == [1000, 3000]
+    assert collection.entries[0]["shape_id"] == collection.entries[1]["shape_id"]
+    assert log.stats()["write_failures"] == 1
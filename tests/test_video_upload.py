@@ -0,0 +1,116 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.service import contest as contest_service
+from app.service.contest import ContestService
+from app.sql.crud import video_crud
+from app.sql.db import get_database, get_redis
+from app.utils.exception import VideoTooLargeException
+from app.utils.security import get_current_user
+
+
+class FakeGridIn:
+    def __init__(self, file_id: ObjectId):
+        self.file_id = file_id
+        self.written = []
+        self.state = "open"
+
+    async def write(self, data: bytes):
+        self.written.append(data)
+
+    async def abort(self):
+        self.state = "aborted"
+
+    async def close(self):
+        self.state = "closed"
+
+
+class FakeBucket:
+    def __init__(self):
+        self.uploads = []
+        self.deleted = []
+
+    def open_upload_stream_with_id(self, file_id, filename, **kwargs):
+        grid_in = FakeGridIn(file_id)
+        self.uploads.append(grid_in)
+        return grid_in
+
+    async def delete(self, file_id: ObjectId):
+        self.deleted.append(file_id)
+
+
+async def chunks(*items: bytes):
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_upload_video_returns_the_id_it_chose():
+    bucket = FakeBucket()
+    file_id, length = await video_crud.upload_video(
+        bucket, "a.mp4", chunks(b"ab", b"cd"), {}, 2, 10
+    )
+    (grid_in,) = bucket.uploads
+    assert file_id == grid_in.file_id and isinstance(file_id, ObjectId)
+    assert (length, grid_in.state) == (4, "closed")
+
+
+@pytest.mark.asyncio
+async def test_upload_video_aborts_when_too_large():
+    bucket = FakeBucket()
+    with pytest.raises(VideoTooLargeException):
+        await video_crud.upload_video(bucket, "a.mp4", chunks(b"abc", b"def"), {}, 3, 4)
+    assert bucket.uploads[0].state == "aborted"
+
+
+@pytest.mark.asyncio
+async def test_gridfs_file_is_deleted_when_child_insert_fails(monkeypatch):
+    bucket = FakeBucket()
+    contest = {"id": str(ObjectId()), "created_time": datetime(2024, 1, 1)}
+
+    async def get_contest_by_id(db, contest_id):
+        return contest
+
+    async def create_child(collection, contest_id, child):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(ContestService, "get_contest_by_id", get_contest_by_id)
+    monkeypatch.setattr(
+        contest_service, "AsyncIOMotorGridFSBucket", lambda *a, **k: bucket
+    )
+    monkeypatch.setattr(
+        contest_service.contest_child_crud, "create_child", create_child
+    )
+    db = type("FakeDatabase", (), {"get_collection": lambda self, name: None})()
+
+    with pytest.raises(RuntimeError):
+        await ContestService.upload_video(
+            db, None, contest["id"], chunks(b"data"), "a.mp4", "", "video/mp4"
+        )
+    assert bucket.deleted == [bucket.uploads[0].file_id]
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: {"permission": "admin"}
+    app.dependency_overrides[get_database] = lambda: None
+    app.dependency_overrides[get_redis] = lambda: None
+    yield AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content_length", ["abc", "-1"])
+async def test_malformed_content_length_is_rejected(client, content_length):
+    response = await client.post(
+        f"/contests/{ObjectId()}/videos",
+        params={"name": "a.mp4"},
+        content=b"data",
+        headers={"Content-Length": content_length},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Content-Length not valid"